@@ -0,0 +1,225 @@
+# waterseeker-agent/analysis_parser.py
+import json
+import math
+import re
+from results import LocationRecord
+
+# Compiled once; every line of LLM output is scanned a single time
+LOCATION_HEADER = re.compile(r"^-\s*Location (\d+)\s*(?:\(lat:\s*(-?\d+\.?\d*),\s*lon:\s*(-?\d+\.?\d*)\))?")
+RAINFALL = re.compile(r"Rainfall: (\d+\.?\d*)mm/year")
+CAPACITY = re.compile(r"Capacity: (\d+\.?\d*)M liters")
+# The model may round the echoed coordinates; anything further off is another location
+COORDINATE_TOLERANCE = 0.01
+
+
+class AnalysisParser:
+    """Single-pass, incremental parser from analysis text to LocationRecords.
+
+    Accepts both formats the model produces:
+    ``- Location N (lat: .., lon: ..): Rainfall: Xmm/year, Capacity: YM liters``
+    and the sub-bullet form, where ``- Rainfall:`` and ``- Capacity:`` follow
+    a bare ``- Location N (...):`` line. Rows for ids outside the input, rows
+    whose coordinates don't match the input, repeated rows, and rows where a
+    field is absent or unreadable are ignored (the location stays missing).
+    Text can be fed in arbitrary chunks (e.g. from a token stream).
+    """
+
+    def __init__(self, locations):
+        self.locations = locations
+        self._ids = None
+        self._found = {}
+        self._buffer = ""
+        self._current = None
+        self._rainfall = None
+        self._capacity = None
+
+    def feed(self, chunk):
+        """Consume more text and return the records completed by it."""
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split("\n")
+        completed = []
+        for line in lines:
+            record = self._parse_line(line.strip())
+            if record is not None:
+                completed.append(record)
+        return completed
+
+    def close(self):
+        line, self._buffer = self._buffer, ""
+        record = self._parse_line(line.strip())
+        return [record] if record is not None else []
+
+    def missing_ids(self):
+        return [i + 1 for i in range(len(self.locations)) if i + 1 not in self._found]
+
+    def renumber(self, ids):
+        """Read rows numbered 1..len(ids) in the text that follows as these location ids.
+
+        For a re-ask listing only some locations, numbered from 1 so the prompt's
+        "Location N" limits hold; records keep the original ids.
+        """
+        self._ids = list(ids)
+
+    def _original_id(self, loc_id):
+        # The input location a row number stands for, or None when out of range
+        count = len(self._ids) if self._ids is not None else len(self.locations)
+        if not 1 <= loc_id <= count:
+            return None
+        return self._ids[loc_id - 1] if self._ids is not None else loc_id
+
+    def records(self):
+        """One record per input location, in input order; missing ones have found=False."""
+        return [
+            self._found.get(i + 1) or LocationRecord(i + 1, lat, lon, 0.0, 0.0, False, "Unknown", "Unknown", "")
+            for i, (lat, lon) in enumerate(self.locations)
+        ]
+
+    def _parse_line(self, line):
+        if not line.startswith("-"):
+            return None
+        header = LOCATION_HEADER.match(line)
+        if header:
+            self._current = self._location_id(header)
+            self._rainfall = self._capacity = None
+        if self._current is None:
+            return None
+        rainfall = RAINFALL.search(line)
+        if rainfall:
+            self._rainfall = float(rainfall.group(1))
+        capacity = CAPACITY.search(line)
+        if capacity:
+            self._capacity = float(capacity.group(1))
+        if self._rainfall is None or self._capacity is None:
+            if header and not line.rstrip().endswith(":"):
+                # A one-line row without both values: no sub-bullets follow
+                self._current = None
+            return None
+        loc_id = self._current
+        self._current = None
+        if loc_id in self._found:
+            return None
+        lat, lon = self.locations[loc_id - 1]
+        record = LocationRecord(loc_id, lat, lon, self._rainfall, self._capacity, True, "Unknown", "Unknown", "")
+        self._found[loc_id] = record
+        return record
+
+    def _location_id(self, header):
+        loc_id = self._original_id(int(header.group(1)))
+        if loc_id is None:
+            return None
+        if header.group(2) is not None:
+            lat, lon = self.locations[loc_id - 1]
+            if (abs(float(header.group(2)) - float(lat)) > COORDINATE_TOLERANCE
+                    or abs(float(header.group(3)) - float(lon)) > COORDINATE_TOLERANCE):
+                return None
+        return loc_id
+
+
+# Shape each element of the JSON analysis must have (validated by validate_analysis_item):
+# {"location": int 1..N, "rainfall_mm_per_year": number >= 0, "capacity_m_liters": number >= 0}
+ANALYSIS_JSON_FIELDS = ("location", "rainfall_mm_per_year", "capacity_m_liters")
+
+
+def _non_negative_number(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        try:
+            value = float(value.strip())
+        except ValueError:
+            return None
+    if not isinstance(value, (int, float)) or not math.isfinite(value) or value < 0:
+        return None
+    return float(value)
+
+
+def validate_analysis_item(item, num_locations):
+    """Return (location_id, rainfall, capacity) for a valid JSON item, else None."""
+    if not isinstance(item, dict) or any(key not in item for key in ANALYSIS_JSON_FIELDS):
+        return None
+    loc_id = item["location"]
+    if isinstance(loc_id, bool) or not isinstance(loc_id, int) or not 1 <= loc_id <= num_locations:
+        return None
+    rainfall = _non_negative_number(item["rainfall_mm_per_year"])
+    capacity = _non_negative_number(item["capacity_m_liters"])
+    if rainfall is None or capacity is None:
+        return None
+    return loc_id, rainfall, capacity
+
+
+class AnalysisJSONParser(AnalysisParser):
+    """Incremental parser for the JSON analysis format.
+
+    Every complete ``{...}`` object in the stream is decoded and validated
+    as soon as its closing brace arrives, so rows can still be reported
+    progressively. Items wrapped in containers such as ``{"locations": [...]}``
+    or ``{"analysis": {...}}`` are unwrapped. Invalid items are skipped; their
+    ids stay in ``missing_ids()`` so only those locations need to be asked for again.
+    """
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, locations):
+        super().__init__(locations)
+        self._pos = 0
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        completed = []
+        while True:
+            start = self._buffer.find("{", self._pos)
+            if start == -1:
+                self._pos = len(self._buffer)
+                break
+            try:
+                item, end = self._decoder.raw_decode(self._buffer, start)
+            except ValueError:
+                # Either incomplete (wait for more text) or malformed (skipped at close)
+                self._pos = start
+                break
+            self._pos = end
+            for element in _items(item):
+                record = self._accept(element)
+                if record is not None:
+                    completed.append(record)
+        return completed
+
+    def close(self):
+        completed = []
+        # Skip past anything that never became valid JSON, one brace at a time
+        while self._pos < len(self._buffer):
+            self._pos += 1
+            completed.extend(self.feed(""))
+        self._buffer, self._pos = "", 0
+        return completed
+
+    def _accept(self, item):
+        valid = validate_analysis_item(item, len(self._ids) if self._ids is not None else len(self.locations))
+        if valid is None:
+            return None
+        loc_id, rainfall, capacity = valid
+        loc_id = self._original_id(loc_id)
+        if loc_id in self._found:
+            return None
+        lat, lon = self.locations[loc_id - 1]
+        record = LocationRecord(loc_id, lat, lon, rainfall, capacity, True, "Unknown", "Unknown", "")
+        self._found[loc_id] = record
+        return record
+
+
+def _items(value):
+    # Analysis items inside whatever the model wrapped them in
+    if isinstance(value, list):
+        for element in value:
+            yield from _items(element)
+    elif isinstance(value, dict) and "location" not in value and len(value) == 1:
+        yield from _items(next(iter(value.values())))
+    else:
+        yield value
+
+
+def parse_analysis(text, locations):
+    parser = AnalysisParser(locations)
+    parser.feed(text)
+    parser.close()
+    return parser.records()
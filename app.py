@@ -1,15 +1,9 @@
 # waterseeker-agent/app.py
 import streamlit as st
-from waterseeker import run_waterseeker_agent
-import folium
-from streamlit_folium import st_folium
-import matplotlib.pyplot as plt
-import io
-import base64
-import re
-import requests
-from geopy.geocoders import Nominatim
-import time
+from charts import bar_chart
+from geocache import reverse_geocode, city_and_country
+import telemetry
+from view_model import build_result_view
 
 st.set_page_config(page_title="WaterSeeker Agent", page_icon="💧")
 st.title("💧 WaterSeeker Agent")
@@ -104,68 +98,51 @@ with st.sidebar:
 # API Keys
 OPENWEATHERMAP_API_KEY = st.secrets["OPENWEATHERMAP_API_KEY"]
 
-# Initialize Nominatim geocoder with a user agent
-geolocator = Nominatim(user_agent="WaterSeekerAgent")
-
-# Function to get country and city using geopy with Nominatim
+# Function to get country and city from the shared, rate-limited geocoding cache
 def get_location_details(lat, lon):
     try:
-        # Respect Nominatim's rate limit (1 request per second)
-        time.sleep(1)
-        location = geolocator.reverse((lat, lon), language="en")
-        if location and location.raw and "address" in location.raw:
-            address = location.raw["address"]
-            city = address.get("city", address.get("town", address.get("village", "Unknown")))
-            country = address.get("country", "Unknown")
-            return city, country
+        address = reverse_geocode(lat, lon)
+        if address:
+            return city_and_country(address)
         return "Unknown", "Unknown"
     except Exception as e:
         st.warning(f"Error fetching location details: {str(e)}")
         return "Unknown", "Unknown"
 
-# Function to get detailed weather data using OpenWeatherMap API
-def get_weather_data(lat, lon):
-    url = f"http://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={OPENWEATHERMAP_API_KEY}&units=metric"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        weather_info = {
-            "rain_1h": data.get("rain", {}).get("1h", 0),  # Rainfall in the last 1 hour (mm)
-            "rain_3h": data.get("rain", {}).get("3h", 0),  # Rainfall in the last 3 hours (mm)
-            "humidity": data.get("main", {}).get("humidity", 0),  # Humidity (%)
-            "cloud_cover": data.get("clouds", {}).get("all", 0),  # Cloudiness (%)
-            "temperature": data.get("main", {}).get("temp", 0),  # Temperature (°C)
-            "wind_speed": data.get("wind", {}).get("speed", 0),  # Wind speed (m/s)
-            "wind_direction": data.get("wind", {}).get("deg", 0),  # Wind direction (degrees)
-            "pressure": data.get("main", {}).get("pressure", 0),  # Pressure (hPa)
-            "weather_description": data.get("weather", [{}])[0].get("description", "N/A"),  # Weather description
-        }
-        return weather_info
-    except Exception as e:
-        st.warning(f"Error fetching weather data: {str(e)}")
-        return {
-            "rain_1h": 0,
-            "rain_3h": 0,
-            "humidity": 0,
-            "cloud_cover": 0,
-            "temperature": 0,
-            "wind_speed": 0,
-            "wind_direction": 0,
-            "pressure": 0,
-            "weather_description": "N/A",
-        }
+# Label for a selected point, geocoded once per point and kept across reruns
+def location_label(i, lat, lon):
+    point = (lat, lon)
+    if point not in st.session_state.point_labels:
+        city, country = get_location_details(lat, lon)
+        st.session_state.point_labels[point] = f"(lat: {lat:.2f}, lon: {lon:.2f}) - {city}, {country}"
+    return f"Location {i+1}: {st.session_state.point_labels[point]}"
+
+# Weather for all analyzed locations at once (OpenWeatherMap, cached, see weather.py), then
+# everything the results section needs goes into one snapshot; reruns render only from it
+def build_view(result):
+    from weather import DEFAULT_WEATHER, get_weather_batch
+    # Weather fetches are timed on the run's trace, next to the agent's own spans
+    with telemetry.use_trace(result.trace):
+        weather = get_weather_batch(result.locations, OPENWEATHERMAP_API_KEY)
+    return build_result_view(result, weather, DEFAULT_WEATHER, default_center)
 
 # Initialize session state variables
 if "points" not in st.session_state:
     st.session_state.points = []
-if "results" not in st.session_state:
-    st.session_state.results = None
+if "view" not in st.session_state:
+    st.session_state.view = None
+if "point_labels" not in st.session_state:
+    st.session_state.point_labels = {}
 if "feedback_submitted" not in st.session_state:
     st.session_state.feedback_submitted = False
 if "feedback_message" not in st.session_state:
     st.session_state.feedback_message = ""
 
+# folium and streamlit_folium (which pulls in pandas) are imported only here, where the
+# first map is drawn, so the title and styles above are painted before they load
+import folium
+from streamlit_folium import st_folium
+
 default_center = [35.0, -78.0]
 center = st.session_state.points[-1] if st.session_state.points else default_center
 m = folium.Map(location=center, zoom_start=6)
@@ -190,194 +167,123 @@ if map_data and "last_clicked" in map_data and map_data["last_clicked"]:
 st.subheader("📍 Selected Locations")
 if st.session_state.points:
     for i, (lat, lon) in enumerate(st.session_state.points):
-        city, country = get_location_details(lat, lon)
-        st.write(f"Location {i+1}: (lat: {lat:.2f}, lon: {lon:.2f}) - {city}, {country}")
+        st.write(location_label(i, lat, lon))
     if st.button("🗑️ Clear Points"):
         st.session_state.points = []
-        st.session_state.results = None
+        st.session_state.view = None
         st.session_state.feedback_submitted = False
         st.session_state.feedback_message = ""
         st.rerun()
 else:
     st.write("Click the map to add up to 5 locations.")
 
+# Render analysis rows into a placeholder as watsonx streams them in
+def location_streamer(placeholder):
+    rows = {}
+    def show_location(loc_id, line):
+        rows[loc_id] = line
+        placeholder.markdown("<br>".join(rows[k] for k in sorted(rows)), unsafe_allow_html=True)
+    return show_location
+
 # Require at least 2 locations for a recommendation
 min_locations_for_recommendation = 2
 if st.button("🔍 Analyze Water Resources") and st.session_state.points:
+    # Imported here so the agent (LangChain, HTTP clients) isn't loaded before the map is shown
+    from waterseeker import run_waterseeker_agent
     if len(st.session_state.points) < min_locations_for_recommendation:
         st.warning(f"Please select at least {min_locations_for_recommendation} locations to enable a recommendation. Currently, {len(st.session_state.points)} location(s) selected.")
         with st.spinner("Analyzing with watsonx.ai..."):
+            streamed_rows = st.empty()
             try:
-                analysis, recommendation, coords, agent_log, water_resources = run_waterseeker_agent(st.session_state.points)
-                recommendation = "Recommendation not available: Please select more locations for comparison."
-                st.session_state.results = (analysis, recommendation, coords, agent_log, water_resources)
+                result = run_waterseeker_agent(st.session_state.points, on_location=location_streamer(streamed_rows))
+                result.recommendation = "Recommendation not available: Please select more locations for comparison."
+                result.recommended_index = -1
+                st.session_state.view = build_view(result)
             except Exception as e:
                 st.error(f"Error: {str(e)}")
+            streamed_rows.empty()
     else:
         with st.spinner("Analyzing locations and fetching water resource data..."):
+            streamed_rows = st.empty()
             try:
-                analysis, recommendation, coords, agent_log, water_resources = run_waterseeker_agent(st.session_state.points)
-                if not recommendation:
-                    recommendation = "- No recommendation: Failed to generate a valid recommendation."
-                st.session_state.results = (analysis, recommendation, coords, agent_log, water_resources)
+                result = run_waterseeker_agent(st.session_state.points, on_location=location_streamer(streamed_rows))
+                if not result.recommendation:
+                    result.recommendation = "- No recommendation: Failed to generate a valid recommendation."
+                st.session_state.view = build_view(result)
             except Exception as e:
                 st.error(f"Error: {str(e)}")
+            streamed_rows.empty()
 
-# Check if results exist before accessing
-if st.session_state.results is not None:
-    analysis, recommendation, coords, agent_log, water_resources = st.session_state.results
+# Render results purely from the stored snapshot (no network calls on reruns)
+if st.session_state.view is not None:
+    view = st.session_state.view
+    recommended_index, capacities, rainfalls = view.recommended_index, view.capacities, view.rainfalls
+    for warning in view.warnings:
+        st.warning(warning)
     
     # Display the agent's process in a textarea
     st.subheader("🤖 Agent's Process")
     st.markdown('<div class="card">', unsafe_allow_html=True)
-    filtered_log = "\n".join(line for line in agent_log.split("\n") if "missing ScriptRunContext" not in line)
-    st.text_area("Agent Log", filtered_log, height=300)
+    st.text_area("Agent Log", view.agent_log, height=300)
+    if view.timings:
+        with st.expander("⏱️ Timings"):
+            st.markdown("\n".join(f"- {line}" for line in view.timings))
+            st.download_button("Download trace (JSON)", view.trace_json, file_name="waterseeker-trace.json", mime="application/json")
+            st.download_button("Download metrics (Prometheus)", telemetry.metrics.prometheus(), file_name="waterseeker-metrics.prom", mime="text/plain")
     st.markdown('</div>', unsafe_allow_html=True)
     
     # Analysis with expandable sections
     st.subheader("📊 Analysis")
     st.markdown('<div class="card">', unsafe_allow_html=True)
-    if "Error: Analysis includes" in analysis:
+    if view.parsing_failed:
         st.warning("Analysis parsing failed. Displaying raw analysis data.")
-        raw_analysis = []
-        log_lines = agent_log.split("\n")
-        in_analysis = False
-        for line in log_lines:
-            if "✅ Analysis complete:" in line:
-                in_analysis = True
-                continue
-            if in_analysis and line.startswith("🔍"):
-                break
-            if in_analysis and line.strip():
-                raw_analysis.append(line)
-        if raw_analysis:
-            st.markdown("\n".join(raw_analysis).replace("\n", "<br>"), unsafe_allow_html=True)
+        if view.raw_analysis:
+            st.markdown(view.raw_analysis.replace("\n", "<br>"), unsafe_allow_html=True)
         else:
             st.error("No analysis data available.")
     else:
-        analysis_lines = [line.strip() for line in analysis.split("\n") if line.strip()]
-        formatted_analysis = [f"- {line[2:]}" if line.startswith("- ") else f"- {line}" for line in analysis_lines]
-        for i, line in enumerate(formatted_analysis):
-            with st.expander(f"Location {i+1} Details"):
-                st.markdown(line.replace("\n", "<br>"), unsafe_allow_html=True)
-                if i < len(water_resources):
-                    st.write(f"**Water Resources**: {water_resources[i]}")
-                else:
-                    st.write("**Water Resources**: Data not available.")
-                # Fetch detailed weather data
-                lat, lon = coords[i] if i < len(coords) else (0, 0)
-                weather_data = get_weather_data(lat, lon)
+        for location in view.locations:
+            with st.expander(location.title):
+                st.markdown(location.line, unsafe_allow_html=True)
+                if not location.found:
+                    st.warning("The analysis returned no usable data for this location, so it was left out of the ranking.")
+                st.write(f"**Water Resources**: {location.water_resources}")
                 st.write("**Current Weather Conditions**:")
-                st.write(f"- Recent Rainfall (last 1 hour): {weather_data['rain_1h']} mm")
-                st.write(f"- Recent Rainfall (last 3 hours): {weather_data['rain_3h']} mm")
-                st.write(f"- Humidity: {weather_data['humidity']}%")
-                st.write(f"- Cloud Cover: {weather_data['cloud_cover']}%")
-                st.write(f"- Temperature: {weather_data['temperature']}°C")
-                st.write(f"- Wind Speed: {weather_data['wind_speed']} m/s")
-                st.write(f"- Wind Direction: {weather_data['wind_direction']}°")
-                st.write(f"- Atmospheric Pressure: {weather_data['pressure']} hPa")
-                st.write(f"- Weather Description: {weather_data['weather_description'].capitalize()}")
+                for line in location.weather_lines:
+                    st.write(line)
     st.markdown('</div>', unsafe_allow_html=True)
     
     # Display recommendation
     st.subheader("✅ Recommendation")
     st.markdown('<div class="card">', unsafe_allow_html=True)
-    if recommendation.startswith("Error:"):
-        st.error(recommendation)
+    if view.recommendation_is_error:
+        st.error(view.recommendation)
     else:
-        rec_lines = recommendation.split("\n")
-        cleaned_rec_lines = []
-        for line in rec_lines:
-            if "Rainfall:" in line and "Capacity:" in line:
-                line = re.sub(r": Rainfall: \d+mm/year, Capacity: \d+M liters", "", line)
-            cleaned_rec_lines.append(line)
-        cleaned_recommendation = "\n".join(cleaned_rec_lines)
-        st.markdown(cleaned_recommendation.replace("\n", "<br>"), unsafe_allow_html=True)
+        st.markdown(view.recommendation.replace("\n", "<br>"), unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
-    
-    # Determine the recommended location index
-    recommended_index = -1
-    if not recommendation.startswith("Error:") and "Recommended: Location" in recommendation:
-        rec_match = re.search(r"Recommended: Location (\d+)", recommendation)
-        if rec_match:
-            recommended_index = int(rec_match.group(1)) - 1
 
     # Results Map with tooltips
-    map_center = coords[recommended_index] if recommended_index != -1 and recommended_index < len(coords) else coords[0] if coords else default_center
-    result_map = folium.Map(location=map_center, zoom_start=6)
-    capacities = []
-    rainfalls = []
-    analysis_lines = [line.strip() for line in analysis.split("\n") if line.strip() and line.startswith("- Location")]
-    for i, line in enumerate(analysis_lines):
-        try:
-            rainfall_match = re.search(r"Rainfall: (\d+\.?\d*)mm/year", line)
-            capacity_match = re.search(r"Capacity: (\d+\.?\d*)M liters", line)
-            rainfall = float(rainfall_match.group(1)) if rainfall_match else 0
-            capacity = float(capacity_match.group(1)) if capacity_match else 0
-        except (IndexError, ValueError, AttributeError) as e:
-            rainfall, capacity = 0, 0
-        capacities.append(capacity)
-        rainfalls.append(rainfall)
-        lat, lon = coords[i] if i < len(coords) else (0, 0)
-        city, country = get_location_details(lat, lon)
-        water_info = water_resources[i] if i < len(water_resources) else "Data not available."
-        weather_data = get_weather_data(lat, lon)
-        popup_content = f"""
-        <b>Location {i+1}</b><br>
-        Lat: {lat:.2f}, Lon: {lon:.2f}<br>
-        Country: {country}<br>
-        City: {city}<br>
-        Rainfall: {rainfall}mm/year<br>
-        Recent Rainfall (last 1h): {weather_data['rain_1h']}mm<br>
-        Recent Rainfall (last 3h): {weather_data['rain_3h']}mm<br>
-        Humidity: {weather_data['humidity']}% <br>
-        Cloud Cover: {weather_data['cloud_cover']}% <br>
-        Temperature: {weather_data['temperature']}°C <br>
-        Wind: {weather_data['wind_speed']} m/s, {weather_data['wind_direction']}° <br>
-        Pressure: {weather_data['pressure']} hPa <br>
-        Weather: {weather_data['weather_description'].capitalize()} <br>
-        Capacity: {capacity}M liters<br>
-        Water Resources: {water_info}<br>
-        Country Info: Population ~{int(lat*1e6):,} (simulated)<br>
-        Reservoir Status: Active (simulated)
-        """
-        color = "green" if i == recommended_index else "blue"
+    result_map = folium.Map(location=view.map_center, zoom_start=6)
+    for location in view.locations:
         folium.Marker(
-            [lat, lon],
-            popup=folium.Popup(popup_content, max_width=300),
-            icon=folium.Icon(color=color),
-            tooltip=f"Location {i+1}: {country}, {city}"
+            [location.lat, location.lon],
+            popup=folium.Popup(location.popup_html, max_width=300),
+            icon=folium.Icon(color=location.color),
+            tooltip=location.tooltip
         ).add_to(result_map)
     st.subheader("📍 Results Map")
     st.markdown('<div class="card">', unsafe_allow_html=True)
     st_folium(result_map, width=700, height=400, key="result_map")
     st.markdown('</div>', unsafe_allow_html=True)
 
-    # Plot Capacities
+    # Plot Capacities (rendered once per distinct data, see charts.py)
     st.subheader("📈 Reservoir Capacity Comparison")
     st.markdown('<div class="card">', unsafe_allow_html=True)
     try:
-        fig, ax = plt.subplots(figsize=(8, 6), dpi=100)
-        bars = ax.bar(
-            [f"Loc {i+1}" for i in range(len(capacities))],
-            capacities,
-            color=["green" if i == recommended_index else "blue" for i in range(len(capacities))]
-        )
-        ax.set_xlabel("Location")
-        ax.set_ylabel("Capacity (M liters)")
-        ax.set_title("Reservoir Capacity by Location")
-        ax.set_ylim(0, max(capacities) * 1.2 if capacities else 1)
-        ax.grid(True, linestyle="--", alpha=0.7)
-        for bar in bars:
-            yval = bar.get_height()
-            ax.text(bar.get_x() + bar.get_width()/2, yval + 0.3, f"{yval}M", ha="center", va="bottom", color="black")
-        plt.tight_layout()
-        buf = io.BytesIO()
-        plt.savefig(buf, format="png", bbox_inches="tight")
-        buf.seek(0)
-        img_str = base64.b64encode(buf.read()).decode()
-        st.image(f"data:image/png;base64,{img_str}")
-        plt.close(fig)
+        st.image(bar_chart(
+            [f"Loc {i+1}" for i in range(len(capacities))], capacities, recommended_index,
+            "Capacity (M liters)", "Reservoir Capacity by Location", value_format="{}M", label_offset=0.3,
+        ))
     except Exception as e:
         st.error(f"Failed to generate capacity plot: {str(e)}")
     st.markdown('</div>', unsafe_allow_html=True)
@@ -386,27 +292,10 @@ if st.session_state.results is not None:
     st.subheader("🌧️ Rainfall Comparison")
     st.markdown('<div class="card">', unsafe_allow_html=True)
     try:
-        fig, ax = plt.subplots(figsize=(8, 6), dpi=100)
-        bars = ax.bar(
-            [f"Loc {i+1}" for i in range(len(rainfalls))],
-            rainfalls,
-            color=["green" if i == recommended_index else "blue" for i in range(len(rainfalls))]
-        )
-        ax.set_xlabel("Location")
-        ax.set_ylabel("Rainfall (mm/year)")
-        ax.set_title("Rainfall by Location")
-        ax.set_ylim(0, max(rainfalls) * 1.2 if rainfalls else 1)
-        ax.grid(True, linestyle="--", alpha=0.7)
-        for bar in bars:
-            yval = bar.get_height()
-            ax.text(bar.get_x() + bar.get_width()/2, yval + 50, f"{int(yval)}mm", ha="center", va="bottom", color="black")
-        plt.tight_layout()
-        buf = io.BytesIO()
-        plt.savefig(buf, format="png", bbox_inches="tight")
-        buf.seek(0)
-        img_str = base64.b64encode(buf.read()).decode()
-        st.image(f"data:image/png;base64,{img_str}")
-        plt.close(fig)
+        st.image(bar_chart(
+            [f"Loc {i+1}" for i in range(len(rainfalls))], rainfalls, recommended_index,
+            "Rainfall (mm/year)", "Rainfall by Location", value_format="{:.0f}mm", label_offset=50,
+        ))
     except Exception as e:
         st.error(f"Failed to generate rainfall plot: {str(e)}")
     st.markdown('</div>', unsafe_allow_html=True)
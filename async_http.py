@@ -0,0 +1,143 @@
+# waterseeker-agent/async_http.py
+import asyncio
+import time
+import weakref
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import httpx
+import telemetry
+from http_client import (BACKOFF_FACTOR, DEFAULT_TIMEOUT, HOST_LIMITS, MAX_PER_HOST, MAX_RETRIES, POOL_MAXSIZE,
+                         REJECTED_STATUSES, RETRY_STATUSES)
+
+# Retry-After values above this are not waited for (the last response is returned instead)
+MAX_RETRY_AFTER = 30.0
+IDEMPOTENT_METHODS = frozenset(["DELETE", "GET", "HEAD", "OPTIONS", "PUT", "TRACE"])
+
+_clients = weakref.WeakKeyDictionary()
+
+
+class AsyncHttpClient:
+    """``httpx.AsyncClient`` counterpart of HttpClient, for one event loop.
+
+    Same policy as the sync client: at most ``max_per_host`` requests per host
+    at a time (an asyncio semaphore per host, so waiting costs no thread), and
+    429/5xx responses and connection errors retried with exponential backoff,
+    honouring Retry-After. Non-idempotent requests are only retried on connect
+    errors and 429/503 unless sent with ``idempotent=True``.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, max_per_host=MAX_PER_HOST, retries=MAX_RETRIES,
+                 backoff_factor=BACKOFF_FACTOR, host_limits=None, pool_maxsize=POOL_MAXSIZE):
+        self.max_per_host = max_per_host
+        self.host_limits = dict(host_limits or {})
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        connect, read = timeout
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read, connect=connect),
+            limits=httpx.Limits(max_keepalive_connections=pool_maxsize),
+        )
+        self._semaphores = {}
+        self._stats = {}
+
+    @asynccontextmanager
+    async def stream(self, method, url, idempotent=None, **kwargs):
+        """Send a request and yield the response before its body is read."""
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        host = urlsplit(url).netloc
+        stats = self._stats.setdefault(host, {"requests": 0, "errors": 0, "retries": 0, "in_flight": 0, "total_seconds": 0.0})
+        async with self._semaphore(host):
+            stats["in_flight"] += 1
+            start = time.monotonic()
+            try:
+                response = await self._send(method, url, host, stats, idempotent, kwargs)
+            except Exception:
+                stats["errors"] += 1
+                raise
+            finally:
+                stats["in_flight"] -= 1
+                stats["requests"] += 1
+                stats["total_seconds"] += time.monotonic() - start
+            try:
+                yield response
+            finally:
+                await response.aclose()
+
+    async def request(self, method, url, idempotent=None, **kwargs):
+        async with self.stream(method, url, idempotent, **kwargs) as response:
+            await response.aread()
+        return response
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def _send(self, method, url, host, stats, idempotent, kwargs):
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                response = await self.client.send(self.client.build_request(method, url, **kwargs), stream=True)
+            except httpx.TransportError as e:
+                # A request that may have reached the server is only resent when repeating it is harmless
+                if last_attempt or not (idempotent or isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))):
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                retryable = RETRY_STATUSES if idempotent else REJECTED_STATUSES
+                if response.status_code not in retryable or last_attempt:
+                    return response
+                delay = _retry_after(response)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                elif delay > MAX_RETRY_AFTER:
+                    return response
+                await response.aclose()
+            stats["retries"] += 1
+            telemetry.count("retries_total", operation="http", host=host)
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt):
+        # Like urllib3: retry at once, then backoff_factor * 2 ** n
+        return 0.0 if attempt == 0 else self.backoff_factor * 2 ** attempt
+
+    def _semaphore(self, host):
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._semaphores[host] = asyncio.Semaphore(self.host_limits.get(host, self.max_per_host))
+        return semaphore
+
+    def stats(self):
+        hosts = {host: dict(stats) for host, stats in self._stats.items()}
+        for stats in hosts.values():
+            stats["avg_seconds"] = stats["total_seconds"] / stats["requests"] if stats["requests"] else 0.0
+        return {"hosts": hosts}
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def get_async_http_client():
+    """The shared AsyncHttpClient of the running event loop (created on first use)."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncHttpClient(host_limits=HOST_LIMITS)
+    return client
@@ -0,0 +1,207 @@
+# waterseeker-agent/batch.py
+# Headless bulk site screening:
+#   python batch.py sites.csv -o results.jsonl --batch-size 20 --concurrency 4
+# Input is CSV (or Parquet, with pyarrow installed) with lat/lon columns
+# (latitude/longitude also accepted) and an optional id column. Results are
+# written per finished chunk; rerunning the same command resumes after the
+# last checkpointed chunk. Set WATSON_API_KEY in the environment.
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+LAT_COLUMNS = ("lat", "latitude")
+LON_COLUMNS = ("lon", "lng", "long", "longitude")
+
+
+def _pick(row, names):
+    for name in names:
+        if name in row and row[name] not in (None, ""):
+            return row[name]
+    return None
+
+
+def read_sites(path):
+    """Yield (row_index, site_id, lat, lon) from a CSV or Parquet file without loading it whole."""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        rows = (row for batch in pq.ParquetFile(path).iter_batches(batch_size=10000) for row in batch.to_pylist())
+        yield from _parse_rows(rows)
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from _parse_rows(csv.DictReader(f))
+
+
+def _parse_rows(rows):
+    for index, row in enumerate(rows):
+        row = {str(k).strip().lower(): v for k, v in row.items()}
+        lat, lon = _pick(row, LAT_COLUMNS), _pick(row, LON_COLUMNS)
+        if lat is None or lon is None:
+            raise ValueError(f"Row {index + 1} has no lat/lon columns")
+        yield index, row.get("id", index), float(lat), float(lon)
+
+
+def chunked(sites, size):
+    chunk = []
+    for site in sites:
+        chunk.append(site)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Checkpoint:
+    """Set of finished chunk indices, saved atomically next to the output."""
+
+    def __init__(self, path, input_path, batch_size):
+        self.path = path
+        self.meta = {"input": os.path.abspath(input_path), "batch_size": batch_size}
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("batch_size") != batch_size or saved.get("input") != self.meta["input"]:
+                raise SystemExit(f"Checkpoint {path} was written for a different input or batch size; "
+                                 "remove it (and the output) to start over.")
+            self.done = set(saved.get("done", []))
+
+    def mark_done(self, chunk_index):
+        self.done.add(chunk_index)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(dict(self.meta, done=sorted(self.done)), f)
+        os.replace(tmp, self.path)
+
+
+class JSONLWriter:
+    def __init__(self, path, done_chunks):
+        # Drop rows of chunks that were written but never checkpointed (interrupted run)
+        if os.path.exists(path):
+            tmp = path + ".tmp"
+            with open(path, encoding="utf-8") as src, open(tmp, "w", encoding="utf-8") as dst:
+                for line in src:
+                    if line.strip() and json.loads(line)["chunk"] in done_chunks:
+                        dst.write(line)
+            os.replace(tmp, path)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write_chunk(self, chunk_index, rows):
+        for row in rows:
+            self._file.write(json.dumps(row) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    # One part file per chunk inside the output directory, so finished chunks are never rewritten
+    def __init__(self, path, done_chunks):
+        import pyarrow  # noqa: F401  (fail early if pyarrow is missing)
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def write_chunk(self, chunk_index, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        part = os.path.join(self.path, f"part-{chunk_index:06d}.parquet")
+        pq.write_table(pa.Table.from_pylist(rows), part + ".tmp")
+        os.replace(part + ".tmp", part)
+
+    def close(self):
+        pass
+
+
+def screen_chunk(chunk_index, chunk, output_mode, enrich):
+    from waterseeker import analyze_locations, get_location_info
+    locations = [(lat, lon) for _, _, lat, lon in chunk]
+    _, records = analyze_locations(locations, output_mode=output_mode)
+    rows = []
+    for (row_index, site_id, lat, lon), record in zip(chunk, records):
+        row = {
+            "chunk": chunk_index,
+            "row": row_index,
+            "id": site_id,
+            "lat": lat,
+            "lon": lon,
+            "rainfall_mm_per_year": record.rainfall if record.found else None,
+            "capacity_m_liters": record.capacity if record.found else None,
+            "found": record.found,
+        }
+        if enrich:
+            country, city, water_data = get_location_info(lat, lon, [])
+            row.update(country=country, city=city, water_resources=water_data)
+        rows.append(row)
+    return rows
+
+
+def run_batch(input_path, output_path, batch_size=10, concurrency=4, output_mode=None, enrich=False, log=print):
+    checkpoint = Checkpoint(output_path + ".checkpoint.json", input_path, batch_size)
+    writer_cls = ParquetWriter if output_path.endswith(".parquet") else JSONLWriter
+    writer = writer_cls(output_path, checkpoint.done)
+    if checkpoint.done:
+        log(f"Resuming: {len(checkpoint.done)} chunk(s) already done.")
+
+    start = time.monotonic()
+    sites_done = chunks_failed = 0
+    pending = {}
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            chunks = ((i, chunk) for i, chunk in enumerate(chunked(read_sites(input_path), batch_size))
+                      if i not in checkpoint.done)
+            exhausted = False
+            while pending or not exhausted:
+                # Keep at most 2x concurrency chunks in memory while streaming the input
+                while not exhausted and len(pending) < 2 * concurrency:
+                    try:
+                        chunk_index, chunk = next(chunks)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[executor.submit(screen_chunk, chunk_index, chunk, output_mode, enrich)] = (chunk_index, len(chunk))
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    chunk_index, size = pending.pop(future)
+                    try:
+                        rows = future.result()
+                    except Exception as e:
+                        chunks_failed += 1
+                        log(f"Chunk {chunk_index} failed, will be retried on the next run: {e}")
+                        continue
+                    writer.write_chunk(chunk_index, rows)
+                    checkpoint.mark_done(chunk_index)
+                    sites_done += size
+                    elapsed = time.monotonic() - start
+                    log(f"Chunk {chunk_index} done: {sites_done} sites in {elapsed:.1f}s "
+                        f"({sites_done / elapsed * 60:.1f} sites/min)")
+    finally:
+        writer.close()
+    elapsed = time.monotonic() - start
+    rate = sites_done / elapsed * 60 if elapsed > 0 else 0.0
+    log(f"Screened {sites_done} sites in {elapsed:.1f}s ({rate:.1f} sites/min); {chunks_failed} chunk(s) failed.")
+    return {"sites": sites_done, "seconds": elapsed, "sites_per_minute": rate, "failed_chunks": chunks_failed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Screen many candidate sites with the WaterSeeker analysis.")
+    parser.add_argument("input", help="CSV or Parquet file with lat/lon columns")
+    parser.add_argument("-o", "--output", required=True, help="results .jsonl file or .parquet directory")
+    parser.add_argument("--batch-size", type=int, default=10, help="locations per watsonx prompt")
+    parser.add_argument("--concurrency", type=int, default=4, help="prompts in flight at once")
+    parser.add_argument("--output-mode", choices=["text", "json"], help="analysis output format")
+    parser.add_argument("--enrich", action="store_true", help="also geocode and fetch water data (Nominatim: 1 site/s)")
+    args = parser.parse_args(argv)
+    summary = run_batch(args.input, args.output, args.batch_size, args.concurrency, args.output_mode, args.enrich)
+    return 1 if summary["failed_chunks"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+# waterseeker-agent/benchmarks/capacity_bench.py
+# Benchmark: reservoir capacity estimates on a synthetic DEM tile.
+# Run from the repository root: python -m benchmarks.capacity_bench [--sites 2000] [--workers 1 4]
+# Also checks reservoir() against shapes with a closed-form volume (a paraboloid bowl and a tilted V valley).
+import argparse
+import math
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from capacity import MAX_BASIN_RADIUS, build_dem, estimate_capacities, reservoir
+
+
+def check_analytic(cell=10.0, dam_height=10.0):
+    """(name, estimated, exact) M liters for shapes whose volume is known."""
+    n = 401
+    y, x = (np.mgrid[0:n, 0:n] - n // 2) * cell
+    a, s, k = 1e-4, 0.01, 0.1
+    bowl = reservoir(a * (x ** 2 + y ** 2), (n // 2, n // 2), dam_height, cell, cell)
+    valley = reservoir(s * x + k * np.abs(y), (n // 2, n // 2), dam_height, cell, cell)
+    return [("paraboloid bowl", bowl.capacity, math.pi * dam_height ** 2 / (2 * a) / 1000),
+            ("V valley", valley.capacity, dam_height ** 3 / (3 * s * k) / 1000)]
+
+
+def synthetic_dem(size, relief=1500.0, seed=0):
+    """Fractal (fractional Brownian) terrain in m, size x size cells, with ``relief`` m between its lowest and highest cell."""
+    rng = np.random.default_rng(seed)
+    fy, fx = np.fft.fftfreq(size)[:, None], np.fft.rfftfreq(size)[None, :]
+    frequency = np.hypot(fy, fx)
+    frequency[0, 0] = np.inf
+    spectrum = (rng.normal(size=frequency.shape) + 1j * rng.normal(size=frequency.shape)) / frequency ** 1.8
+    z = np.fft.irfft2(spectrum, s=(size, size))
+    return ((z - z.min()) / (z.max() - z.min()) * relief + 100).astype(np.float32)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark DEM reservoir capacity estimates.")
+    parser.add_argument("--size", type=int, default=3600, help="tile cells per side (1 arc-second cells)")
+    parser.add_argument("--sites", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count()])
+    parser.add_argument("--dam-height", type=float, default=10.0)
+    parser.add_argument("--max-radius", type=float, default=MAX_BASIN_RADIUS, help="m the search window may grow to")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    for name, estimated, exact in check_analytic(dam_height=args.dam_height):
+        print(f"{name}: {estimated:.1f}M liters (exact {exact:.1f}, {(estimated - exact) / exact:+.1%})")
+
+    directory = tempfile.mkdtemp(prefix="waterseeker-dem-")
+    try:
+        extent = args.size / 3600
+        np.save(os.path.join(directory, "synthetic.npy"), synthetic_dem(args.size, seed=args.seed))
+        build_dem([os.path.join(directory, "synthetic.npy")], directory, bounds=(35, -80, 35 + extent, -80 + extent))
+        print(f"Synthetic DEM: {args.size}x{args.size} cells ({args.size ** 2 * 4 / 1e6:.0f} MB, memory-mapped)")
+        rng = np.random.default_rng(args.seed)
+        points = list(zip(rng.uniform(35, 35 + extent, args.sites), rng.uniform(-80, -80 + extent, args.sites)))
+        for workers in args.workers:
+            start = time.perf_counter()
+            estimates = estimate_capacities(points, args.dam_height, max_radius=args.max_radius, workers=workers, path=directory)
+            seconds = time.perf_counter() - start
+            capacities = np.array([e.capacity for e in estimates if e is not None])
+            print(f"{workers:>3} worker(s): {args.sites} sites in {seconds:.2f}s ({args.sites / seconds * 60:,.0f} sites/min), "
+                  f"median {np.median(capacities):.1f}M liters, {sum(e.truncated for e in estimates if e is not None)} truncated")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
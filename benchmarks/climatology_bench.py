@@ -0,0 +1,62 @@
+# waterseeker-agent/benchmarks/climatology_bench.py
+# Micro-benchmark: climatology lookups on a synthetic global raster.
+# Run from the repository root: python -m benchmarks.climatology_bench [--resolution 0.1667] [--sizes 1 1000 100000]
+# The raster is a smooth analytic field, so the bilinear lookups are also checked against it.
+import argparse
+import shutil
+import tempfile
+import timeit
+import numpy as np
+from climatology import Climatology, build_climatology
+
+
+def synthetic_field(lat, lon):
+    """Annual rainfall (mm/year): wet tropics, dry subtropics, a longitudinal wave."""
+    lat, lon = np.radians(lat), np.radians(lon)
+    return 1000 + 900 * np.cos(2 * lat) ** 3 + 300 * np.sin(3 * lon) * np.cos(lat)
+
+
+def write_synthetic(directory, resolution, ocean_fraction=0.1, seed=0):
+    """Store a global grid of the synthetic field, with some cells left without data."""
+    rows, cols = int(round(180 / resolution)), int(round(360 / resolution))
+    lat = 90 - (np.arange(rows) + 0.5) * 180 / rows
+    lon = -180 + (np.arange(cols) + 0.5) * 360 / cols
+    grid = synthetic_field(lat[:, None], lon[None, :]).astype(np.float32)
+    grid[np.random.default_rng(seed).random(grid.shape) < ocean_fraction] = np.nan
+    path = f"{directory}/grid.npy"
+    np.save(path, grid)
+    build_climatology([path], directory, bounds=(-90, -180, 90, 180), source="synthetic")
+    return grid.shape
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark climatology point and batch lookups.")
+    parser.add_argument("--resolution", type=float, default=1 / 6, help="grid cell size in degrees (default 10 arc-minutes)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 1000, 100000, 1000000], help="points per lookup")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp(prefix="waterseeker-climatology-")
+    try:
+        rows, cols = write_synthetic(directory, args.resolution, seed=args.seed)
+        climatology = Climatology(directory)
+        print(f"Synthetic grid: {rows}x{cols} cells ({rows * cols * 4 / 1e6:.0f} MB, memory-mapped)")
+        rng = np.random.default_rng(args.seed)
+        print(f"{'points':>10} {'per call':>12} {'per point':>12} {'max error':>12} {'no data':>8}")
+        for size in args.sizes:
+            lat, lon = rng.uniform(-89, 89, size), rng.uniform(-180, 180, size)
+            if size == 1:
+                lat, lon = float(lat[0]), float(lon[0])
+            number = max(1, 200000 // size)
+            seconds = min(timeit.repeat(lambda: climatology.lookup(lat, lon), number=number, repeat=3)) / number
+            values = climatology.lookup(lat, lon)
+            known = ~np.isnan(values)
+            error = np.abs(values[known] - synthetic_field(np.atleast_1d(lat)[known], np.atleast_1d(lon)[known]))
+            print(f"{size:>10} {seconds * 1e6:>10.1f}us {seconds / size * 1e6:>10.3f}us "
+                  f"{error.max() if error.size else 0.0:>9.2f}mm {1 - known.mean():>8.1%}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# waterseeker-agent/benchmarks/e2e_bench.py
+# End-to-end latency benchmark against the local fakes in benchmarks/fake_services.py.
+# Run from the repository root:
+#   python -m benchmarks.e2e_bench [--scenarios 1 5 50 500] [--repeats 3] [--compare old.json]
+# Each scenario runs with cold caches (LLM, geocode, USGS tiles, weather, IAM token all
+# cleared) and then warm; p50/p95/p99 per stage and end to end are printed and saved as JSON.
+import argparse
+import inspect
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from benchmarks.fake_services import FakeServices
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+
+def percentile(sorted_values, q):
+    """Linear-interpolated percentile (q in 0..100) of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(samples):
+    values = sorted(samples)
+    return {
+        "n": len(values),
+        "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+    }
+
+
+class StageTimer:
+    """Times calls to module-level functions, grouped by stage name."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def wrap(self, module, name, stage):
+        original = getattr(module, name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+
+        async def timed_async(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await original(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+
+        setattr(module, name, timed_async if inspect.iscoroutinefunction(original) else timed)
+
+    def take(self):
+        with self._lock:
+            samples, self.samples = self.samples, defaultdict(list)
+        return samples
+
+
+def scenario_locations(count, seed):
+    # Spread over the continental US, like clicks on the default map view
+    rng = random.Random(seed)
+    return [(round(rng.uniform(30, 45), 4), round(rng.uniform(-120, -75), 4)) for _ in range(count)]
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, timeout=10).stdout.strip()
+    except Exception:
+        return ""
+
+
+def run(args):
+    services = FakeServices(args.latency_scale, args.jitter_scale, args.error_rate, args.seed).start()
+    cache_dir = tempfile.mkdtemp(prefix="waterseeker-bench-")
+    # Must be set before the project modules are imported (they read it at import time)
+    os.environ.update(services.environ())
+    os.environ.update({
+        "WATERSEEKER_CACHE_DIR": cache_dir,
+        "WATERSEEKER_NOMINATIM_INTERVAL": str(args.nominatim_interval),
+        "WATSON_API_KEY": os.environ.get("WATSON_API_KEY", "bench"),
+    })
+    if args.output_mode:
+        os.environ["WATERSEEKER_ANALYSIS_OUTPUT_MODE"] = args.output_mode
+    import geocache
+    import iam
+    import usgs
+    import waterseeker
+    import weather
+
+    timer = StageTimer()
+    timer.wrap(iam, "request_iam_token_async", "iam_token")
+    timer.wrap(waterseeker, "_analyze", "analysis")
+    timer.wrap(waterseeker, "_recommend", "recommendation")
+    timer.wrap(waterseeker, "_enrich_location", "enrichment")
+    timer.wrap(waterseeker, "reverse_geocode_async", "geocode")
+    timer.wrap(waterseeker, "fetch_water_resource_data_async", "water_data")
+    timer.wrap(weather, "get_weather_batch_async", "weather")
+
+    def reset_caches():
+        waterseeker.llm_cache.invalidate()
+        geocache.get_geocode_cache().clear()
+        usgs.get_tile_cache().clear()
+        weather.weather_cache.clear()
+        waterseeker.token_manager.clear()
+
+    results = {}
+    try:
+        for count in args.scenarios:
+            locations = scenario_locations(count, args.seed + count)
+            samples = {"cold": defaultdict(list), "warm": defaultdict(list)}
+            found = {"cold": [], "warm": []}
+            for repeat in range(args.repeats):
+                reset_caches()
+                for state in ("cold", "warm"):
+                    timer.take()
+                    start = time.perf_counter()
+                    # The same path app.py takes: streamed analysis, then weather for every location
+                    result = waterseeker.run_waterseeker_agent(locations, on_location=lambda loc_id, line: None)
+                    weather.get_weather_batch(result.locations, "bench")
+                    elapsed = time.perf_counter() - start
+                    for stage, values in timer.take().items():
+                        samples[state][stage].extend(values)
+                    samples[state]["end_to_end"].append(elapsed)
+                    found[state].append(sum(record.found for record in result.records) / count)
+                    print(f"  {count:>4} locations, {state}, run {repeat + 1}: {elapsed * 1000:.0f} ms", flush=True)
+            for state in ("cold", "warm"):
+                results[f"{count}/{state}"] = {
+                    "locations": count,
+                    "cache": state,
+                    "found_ratio": sum(found[state]) / len(found[state]),
+                    "stages": {stage: summarize(values) for stage, values in sorted(samples[state].items())},
+                }
+    finally:
+        services.stop()
+    return {
+        "meta": {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "config": vars(args),
+        },
+        "scenarios": results,
+    }
+
+
+def print_report(report):
+    print(f"\n{'scenario':<12} {'stage':<16} {'n':>5} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, scenario in report["scenarios"].items():
+        for stage, stats in scenario["stages"].items():
+            print(f"{name:<12} {stage:<16} {stats['n']:>5} {stats['p50_ms']:>10.1f} {stats['p95_ms']:>10.1f} {stats['p99_ms']:>10.1f}")
+
+
+def print_comparison(report, baseline):
+    print("\nEnd to end versus baseline (p50 / p95):")
+    for name, scenario in report["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name, {}).get("stages", {}).get("end_to_end")
+        new = scenario["stages"]["end_to_end"]
+        if not old:
+            print(f"  {name:<12} (not in baseline)")
+            continue
+        deltas = []
+        for key in ("p50_ms", "p95_ms"):
+            change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            deltas.append(f"{old[key]:.0f} -> {new[key]:.0f} ms ({change:+.1f}%)")
+        print(f"  {name:<12} " + " / ".join(deltas))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end latency benchmark with local fake services.")
+    parser.add_argument("--scenarios", type=int, nargs="+", default=[1, 5, 50, 500], help="location counts")
+    parser.add_argument("--repeats", type=int, default=3, help="cold+warm runs per scenario")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplies every fake service latency")
+    parser.add_argument("--jitter-scale", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--nominatim-interval", type=float, default=0.0, help="geocoding rate limit (s); 1.0 in production")
+    parser.add_argument("--output-mode", choices=["text", "json"], help="analysis output format")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="results JSON (default: benchmarks/results/e2e-<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results JSON to compare end-to-end latency with")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print_report(report)
+    output = args.output or os.path.join(RESULTS_DIR, f"e2e-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
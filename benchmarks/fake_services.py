@@ -0,0 +1,270 @@
+# waterseeker-agent/benchmarks/fake_services.py
+# Local stand-ins for IAM, watsonx, Nominatim, USGS, Environment Canada and OpenWeatherMap,
+# with configurable latency, jitter and error rate. Used by benchmarks/e2e_bench.py; can also
+# be run on its own (python -m benchmarks.fake_services) to point the app at them.
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Seconds of (latency, jitter) per service at --latency-scale 1
+DEFAULT_LATENCIES = {
+    "iam": (0.15, 0.05),
+    "watsonx": (0.8, 0.2),
+    "nominatim": (0.03, 0.01),
+    "usgs": (0.12, 0.04),
+    "ec": (0.1, 0.03),
+    "owm": (0.04, 0.01),
+}
+# Delay between streamed chunks, as a fraction of the service latency
+STREAM_CHUNK_FRACTION = 0.01
+STREAM_CHUNK_CHARS = 24
+PROMPT_LOCATION = re.compile(r"Location (\d+): \(lat: (-?[\d.]+), lon: (-?[\d.]+)\)")
+ANALYSIS_ROW = re.compile(r"- Location (\d+) \(lat: (-?[\d.]+), lon: (-?[\d.]+)\): Rainfall: ([\d.]+)mm/year, Capacity: ([\d.]+)M liters")
+
+
+class ServiceConfig:
+    def __init__(self, latency, jitter=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            seconds = self.latency + self._rng.uniform(-self.jitter, self.jitter)
+        time.sleep(max(0.0, seconds))
+
+    def should_fail(self):
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+
+def _prompt_rng(text):
+    # Greedy decoding is deterministic, so the fake output depends only on the prompt
+    return random.Random(int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], 16))
+
+
+def fake_generation(prompt):
+    """Plausible Granite output for each prompt the agent sends, including the messy formats."""
+    rng = _prompt_rng(prompt)
+    locations = PROMPT_LOCATION.findall(prompt)
+    if "JSON array" in prompt:
+        items = []
+        for loc_id, _, _ in locations:
+            roll = rng.random()
+            if roll < 0.05:
+                continue  # skipped location
+            if roll < 0.08:
+                items.append({"location": int(loc_id), "rainfall_mm_per_year": "unknown", "capacity_m_liters": 4})
+                continue
+            items.append({"location": int(loc_id), "rainfall_mm_per_year": rng.randint(200, 3000), "capacity_m_liters": rng.randint(1, 50)})
+        return "Here is the analysis:\n```json\n" + json.dumps(items, indent=1) + "\n```"
+    if prompt.startswith("Analyze these locations"):
+        lines = ["Here is the analysis of the provided locations:"]
+        for loc_id, lat, lon in locations:
+            rainfall, capacity = rng.randint(200, 3000), rng.randint(1, 50)
+            roll = rng.random()
+            if roll < 0.75:
+                lines.append(f"- Location {loc_id} (lat: {lat}, lon: {lon}): Rainfall: {rainfall}mm/year, Capacity: {capacity}M liters")
+            elif roll < 0.95:
+                # The sub-bullet format the prompt asks the model not to use
+                lines.append(f"- Location {loc_id} (lat: {lat}, lon: {lon}):")
+                lines.append(f"  - Rainfall: {rainfall}mm/year")
+                lines.append(f"  - Capacity: {capacity}M liters")
+            # else: the model skipped this location
+        return "\n".join(lines)
+    if prompt.startswith("Recommend the best location"):
+        rows = ANALYSIS_ROW.findall(prompt)
+        if not rows:
+            return "- No recommendation: No locations were analyzed."
+        best = max(rows, key=lambda r: (float(r[4]), float(r[3])))
+        return (f"- Recommended: Location {best[0]} (lat: {best[1]}, lon: {best[2]})\n"
+                f"- Justification: Highest capacity ({best[4]}M liters) of the analyzed locations.")
+    return "- Justification: It has the highest estimated capacity, with adequate rainfall."
+
+
+def fake_address(lat, lon):
+    if lat > 49:
+        country = "Canada"
+    elif lat < 0:
+        country = "Brazil"
+    else:
+        country = "United States"
+    return {"town": f"Town {abs(int(lat * 10)) % 97}-{abs(int(lon * 10)) % 89}", "country": country}
+
+
+def fake_rdb(bbox, rng, sites=8):
+    lon_min, lat_min, lon_max, lat_max = (float(v) for v in bbox.split(","))
+    lines = [
+        "#",
+        "# US Geological Survey",
+        "# retrieved: fake",
+        "#",
+        "agency_cd\tsite_no\tstation_nm\tsite_tp_cd\tdec_lat_va\tdec_long_va\tcoord_acy_cd\tdec_coord_datum_cd\talt_va\talt_acy_va\talt_datum_cd\thuc_cd",
+        "5s\t15s\t50s\t7s\t16s\t16s\t1s\t10s\t8s\t3s\t10s\t16s",
+    ]
+    for i in range(sites):
+        lat, lon = rng.uniform(lat_min, lat_max), rng.uniform(lon_min, lon_max)
+        site_type = "ST" if rng.random() < 0.6 else "GW"
+        name = f"CREEK {i} NEAR TOWN" if site_type == "ST" else f"WELL {i}"
+        lines.append(f"USGS\t{rng.randint(10**7, 10**8)}\t{name}\t{site_type}\t{lat:.7f}\t{lon:.7f}\tS\tNAD83\t300\t20\tNAVD88\t03020201")
+    return "\n".join(lines) + "\n"
+
+
+def fake_weather(lat, lon, rng):
+    rain = round(rng.random() * 3, 2) if rng.random() < 0.3 else 0
+    data = {
+        "coord": {"lat": lat, "lon": lon},
+        "weather": [{"description": "light rain" if rain else "clear sky"}],
+        "main": {"temp": round(rng.uniform(-5, 35), 1), "humidity": rng.randint(20, 100), "pressure": rng.randint(990, 1030)},
+        "wind": {"speed": round(rng.uniform(0, 12), 1), "deg": rng.randint(0, 359)},
+        "clouds": {"all": rng.randint(0, 100)},
+    }
+    if rain:
+        data["rain"] = {"1h": rain}
+    return data
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    service = None
+    config = None
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, delayed ACKs add ~40 ms per response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json"):
+        payload = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _fail_maybe(self):
+        if self.config.should_fail():
+            self.config.delay()
+            self._send(503, json.dumps({"error": "injected failure"}))
+            return True
+        return False
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0)).decode("utf-8")
+        if self._fail_maybe():
+            return
+        if self.service == "iam":
+            self.config.delay()
+            self._send(200, json.dumps({"access_token": f"fake-{time.time()}", "expires_in": 3600}))
+        elif self.service == "watsonx":
+            if not self.headers.get("Authorization", "").startswith("Bearer "):
+                self._send(401, json.dumps({"error": "missing token"}))
+                return
+            text = fake_generation(json.loads(body)["input"])
+            if "generation_stream" in self.path:
+                self._stream(text)
+            else:
+                self.config.delay()
+                self._send(200, json.dumps({"results": [{"generated_text": text, "stop_reason": "eos_token"}]}))
+        else:
+            self._send(404, "{}")
+
+    def _stream(self, text):
+        # First chunk after the service latency, then a steady trickle like token generation
+        self.config.delay()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        chunk_delay = self.config.latency * STREAM_CHUNK_FRACTION
+        for i, start in enumerate(range(0, len(text), STREAM_CHUNK_CHARS)):
+            event = {"results": [{"generated_text": text[start:start + STREAM_CHUNK_CHARS]}]}
+            self.wfile.write(f"id: {i + 1}\nevent: message\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(chunk_delay)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if self._fail_maybe():
+            return
+        self.config.delay()
+        rng = _prompt_rng(self.path)
+        if self.service == "nominatim":
+            lat, lon = float(query["lat"]), float(query["lon"])
+            address = fake_address(lat, lon)
+            self._send(200, json.dumps({
+                "lat": str(lat), "lon": str(lon), "display_name": f"{address['town']}, {address['country']}", "address": address,
+            }))
+        elif self.service == "usgs":
+            if rng.random() < 0.1:
+                self._send(404, "No sites found matching all criteria", "text/plain")
+            else:
+                self._send(200, fake_rdb(query["bBox"], rng), "text/plain")
+        elif self.service == "ec":
+            self._send(200, "<html><body>Station search results</body></html>", "text/html")
+        elif self.service == "owm":
+            self._send(200, json.dumps(fake_weather(float(query["lat"]), float(query["lon"]), rng)))
+        else:
+            self._send(404, "{}")
+
+
+class FakeServices:
+    """One local HTTP server per service, each on its own port (so per-host limits apply separately)."""
+
+    def __init__(self, latency_scale=1.0, jitter_scale=1.0, error_rate=0.0, seed=0):
+        self.servers = {}
+        for i, (service, (latency, jitter)) in enumerate(DEFAULT_LATENCIES.items()):
+            config = ServiceConfig(latency * latency_scale, jitter * latency_scale * jitter_scale,
+                                   error_rate if service != "iam" else 0.0, seed + i)
+            handler = type(f"{service.title()}Handler", (FakeHandler,), {"service": service, "config": config})
+            server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+            server.daemon_threads = True
+            self.servers[service] = server
+
+    def start(self):
+        for server in self.servers.values():
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+
+    def url(self, service):
+        host, port = self.servers[service].server_address
+        return f"http://{host}:{port}"
+
+    def environ(self):
+        """Environment variables that point the agent at these servers."""
+        nominatim = urlsplit(self.url("nominatim"))
+        return {
+            "WATERSEEKER_IAM_URL": self.url("iam") + "/identity/token",
+            "WATERSEEKER_WATSONX_URL": self.url("watsonx"),
+            "WATERSEEKER_NOMINATIM_DOMAIN": nominatim.netloc,
+            "WATERSEEKER_NOMINATIM_SCHEME": "http",
+            "WATERSEEKER_USGS_URL": self.url("usgs") + "/nwis/site/",
+            "WATERSEEKER_EC_URL": self.url("ec") + "/search/station_e.html",
+            "WATERSEEKER_OWM_URL": self.url("owm") + "/data/2.5/weather",
+        }
+
+
+if __name__ == "__main__":
+    services = FakeServices().start()
+    for name, value in services.environ().items():
+        print(f"export {name}={value}")
+    print("# Fake services running; Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        services.stop()
@@ -0,0 +1,99 @@
+# waterseeker-agent/benchmarks/importtime.py
+# Cold-start import profile with regression budgets, built on `python -X importtime`.
+# Run from the repository root: python -m benchmarks.importtime [--target waterseeker] [--top 15]
+# Exits with status 1 when a target's import time exceeds its budget.
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Import statement and budget (ms) per target; "app" is what app.py imports before the first paint
+TARGETS = {
+    # Mostly streamlit; the project modules add ~30 ms
+    "app": ("import streamlit, charts, geocache, telemetry, view_model", 400),
+    # Imported by app.py just before the first map is drawn; streamlit_folium pulls in pandas
+    "map": ("import folium, streamlit_folium", 1200),
+    "waterseeker": ("import waterseeker", 400),
+    "geocache": ("import geocache", 60),
+    "charts": ("import charts", 60),
+    "view_model": ("import view_model", 60),
+}
+
+
+def parse_importtime(stderr):
+    """[(name, depth, self_us, cumulative_us)] from -X importtime output."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        raw_name = parts[2].rstrip()
+        depth = (len(raw_name) - len(raw_name.lstrip()) - 1) // 2
+        entries.append((raw_name.strip(), depth, int(parts[0]), int(parts[1])))
+    return entries
+
+
+def profile(statement):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=REPO_ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise Exception(f"'{statement}' failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def measure(statement, startup_modules, repeats=3):
+    """Best-of-repeats total import time (ms) of the statement, plus that run's entries."""
+    best_total, best_entries = None, None
+    for _ in range(repeats):
+        entries = profile(statement)
+        # Drop everything up to the last module the bare interpreter imports at startup
+        last_startup = max((i for i, e in enumerate(entries) if e[1] == 0 and e[0] in startup_modules), default=-1)
+        entries = entries[last_startup + 1:]
+        total = sum(cumulative for _, depth, _, cumulative in entries if depth == 0) / 1000
+        if best_total is None or total < best_total:
+            best_total, best_entries = total, entries
+    return best_total, best_entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time profile with budgets.")
+    parser.add_argument("--target", action="append", choices=sorted(TARGETS), help="default: all targets")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports listed per target")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    startup_modules = {name for name, depth, _, _ in profile("pass") if depth == 0}
+    results, over_budget = {}, []
+    for target in args.target or list(TARGETS):
+        statement, budget_ms = TARGETS[target]
+        total_ms, entries = measure(statement, startup_modules, args.repeats)
+        status = "OK" if total_ms <= budget_ms else "OVER BUDGET"
+        if total_ms > budget_ms:
+            over_budget.append(target)
+        print(f"{target}: {total_ms:.1f} ms (budget {budget_ms} ms) {status}")
+        slowest = sorted(entries, key=lambda e: -e[3])[:args.top]
+        for name, depth, self_us, cumulative_us in slowest:
+            print(f"    {cumulative_us / 1000:8.1f} ms cumulative {self_us / 1000:8.1f} ms self  {name}")
+        results[target] = {
+            "total_ms": total_ms,
+            "budget_ms": budget_ms,
+            "slowest": [{"module": name, "cumulative_ms": c / 1000, "self_ms": s / 1000} for name, _, s, c in slowest],
+        }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if over_budget:
+        print(f"Import-time regression: {', '.join(over_budget)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+# waterseeker-agent/benchmarks/parser_bench.py
+# Micro-benchmark: single-pass AnalysisParser vs. the previous multi-pass parsing.
+# Run from the repository root: python -m benchmarks.parser_bench [--sizes 100 500 1000]
+import argparse
+import random
+import re
+import timeit
+from analysis_parser import parse_analysis
+
+
+def synthetic_analysis(n, seed=0):
+    """Analysis text for n locations mixing single-line, sub-bullet and missing rows."""
+    rng = random.Random(seed)
+    locations = [(round(rng.uniform(-60, 60), 4), round(rng.uniform(-180, 180), 4)) for _ in range(n)]
+    lines = ["Here is the analysis of the provided locations:"]
+    for i, (lat, lon) in enumerate(locations):
+        rainfall, capacity = rng.randint(200, 3000), rng.randint(1, 50)
+        kind = rng.random()
+        if kind < 0.7:
+            lines.append(f"- Location {i+1} (lat: {lat}, lon: {lon}): Rainfall: {rainfall}mm/year, Capacity: {capacity}M liters")
+        elif kind < 0.9:
+            lines.append(f"- Location {i+1} (lat: {lat}, lon: {lon}):")
+            lines.append(f"  - Rainfall: {rainfall}mm/year")
+            lines.append(f"  - Capacity: {capacity}M liters")
+        # else: the model skipped this location
+    return "\n".join(lines), locations
+
+
+def legacy_parse(analysis, locations):
+    # The per-location rescanning run_waterseeker_agent used before AnalysisParser
+    analysis_lines = [line.strip() for line in analysis.split("\n") if line.strip().startswith("- Location")]
+    filtered_analysis_lines = []
+    for i in range(len(locations)):
+        expected_prefix = f"- Location {i+1} (lat: {locations[i][0]}, lon: {locations[i][1]}):"
+        found = False
+        for line in analysis_lines:
+            if line.startswith(expected_prefix):
+                if "Rainfall:" in line and "Capacity:" in line:
+                    filtered_analysis_lines.append(line)
+                    found = True
+                    break
+        if not found:
+            current_location = None
+            rainfall = capacity = None
+            for line in analysis.split("\n"):
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith(expected_prefix):
+                    current_location = line
+                    rainfall = capacity = None
+                elif line.startswith("- Rainfall:"):
+                    rainfall_match = re.search(r"Rainfall: (\d+\.?\d*)mm/year", line)
+                    rainfall = rainfall_match.group(1) if rainfall_match else "0"
+                elif line.startswith("- Capacity:"):
+                    capacity_match = re.search(r"Capacity: (\d+\.?\d*)M liters", line)
+                    capacity = capacity_match.group(1) if capacity_match else "0"
+                    if current_location and rainfall is not None:
+                        filtered_analysis_lines.append(f"{current_location}: Rainfall: {rainfall}mm/year, Capacity: {capacity}M liters")
+                        found = True
+                        break
+            if not found:
+                filtered_analysis_lines.append(f"- Location {i+1} (lat: {locations[i][0]}, lon: {locations[i][1]}): Rainfall: 0mm/year, Capacity: 0M liters")
+    # ...and app.py then regex-parsed every line again
+    values = []
+    for line in filtered_analysis_lines:
+        rainfall_match = re.search(r"Rainfall: (\d+\.?\d*)mm/year", line)
+        capacity_match = re.search(r"Capacity: (\d+\.?\d*)M liters", line)
+        values.append((float(rainfall_match.group(1)) if rainfall_match else 0,
+                       float(capacity_match.group(1)) if capacity_match else 0))
+    return values
+
+
+def best_of(fn, repeat=5):
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the single-pass analysis parser")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 250, 500, 1000])
+    args = parser.parse_args()
+    print(f"{'locations':>10} {'legacy ms':>12} {'single-pass ms':>15} {'speedup':>8}")
+    for n in args.sizes:
+        text, locations = synthetic_analysis(n)
+        records = parse_analysis(text, locations)
+        legacy = legacy_parse(text, locations)
+        assert [(r.rainfall, r.capacity) for r in records] == legacy, "parsers disagree"
+        legacy_s = best_of(lambda: legacy_parse(text, locations))
+        new_s = best_of(lambda: parse_analysis(text, locations))
+        print(f"{n:>10} {legacy_s * 1e3:>12.2f} {new_s * 1e3:>15.3f} {legacy_s / new_s:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# waterseeker-agent/cache.py
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_DIR = os.environ.get("WATERSEEKER_CACHE_DIR", ".waterseeker_cache")
+
+
+class SQLiteCache:
+    """Small persistent key/value store with TTL and size-based eviction.
+
+    Values are stored as JSON. Entries older than ``ttl`` seconds are treated
+    as misses, and once more than ``max_entries`` rows exist the least
+    recently used ones are evicted. One connection is shared between threads
+    behind a lock so Streamlit sessions can use the same cache.
+    """
+
+    def __init__(self, path, ttl=None, max_entries=None, table="cache"):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.table = table
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            columns = [row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")]
+            if "accessed_at" not in columns:
+                # Caches written before access times were kept start from their creation times
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+                self._conn.execute(f"UPDATE {table} SET accessed_at = created_at")
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_created_at ON {table} (created_at)")
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed_at ON {table} (accessed_at)")
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and (self.ttl is None or now - row[1] <= self.ttl):
+                # A hit makes the entry the most recently used
+                self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        if row is None:
+            return default
+        value, created_at = row
+        if self.ttl is not None and now - created_at > self.ttl:
+            self.delete(key)
+            return default
+        return json.loads(value)
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            self._evict()
+
+    def delete(self, key):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def _evict(self):
+        # Called with the lock held, inside a transaction
+        if self.ttl is not None:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.ttl,))
+        if self.max_entries is not None:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
@@ -0,0 +1,366 @@
+# waterseeker-agent/capacity.py
+# Reservoir capacity behind a hypothetical dam, from local elevation (DEM) tiles.
+#   python capacity.py build n35w079.tif n35w080.tif     (or .asc, or .npy with --bounds)
+#   python capacity.py query 35.7 -78.4 --dam-height 15
+#   python capacity.py estimate sites.csv -o capacities.csv --workers 4
+# Tiles are stored as .npy files and memory-mapped, so only the windows around the
+# sites are read. Works best on a hydrologically conditioned (pit-filled) DEM.
+import argparse
+import csv
+import functools
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import numpy as np
+from cache import CACHE_DIR
+from climatology import read_raster
+from geo import EARTH_RADIUS_KM
+
+DEM_PATH = os.environ.get("WATERSEEKER_DEM", os.path.join(CACHE_DIR, "dem"))
+INDEX_FILE = "tiles.json"
+DAM_HEIGHT = float(os.environ.get("WATERSEEKER_DAM_HEIGHT", "10"))  # m
+# Half-width (m) of the elevation window first searched around each site. The window is
+# doubled, up to MAX_BASIN_RADIUS, while the reservoir reaches its edge; larger ones are cut off
+BASIN_RADIUS = float(os.environ.get("WATERSEEKER_BASIN_RADIUS", "2000"))
+MAX_BASIN_RADIUS = float(os.environ.get("WATERSEEKER_MAX_BASIN_RADIUS", "8000"))
+# Sites are moved to the lowest cell this close (m), so a dam sits on the valley floor
+SNAP_DISTANCE = 100.0
+# Halvings of the water level when the reservoir would spill around the dam (10 m -> 4 cm)
+SPILL_STEPS = 8
+OPEN_TILES = 16
+# Sites per process-pool task
+CHUNK_SIZE = 64
+M_PER_DEGREE = EARTH_RADIUS_KM * 1000 * math.pi / 180
+NEIGHBOURS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+_model = None
+_model_loaded = False
+_model_lock = threading.Lock()
+
+
+@dataclass
+class ReservoirEstimate:
+    """Water stored behind a dam at one site."""
+
+    __slots__ = ("lat", "lon", "elevation", "dam_height", "water_level", "capacity", "area", "dam_length", "truncated")
+
+    lat: float  # dam site, after snapping to the valley floor
+    lon: float
+    elevation: float  # m, at the foot of the dam
+    dam_height: float  # m
+    water_level: float  # m; below the crest when the water would spill over a saddle first
+    capacity: float  # M liters
+    area: float  # km2 flooded
+    dam_length: float  # m
+    truncated: bool  # the reservoir reaches the edge of the searched window: capacity is a lower bound
+
+
+def build_dem(paths, out_dir=None, bounds=None):
+    """Store each raster as a memory-mappable tile in out_dir and add it to the index; returns the tile count."""
+    out_dir = out_dir or DEM_PATH
+    os.makedirs(out_dir, exist_ok=True)
+    index_path = os.path.join(out_dir, INDEX_FILE)
+    tiles = {}
+    if os.path.exists(index_path):
+        with open(index_path, encoding="utf-8") as f:
+            tiles = {tile["file"]: tile for tile in json.load(f)["tiles"]}
+    for path in paths:
+        grid, west, north, resolution, nodata = read_raster(path, bounds)
+        if nodata is not None:
+            grid[grid == nodata] = np.nan
+        name = os.path.splitext(os.path.basename(path))[0] + ".npy"
+        # Written under a temporary name first so a running app never maps a half-written tile
+        tmp = os.path.join(out_dir, name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, grid)
+        os.replace(tmp, os.path.join(out_dir, name))
+        tiles[name] = {"file": name, "west": west, "north": north, "resolution": resolution,
+                       "rows": grid.shape[0], "cols": grid.shape[1]}
+    tmp = index_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"tiles": sorted(tiles.values(), key=lambda tile: tile["file"])}, f)
+    os.replace(tmp, index_path)
+    return len(tiles)
+
+
+def _runs(mask):
+    # Label of each run of consecutive mask cells along the rows (0 outside the mask)
+    starts = mask.copy()
+    starts[:, 1:] &= ~mask[:, :-1]
+    return np.cumsum(starts).reshape(mask.shape) * mask
+
+
+def _flood(mask, start):
+    """Cells of ``mask`` 4-connected to ``start``."""
+    # Whole runs along the rows, then along the columns, are filled at once: this takes
+    # as many passes as the water's path has turns, not as many as it has cells
+    passes = []
+    for runs in (_runs(mask), _runs(mask.T).T):
+        passes.append((runs, np.zeros(runs.max() + 1, dtype=bool)))
+    filled = np.zeros(mask.shape, dtype=bool)
+    filled[start] = True
+    count = 1
+    while True:
+        for runs, reached in passes:
+            reached[runs[filled]] = True
+            reached[0] = False
+            filled = reached[runs]
+        filled_count = np.count_nonzero(filled)
+        if filled_count == count:
+            return filled
+        count = filled_count
+
+
+def _dam_wall(z, site, flow, level, dx, dy):
+    # Cells of a straight dam across the flow direction, out to terrain at or above the
+    # level on both sides; (cells, length in m, whether both ends reached such terrain)
+    row, col = site
+    # Perpendicular to the flow on the ground, then in cells, one cell per step along
+    # the major axis so the rasterized wall is 8-connected (4-connected water can't cross it)
+    across = np.array([-flow[1] * dx / dy, flow[0] * dy / dx])
+    across /= np.abs(across).max()
+    steps = np.arange(1, max(z.shape))
+    rows, cols, closed = [row], [col], True
+    for direction in (1, -1):
+        r = row + np.rint(direction * steps * across[0]).astype(np.intp)
+        c = col + np.rint(direction * steps * across[1]).astype(np.intp)
+        inside = (r >= 0) & (r < z.shape[0]) & (c >= 0) & (c < z.shape[1])
+        r, c = r[inside], c[inside]
+        high = np.nonzero(z[r, c] >= level)[0]
+        end = high[0] if high.size else r.size
+        closed = closed and bool(high.size)
+        rows.extend(r[:end])
+        cols.extend(c[:end])
+    length = len(rows) * math.hypot(across[0] * dy, across[1] * dx)
+    return (np.array(rows), np.array(cols)), length, closed
+
+
+def _snap(z, site, cells):
+    # The lowest cell with data within ``cells`` of the site (the site itself when there is none)
+    row, col = site
+    r0, c0 = max(0, row - cells), max(0, col - cells)
+    block = z[r0:row + cells + 1, c0:col + cells + 1]
+    if np.isnan(block).all():
+        return site
+    r, c = np.unravel_index(np.nanargmin(block), block.shape)
+    return r0 + int(r), c0 + int(c)
+
+
+def reservoir(z, site, dam_height, dx, dy):
+    """Reservoir behind a dam of ``dam_height`` m at cell ``site`` of the elevation window ``z``.
+
+    ``dx``/``dy`` are the cell sizes in m. The dam runs straight across the
+    steepest-descent direction at the site until it meets terrain higher
+    than its crest; the reservoir is everything lower than the water level
+    that is connected to the upstream side, and its volume is summed over
+    the flooded cells in one pass. Returns None without elevation data at
+    the site; ``lat``/``lon`` are left for the caller to fill in.
+    """
+    z = np.where(np.isnan(z), np.inf, z)  # no data: never flooded, blocks the water
+    row, col = site
+    base = float(z[row, col])
+    if not math.isfinite(base):
+        return None
+    level = base + dam_height
+    # Steepest descent from the site is downstream; a pit has none and needs no wall
+    flow, steepest = None, 0.0
+    for dr, dc in NEIGHBOURS:
+        r, c = row + dr, col + dc
+        if 0 <= r < z.shape[0] and 0 <= c < z.shape[1]:
+            slope = (base - z[r, c]) / math.hypot(dr * dy, dc * dx)
+            if slope > steepest:
+                flow, steepest = (dr, dc), slope
+    barrier = np.zeros(z.shape, dtype=bool)
+    dam_length, closed = 0.0, True
+    start = (row, col)
+    if flow is not None:
+        wall, dam_length, closed = _dam_wall(z, (row, col), flow, level, dx, dy)
+        barrier[wall] = True
+        start = (row - flow[0], col - flow[1])
+        if not (0 <= start[0] < z.shape[0] and 0 <= start[1] < z.shape[1]):
+            start = None
+    flooded = None
+    if start is not None and z[start] < level:
+        flooded = _flood((z < level) & ~barrier, start)
+        if flow is not None:
+            downstream = (row + flow[0], col + flow[1])
+            if flooded[downstream]:
+                # Water would run around the dam over a lower saddle: find that level
+                low, high = base, level
+                for _ in range(SPILL_STEPS):
+                    middle = (low + high) / 2
+                    if _flood((z < middle) & ~barrier, start)[downstream]:
+                        high = middle
+                    else:
+                        low = middle
+                level = low
+                flooded = _flood((z < level) & ~barrier, start) if z[start] < level else None
+    if flooded is None:
+        return ReservoirEstimate(None, None, base, dam_height, level, 0.0, 0.0, dam_length, False)
+    depth = (level - z)[flooded]
+    touches_edge = flooded[0].any() or flooded[-1].any() or flooded[:, 0].any() or flooded[:, -1].any()
+    # m3 -> M liters
+    return ReservoirEstimate(None, None, base, dam_height, level, float(depth.sum()) * dx * dy / 1000, depth.size * dx * dy / 1e6,
+                             dam_length, bool(touches_edge or not closed))
+
+
+class ElevationModel:
+    """Memory-mapped DEM tiles (north-up, square cells in degrees), as written by ``build_dem``.
+
+    Each site is evaluated on a window of the one tile containing it, grown
+    until the reservoir fits or the window reaches ``max_radius``; reservoirs
+    still cut off there, or at the tile's edge, are marked truncated.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or DEM_PATH
+        with open(os.path.join(self.path, INDEX_FILE), encoding="utf-8") as f:
+            self.tiles = json.load(f)["tiles"]
+        north = np.array([tile["north"] for tile in self.tiles], dtype=np.float64)
+        west = np.array([tile["west"] for tile in self.tiles], dtype=np.float64)
+        resolution = np.array([tile["resolution"] for tile in self.tiles], dtype=np.float64)
+        south = north - resolution * np.array([tile["rows"] for tile in self.tiles])
+        east = west + resolution * np.array([tile["cols"] for tile in self.tiles])
+        self._bounds = (south, west, north, east)
+        self._open = functools.lru_cache(maxsize=OPEN_TILES)(self._load)
+
+    def _load(self, i):
+        return np.load(os.path.join(self.path, self.tiles[i]["file"]), mmap_mode="r")
+
+    def tile_at(self, lat, lon):
+        """Index of the first tile covering the point, or None."""
+        south, west, north, east = self._bounds
+        hits = np.nonzero((lat >= south) & (lat < north) & (lon >= west) & (lon < east))[0]
+        return int(hits[0]) if hits.size else None
+
+    def estimate(self, lat, lon, dam_height=DAM_HEIGHT, radius=BASIN_RADIUS, max_radius=MAX_BASIN_RADIUS):
+        """ReservoirEstimate for a dam at the point, or None outside the tiles or without data."""
+        i = self.tile_at(lat, lon)
+        if i is None:
+            return None
+        tile, grid = self.tiles[i], self._open(i)
+        resolution = tile["resolution"]
+        dy = resolution * M_PER_DEGREE
+        dx = dy * math.cos(math.radians(lat))
+        row = min(int((tile["north"] - lat) / resolution), tile["rows"] - 1)
+        col = min(int((lon - tile["west"]) / resolution), tile["cols"] - 1)
+        snap = round(SNAP_DISTANCE / dy)
+        while True:
+            half_rows, half_cols = math.ceil(radius / dy), math.ceil(radius / dx)
+            r0, c0 = max(0, row - half_rows), max(0, col - half_cols)
+            r1, c1 = min(tile["rows"], row + half_rows + 1), min(tile["cols"], col + half_cols + 1)
+            # Only this window of the tile is read from disk
+            z = np.array(grid[r0:r1, c0:c1], dtype=np.float64)
+            site = _snap(z, (row - r0, col - c0), snap)
+            whole_tile = r0 == 0 and c0 == 0 and r1 == tile["rows"] and c1 == tile["cols"]
+            last = radius >= max_radius or whole_tile
+            # Local relief: with no cell above the crest, the water is sure to reach the
+            # window's edge, so a larger window is read without flooding this one
+            if not last and np.isfinite(z[site]) and not np.nanmax(z) >= z[site] + dam_height:
+                radius = min(2 * radius, max_radius)
+                continue
+            result = reservoir(z, site, dam_height, dx, dy)
+            if result is None or not result.truncated or last:
+                break
+            radius = min(2 * radius, max_radius)
+        if result is not None:
+            result.lat = round(tile["north"] - (r0 + site[0] + 0.5) * resolution, 6)
+            result.lon = round(tile["west"] + (c0 + site[1] + 0.5) * resolution, 6)
+        return result
+
+
+def get_elevation_model():
+    """The shared elevation model, loaded on first use; None when no tiles have been built."""
+    global _model, _model_loaded
+    if not _model_loaded:
+        with _model_lock:
+            # Checked again under the lock: another thread may have loaded it meanwhile
+            if not _model_loaded:
+                if os.path.exists(os.path.join(DEM_PATH, INDEX_FILE)):
+                    _model = ElevationModel(DEM_PATH)
+                _model_loaded = True
+    return _model
+
+
+def _init_worker(path):
+    # Each worker process maps the tiles itself
+    global _model, _model_loaded
+    _model, _model_loaded = ElevationModel(path), True
+
+
+def _estimate_chunk(points, dam_height, radius, max_radius):
+    return [_model.estimate(lat, lon, dam_height, radius, max_radius) for lat, lon in points]
+
+
+def estimate_capacities(points, dam_height=DAM_HEIGHT, radius=BASIN_RADIUS, max_radius=MAX_BASIN_RADIUS, workers=1, path=None):
+    """ReservoirEstimate (or None) for every (lat, lon), across ``workers`` processes when above 1."""
+    points = list(points)
+    if workers <= 1 or len(points) <= CHUNK_SIZE:
+        model = ElevationModel(path) if path else get_elevation_model()
+        if model is None:
+            raise Exception(f"No elevation tiles in {DEM_PATH}; run: python capacity.py build <rasters>")
+        return [model.estimate(lat, lon, dam_height, radius, max_radius) for lat, lon in points]
+    chunks = [points[i:i + CHUNK_SIZE] for i in range(0, len(points), CHUNK_SIZE)]
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(path or DEM_PATH,)) as executor:
+        results = executor.map(_estimate_chunk, chunks, [dam_height] * len(chunks), [radius] * len(chunks),
+                               [max_radius] * len(chunks))
+        return [estimate for chunk in results for estimate in chunk]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build elevation tiles or estimate reservoir capacities from them.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="add DEM rasters to the tile directory")
+    build.add_argument("rasters", nargs="+", help="GeoTIFF, ESRI ASCII grid (.asc) or .npy files")
+    build.add_argument("--bounds", type=float, nargs=4, metavar=("SOUTH", "WEST", "NORTH", "EAST"), help="extent of a .npy grid")
+    build.add_argument("-o", "--output", default=DEM_PATH, help="tile directory")
+    query = commands.add_parser("query", help="capacity behind a dam at a point")
+    query.add_argument("lat", type=float)
+    query.add_argument("lon", type=float)
+    estimate = commands.add_parser("estimate", help="capacities for a CSV of sites")
+    estimate.add_argument("input", help="CSV or Parquet file with lat/lon columns")
+    estimate.add_argument("-o", "--output", required=True, help="results CSV")
+    estimate.add_argument("--workers", type=int, default=os.cpu_count(), help="processes")
+    for command in (query, estimate):
+        command.add_argument("--dam-height", type=float, default=DAM_HEIGHT, help="m")
+        command.add_argument("--radius", type=float, default=BASIN_RADIUS, help="m first searched around each site")
+        command.add_argument("--max-radius", type=float, default=MAX_BASIN_RADIUS, help="m the search may grow to")
+        command.add_argument("--dem", default=DEM_PATH, help="tile directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        count = build_dem(args.rasters, args.output, args.bounds)
+        print(f"{count} elevation tile(s) in {args.output}")
+    elif args.command == "query":
+        estimate = ElevationModel(args.dem).estimate(args.lat, args.lon, args.dam_height, args.radius, args.max_radius)
+        if estimate is None:
+            print("No elevation data at this point")
+        else:
+            bound = "at least " if estimate.truncated else ""
+            print(f"Dam at ({estimate.lat}, {estimate.lon}), {estimate.elevation:.0f} m, {estimate.dam_length:.0f} m long: "
+                  f"{bound}{estimate.capacity:.1f}M liters over {estimate.area:.3f} km2, water level {estimate.water_level:.1f} m")
+    else:
+        from batch import read_sites
+        sites = list(read_sites(args.input))
+        start = time.perf_counter()
+        estimates = estimate_capacities([(lat, lon) for _, _, lat, lon in sites], args.dam_height, args.radius, args.max_radius,
+                                        args.workers, args.dem)
+        seconds = time.perf_counter() - start
+        with open(args.output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "lat", "lon", "capacity_m_liters", "area_km2", "water_level_m", "dam_length_m", "truncated"])
+            for (_, site_id, lat, lon), estimate in zip(sites, estimates):
+                if estimate is None:
+                    writer.writerow([site_id, lat, lon, "", "", "", "", ""])
+                else:
+                    writer.writerow([site_id, lat, lon, round(estimate.capacity, 3), round(estimate.area, 4),
+                                     round(estimate.water_level, 2), round(estimate.dam_length), estimate.truncated])
+        print(f"Estimated {len(sites)} sites in {seconds:.1f}s ({len(sites) / max(seconds, 1e-9) * 60:.0f} sites/min)")
+
+
+if __name__ == "__main__":
+    main()
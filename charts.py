@@ -0,0 +1,148 @@
+# waterseeker-agent/charts.py
+import hashlib
+import io
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+from html import escape
+import telemetry
+
+# "matplotlib" (PNG, imported on first use) or "svg" (built here, no matplotlib import at all)
+CHART_BACKEND = os.environ.get("WATERSEEKER_CHART_BACKEND", "matplotlib")
+CHART_CACHE_ENTRIES = int(os.environ.get("WATERSEEKER_CHART_CACHE_ENTRIES", "32"))
+HIGHLIGHT_COLOR = "green"
+BAR_COLOR = "blue"
+
+
+class ChartCache:
+    """Bounded LRU of rendered charts keyed by a hash of everything that affects the image."""
+
+    def __init__(self, max_entries=CHART_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            image = self._entries.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def set(self, key, image):
+        with self._lock:
+            self._entries[key] = image
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+chart_cache = ChartCache()
+
+
+def chart_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def bar_chart(labels, values, highlight_index, ylabel, title, value_format="{}", label_offset=0.0,
+              backend=None, cache=chart_cache):
+    """Bar chart with the highlighted bar in green, rendered once per distinct input.
+
+    Returns PNG bytes (matplotlib backend) or an SVG string (svg backend);
+    both can be passed straight to ``st.image``.
+    """
+    backend = backend or CHART_BACKEND
+    labels, values = list(labels), [float(v) for v in values]
+    key = chart_key(backend, labels, values, highlight_index, ylabel, title, value_format, label_offset)
+    image = cache.get(key)
+    telemetry.cache_lookup("charts", image is not None)
+    if image is None:
+        render = _render_svg if backend == "svg" else _render_matplotlib
+        image = render(labels, values, highlight_index, ylabel, title, value_format, label_offset)
+        cache.set(key, image)
+    return image
+
+
+def _colors(count, highlight_index):
+    return [HIGHLIGHT_COLOR if i == highlight_index else BAR_COLOR for i in range(count)]
+
+
+def _render_matplotlib(labels, values, highlight_index, ylabel, title, value_format, label_offset):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(8, 6), dpi=100)
+    try:
+        bars = ax.bar(labels, values, color=_colors(len(values), highlight_index))
+        ax.set_xlabel("Location")
+        ax.set_ylabel(ylabel)
+        ax.set_title(title)
+        ax.set_ylim(0, max(values) * 1.2 if values and max(values) > 0 else 1)
+        ax.grid(True, linestyle="--", alpha=0.7)
+        for bar in bars:
+            yval = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width()/2, yval + label_offset, value_format.format(yval), ha="center", va="bottom", color="black")
+        plt.tight_layout()
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", bbox_inches="tight")
+        return buf.getvalue()
+    finally:
+        plt.close(fig)
+
+
+def _nice_step(span, ticks=5):
+    raw = span / ticks
+    magnitude = 10 ** math.floor(math.log10(raw))
+    for step in (1, 2, 2.5, 5, 10):
+        if step * magnitude >= raw:
+            return step * magnitude
+    return 10 * magnitude
+
+
+def _render_svg(labels, values, highlight_index, ylabel, title, value_format, label_offset):
+    # Same layout as the matplotlib chart, as a few KB of vector markup
+    width, height = 800, 600
+    left, right, top, bottom = 90, 20, 50, 70
+    plot_w, plot_h = width - left - right, height - top - bottom
+    ymax = max(values) * 1.2 if values and max(values) > 0 else 1.0
+    scale = plot_h / ymax
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" width="{width}" height="{height}" '
+        'font-family="DejaVu Sans, Arial, sans-serif" font-size="14">',
+        f'<rect width="{width}" height="{height}" fill="white"/>',
+        f'<text x="{left + plot_w / 2}" y="{top - 18}" text-anchor="middle" font-size="16">{escape(title)}</text>',
+    ]
+    step = _nice_step(ymax)
+    tick = 0.0
+    while tick <= ymax + 1e-9:
+        y = top + plot_h - tick * scale
+        parts.append(f'<line x1="{left}" x2="{left + plot_w}" y1="{y:.1f}" y2="{y:.1f}" stroke="#b0b0b0" stroke-dasharray="6,4"/>')
+        parts.append(f'<text x="{left - 8}" y="{y + 5:.1f}" text-anchor="end">{tick:g}</text>')
+        tick += step
+    slot = plot_w / max(len(values), 1)
+    for i, (label, value) in enumerate(zip(labels, values)):
+        x = left + i * slot + slot * 0.1
+        bar_h = value * scale
+        color = HIGHLIGHT_COLOR if i == highlight_index else BAR_COLOR
+        parts.append(f'<rect x="{x:.1f}" y="{top + plot_h - bar_h:.1f}" width="{slot * 0.8:.1f}" height="{bar_h:.1f}" fill="{color}"/>')
+        label_y = top + plot_h - (value + label_offset) * scale - 4
+        parts.append(f'<text x="{x + slot * 0.4:.1f}" y="{label_y:.1f}" text-anchor="middle">{escape(value_format.format(value))}</text>')
+        parts.append(f'<text x="{x + slot * 0.4:.1f}" y="{top + plot_h + 22}" text-anchor="middle">{escape(str(label))}</text>')
+    parts += [
+        f'<rect x="{left}" y="{top}" width="{plot_w}" height="{plot_h}" fill="none" stroke="black"/>',
+        f'<text x="{left + plot_w / 2}" y="{height - 20}" text-anchor="middle">Location</text>',
+        f'<text x="24" y="{top + plot_h / 2}" text-anchor="middle" transform="rotate(-90 24 {top + plot_h / 2})">{escape(ylabel)}</text>',
+        "</svg>",
+    ]
+    return "".join(parts)
@@ -0,0 +1,203 @@
+# waterseeker-agent/climatology.py
+# Local annual-precipitation climatology for network-free rainfall at any point.
+#   python climatology.py build wc2.1_10m_bio_12.tif
+#   python climatology.py build wc2.1_10m_prec_*.tif        (monthly rasters are summed)
+#   python climatology.py query 35.7 -78.4
+# Inputs: GeoTIFF (needs rasterio), ESRI ASCII grids (.asc), or a .npy array with --bounds.
+import argparse
+import json
+import math
+import os
+import threading
+import numpy as np
+from cache import CACHE_DIR
+
+CLIMATOLOGY_PATH = os.environ.get("WATERSEEKER_CLIMATOLOGY", os.path.join(CACHE_DIR, "climatology"))
+GRID_FILE = "precipitation.npy"
+META_FILE = "grid.json"
+
+_climatology = None
+_climatology_loaded = False
+_climatology_lock = threading.Lock()
+
+
+def read_ascii_grid(path):
+    """(array, west, north, resolution, nodata) from an ESRI ASCII grid."""
+    header = {}
+    with open(path, encoding="utf-8") as f:
+        while True:
+            position = f.tell()
+            line = f.readline()
+            key = line.split(maxsplit=1)[0].lower() if line.strip() else ""
+            if not key or not key[0].isalpha():
+                f.seek(position)
+                break
+            header[key] = float(line.split()[1])
+        grid = np.loadtxt(f, dtype=np.float32, ndmin=2)
+    rows, cols, resolution = int(header["nrows"]), int(header["ncols"]), header["cellsize"]
+    if grid.shape != (rows, cols):
+        raise Exception(f"{path}: expected {rows}x{cols} values, found {grid.shape[0]}x{grid.shape[1]}")
+    # Corners may be given as the centre of the lower-left cell instead
+    west = header["xllcorner"] if "xllcorner" in header else header["xllcenter"] - resolution / 2
+    south = header["yllcorner"] if "yllcorner" in header else header["yllcenter"] - resolution / 2
+    return grid, west, south + rows * resolution, resolution, header.get("nodata_value")
+
+
+def read_geotiff(path):
+    """(array, west, north, resolution, nodata) from band 1 of a north-up GeoTIFF."""
+    try:
+        import rasterio
+    except ImportError:
+        raise Exception("Reading GeoTIFF needs rasterio (pip install rasterio); or convert the raster to an ESRI ASCII grid (.asc)")
+    with rasterio.open(path) as dataset:
+        transform = dataset.transform
+        if transform.b or transform.d or not math.isclose(transform.a, -transform.e):
+            raise Exception(f"{path}: only north-up rasters with square cells are supported")
+        return dataset.read(1).astype(np.float32), transform.c, transform.f, transform.a, dataset.nodata
+
+
+def read_array(path, bounds):
+    grid = np.load(path).astype(np.float32)
+    if bounds is None:
+        raise Exception(f"{path}: a .npy grid needs --bounds SOUTH WEST NORTH EAST")
+    south, west, north, east = bounds
+    resolution = (north - south) / grid.shape[0]
+    if not math.isclose(resolution, (east - west) / grid.shape[1], rel_tol=1e-6):
+        raise Exception(f"{path}: cells must be square ({grid.shape[0]}x{grid.shape[1]} over the bounds)")
+    return grid, west, north, resolution, None
+
+
+def read_raster(path, bounds=None):
+    if path.endswith(".asc"):
+        return read_ascii_grid(path)
+    if path.endswith(".npy"):
+        return read_array(path, bounds)
+    return read_geotiff(path)
+
+
+def build_climatology(paths, out_dir=None, bounds=None, source=None):
+    """Write the (summed) precipitation grid and its georeference to out_dir; returns its shape."""
+    out_dir = out_dir or CLIMATOLOGY_PATH
+    total = reference = None
+    for path in paths:
+        grid, west, north, resolution, nodata = read_raster(path, bounds)
+        grid = grid.astype(np.float32)
+        if nodata is not None:
+            grid[grid == nodata] = np.nan
+        if reference is None:
+            total, reference = grid, (grid.shape, west, north, resolution)
+        elif reference != (grid.shape, west, north, resolution):
+            raise Exception(f"{path}: not on the same grid as {paths[0]}")
+        else:
+            total = total + grid
+    rows, cols = total.shape
+    _, west, north, resolution = reference
+    meta = {"west": west, "north": north, "resolution": resolution, "rows": rows, "cols": cols,
+            "units": "mm/year", "source": source or ", ".join(os.path.basename(p) for p in paths)}
+    os.makedirs(out_dir, exist_ok=True)
+    # Written under temporary names first so a running app never maps a half-written file
+    tmp = os.path.join(out_dir, GRID_FILE + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, total)
+    os.replace(tmp, os.path.join(out_dir, GRID_FILE))
+    tmp = os.path.join(out_dir, META_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(out_dir, META_FILE))
+    return total.shape
+
+
+class Climatology:
+    """Memory-mapped annual precipitation grid (mm/year), row 0 northernmost.
+
+    ``lookup`` interpolates bilinearly between the four surrounding cell
+    centres for whole arrays of points at once; cells without data (NaN)
+    are left out of the weights, and points off the grid get NaN. Grids
+    spanning 360 degrees wrap around the antimeridian.
+    """
+
+    def __init__(self, path=None):
+        path = path or CLIMATOLOGY_PATH
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.grid = np.load(os.path.join(path, GRID_FILE), mmap_mode="r")
+        self.west, self.north = self.meta["west"], self.meta["north"]
+        self.resolution = self.meta["resolution"]
+        self.rows, self.cols = self.grid.shape
+        self.south = self.north - self.rows * self.resolution
+        self.east = self.west + self.cols * self.resolution
+        self.wraps = math.isclose(self.cols * self.resolution, 360.0)
+
+    def lookup(self, lat, lon):
+        """Rainfall (mm/year) at every point, NaN where the grid has no data."""
+        lat, lon = np.broadcast_arrays(np.atleast_1d(np.asarray(lat, dtype=np.float64)),
+                                       np.atleast_1d(np.asarray(lon, dtype=np.float64)))
+        if self.wraps:
+            lon = self.west + np.mod(lon - self.west, 360.0)
+        inside = (lat >= self.south) & (lat <= self.north) & (lon >= self.west) & (lon <= self.east)
+        # Fractional row/column of each point relative to the cell centres
+        y = (self.north - lat) / self.resolution - 0.5
+        x = (lon - self.west) / self.resolution - 0.5
+        row0, col0 = np.floor(y), np.floor(x)
+        fy, fx = y - row0, x - col0
+        row0, col0 = row0.astype(np.intp), col0.astype(np.intp)
+        rows = np.clip(np.stack([row0, row0 + 1]), 0, self.rows - 1)
+        if self.wraps:
+            cols = np.mod(np.stack([col0, col0 + 1]), self.cols)
+        else:
+            cols = np.clip(np.stack([col0, col0 + 1]), 0, self.cols - 1)
+        total = np.zeros(lat.shape)
+        weight = np.zeros(lat.shape)
+        for r, wy in ((0, 1 - fy), (1, fy)):
+            for c, wx in ((0, 1 - fx), (1, fx)):
+                # Fancy indexing reads only the pages holding these cells
+                values = np.asarray(self.grid[rows[r], cols[c]], dtype=np.float64)
+                w = np.where(np.isnan(values), 0.0, wy * wx)
+                total += np.where(np.isnan(values), 0.0, values) * w
+                weight += w
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = total / weight
+        result[~inside | (weight <= 0)] = np.nan
+        return result
+
+    def point(self, lat, lon):
+        """Rainfall (mm/year) at one point, or None where there is no data."""
+        value = float(self.lookup(lat, lon)[0])
+        return None if math.isnan(value) else value
+
+
+def get_climatology():
+    """The shared climatology, loaded on first use; None when none has been built."""
+    global _climatology, _climatology_loaded
+    if not _climatology_loaded:
+        with _climatology_lock:
+            if not _climatology_loaded:
+                if os.path.exists(os.path.join(CLIMATOLOGY_PATH, META_FILE)):
+                    _climatology = Climatology(CLIMATOLOGY_PATH)
+                _climatology_loaded = True
+    return _climatology
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the local precipitation climatology.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="store an annual precipitation raster (several are summed)")
+    build.add_argument("rasters", nargs="+", help="GeoTIFF, ESRI ASCII grid (.asc) or .npy files")
+    build.add_argument("--bounds", type=float, nargs=4, metavar=("SOUTH", "WEST", "NORTH", "EAST"), help="extent of a .npy grid")
+    build.add_argument("-o", "--output", default=CLIMATOLOGY_PATH, help="climatology directory")
+    query = commands.add_parser("query", help="rainfall at a point")
+    query.add_argument("lat", type=float)
+    query.add_argument("lon", type=float)
+    query.add_argument("--climatology", default=CLIMATOLOGY_PATH, help="climatology directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        rows, cols = build_climatology(args.rasters, args.output, args.bounds)
+        print(f"Stored a {rows}x{cols} precipitation grid in {args.output}")
+    else:
+        value = Climatology(args.climatology).point(args.lat, args.lon)
+        print("No data at this point" if value is None else f"{value:.0f} mm/year")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# waterseeker-agent/event_loop.py
+import asyncio
+import contextvars
+import queue
+import threading
+
+_DONE = object()
+_loop = None
+_loop_lock = threading.Lock()
+
+
+class BackgroundLoop:
+    """An asyncio event loop running forever on a daemon thread.
+
+    Sync callers hand it coroutines with ``run`` (or async generators with
+    ``iterate``) and block until they finish; every analysis in the process
+    shares the one loop and its HTTP connections instead of holding a thread
+    per request.
+    """
+
+    def __init__(self, name="waterseeker-event-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedule ``coro`` on the loop; returns a concurrent.futures.Future."""
+        if threading.current_thread() is self._thread:
+            raise Exception("Can't block on the event loop from its own thread; await the coroutine instead.")
+        return asyncio.run_coroutine_threadsafe(_in_context(contextvars.copy_context(), coro), self.loop)
+
+    def run(self, make_coro, on_event=None):
+        """Run ``make_coro(emit)`` on the loop and return its result.
+
+        Calls to ``emit(*args)`` made by the coroutine are delivered to
+        ``on_event(*args)`` on the calling thread, in order, while it waits
+        (Streamlit elements can only be updated from the script thread).
+        """
+        if on_event is None:
+            return self.submit(make_coro(None)).result()
+        events = queue.SimpleQueue()
+        future = self.submit(make_coro(lambda *args: events.put(args)))
+        future.add_done_callback(lambda _: events.put(_DONE))
+        try:
+            while True:
+                item = events.get()
+                if item is _DONE:
+                    break
+                on_event(*item)
+        except BaseException:
+            future.cancel()
+            raise
+        return future.result()
+
+    def iterate(self, agen):
+        """Drive an async generator on the loop, yielding its items on the calling thread."""
+        items = queue.SimpleQueue()
+
+        async def pump():
+            async for item in agen:
+                items.put(item)
+
+        future = self.submit(pump())
+        future.add_done_callback(lambda _: items.put(_DONE))
+        try:
+            while True:
+                item = items.get()
+                if item is _DONE:
+                    break
+                yield item
+            future.result()
+        finally:
+            # Closing the sync generator early cancels the async one
+            future.cancel()
+
+
+async def _in_context(context, coro):
+    # Carry the caller's context variables (e.g. the current telemetry trace) into the task
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+def get_background_loop():
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                _loop = BackgroundLoop()
+    return _loop
@@ -0,0 +1,141 @@
+# waterseeker-agent/geocache.py
+import asyncio
+import os
+import threading
+import time
+import telemetry
+from cache import CACHE_DIR, SQLiteCache
+from ratelimit import RateLimiter
+from singleflight import SingleFlight
+
+# Coordinates are rounded to this many decimals before lookup (4 ≈ 11 m)
+GEOCODE_PRECISION = int(os.environ.get("WATERSEEKER_GEOCODE_PRECISION", "4"))
+GEOCODE_TTL = float(os.environ.get("WATERSEEKER_GEOCODE_TTL", str(30 * 24 * 3600)))
+GEOCODE_MAX_ENTRIES = int(os.environ.get("WATERSEEKER_GEOCODE_MAX_ENTRIES", "50000"))
+GEOCODE_CACHE_PATH = os.path.join(CACHE_DIR, "geocode.sqlite3")
+
+# Nominatim usage policy: at most 1 request per second for the whole process
+nominatim_limiter = RateLimiter(float(os.environ.get("WATERSEEKER_NOMINATIM_INTERVAL", "1.0")))
+NOMINATIM_DOMAIN = os.environ.get("WATERSEEKER_NOMINATIM_DOMAIN", "nominatim.openstreetmap.org")
+NOMINATIM_SCHEME = os.environ.get("WATERSEEKER_NOMINATIM_SCHEME", "https")
+NOMINATIM_USER_AGENT = "WaterSeekerAgent"
+# Concurrent lookups of the same quantized point (e.g. several sessions clicking the
+# default map center) wait for one Nominatim request instead of spending the budget twice
+geocode_flight = SingleFlight("geocode")
+telemetry.metrics.register_gauges("singleflight", lambda: {"geocode": geocode_flight.stats()}, label="flight")
+
+_geocode_cache = None
+_geocode_cache_lock = threading.Lock()
+_geolocator = None
+_geolocator_lock = threading.Lock()
+
+
+def get_geolocator():
+    # geopy is imported on the first lookup, not at startup
+    global _geolocator
+    if _geolocator is None:
+        with _geolocator_lock:
+            if _geolocator is None:
+                from geopy.geocoders import Nominatim
+                _geolocator = Nominatim(user_agent=NOMINATIM_USER_AGENT, domain=NOMINATIM_DOMAIN, scheme=NOMINATIM_SCHEME)
+    return _geolocator
+
+
+def __getattr__(name):
+    if name == "geolocator":
+        return get_geolocator()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_geocode_cache():
+    global _geocode_cache
+    if _geocode_cache is None:
+        with _geocode_cache_lock:
+            if _geocode_cache is None:
+                _geocode_cache = SQLiteCache(GEOCODE_CACHE_PATH, ttl=GEOCODE_TTL, max_entries=GEOCODE_MAX_ENTRIES, table="geocode")
+    return _geocode_cache
+
+
+def quantize(lat, lon, precision=None):
+    precision = GEOCODE_PRECISION if precision is None else precision
+    return round(float(lat), precision), round(float(lon), precision)
+
+
+def reverse_geocode(lat, lon, timeout=10):
+    """Return the Nominatim address dict for a point ({} if nothing is there).
+
+    Results are cached on quantized coordinates; only misses are rate limited
+    and sent to Nominatim, once for all concurrent callers of the same point.
+    Lookup errors are raised and never cached.
+    """
+    qlat, qlon = quantize(lat, lon)
+    key = _cache_key(qlat, qlon)
+    cache = get_geocode_cache()
+    with telemetry.span("geocode", lat=qlat, lon=qlon) as span:
+        address = cache.get(key)
+        telemetry.cache_lookup("geocode", address is not None)
+        span.set(cached=address is not None)
+        if address is not None:
+            return address
+
+        def lookup():
+            # A flight for this point may have finished since the cache was checked
+            address = cache.get(key)
+            if address is not None:
+                return address
+            wait_start = time.monotonic()
+            nominatim_limiter.wait()
+            span.set(rate_limit_wait_ms=(time.monotonic() - wait_start) * 1000)
+            location = get_geolocator().reverse((qlat, qlon), language="en", timeout=timeout)
+            address = location.raw.get("address", {}) if location and location.raw else {}
+            cache.set(key, address)
+            return address
+        return geocode_flight.do(key, lookup, on_shared=lambda: span.set(shared=True))
+
+
+async def reverse_geocode_async(lat, lon, timeout=10):
+    """Coroutine version of reverse_geocode: same cache, same rate limit, httpx instead of geopy.
+
+    The SQLite cache is read and written in a worker thread, off the event loop.
+    """
+    from async_http import get_async_http_client
+    qlat, qlon = quantize(lat, lon)
+    key = _cache_key(qlat, qlon)
+    cache = get_geocode_cache()
+    with telemetry.span("geocode", lat=qlat, lon=qlon) as span:
+        address = await asyncio.to_thread(cache.get, key)
+        telemetry.cache_lookup("geocode", address is not None)
+        span.set(cached=address is not None)
+        if address is not None:
+            return address
+
+        async def lookup():
+            address = await asyncio.to_thread(cache.get, key)
+            if address is not None:
+                return address
+            wait_start = time.monotonic()
+            await nominatim_limiter.wait_async()
+            span.set(rate_limit_wait_ms=(time.monotonic() - wait_start) * 1000)
+            # The request geopy's Nominatim.reverse sends
+            params = {"lat": qlat, "lon": qlon, "format": "json", "addressdetails": 1, "accept-language": "en"}
+            response = await get_async_http_client().get(
+                f"{NOMINATIM_SCHEME}://{NOMINATIM_DOMAIN}/reverse", params=params,
+                headers={"User-Agent": NOMINATIM_USER_AGENT}, timeout=timeout,
+            )
+            if response.status_code != 200:
+                raise Exception(f"Nominatim reverse geocoding failed: {response.status_code} - {response.text}")
+            # Nominatim answers {"error": "Unable to geocode"} where there is nothing
+            address = response.json().get("address", {})
+            await asyncio.to_thread(cache.set, key, address)
+            return address
+        return await geocode_flight.do_async(key, lookup, on_shared=lambda: span.set(shared=True))
+
+
+def _cache_key(qlat, qlon):
+    return f"{qlat:.{GEOCODE_PRECISION}f},{qlon:.{GEOCODE_PRECISION}f}"
+
+
+def city_and_country(address):
+    city = address.get("city") or address.get("town") or address.get("village") or "Unknown"
+    country = address.get("country", "Unknown")
+    return city, country
@@ -0,0 +1,225 @@
+# waterseeker-agent/gridscan.py
+# Region scan: score a dense grid with cheap features, send only the best cells to the LLM.
+#   python gridscan.py --bbox 34 -80 36 -77 --resolution 0.05 --top-k 5 \
+#       --stations stations.csv --rainfall rainfall.csv
+# stations.csv needs lat/lon columns (default: the local station index, if built);
+# rainfall.csv also needs a "rainfall" column. Without it, annual rainfall comes from the
+# local climatology (climatology.py) if one is built.
+import argparse
+import csv
+import numpy as np
+from geo import haversine_km
+
+GRID_MAX_CELLS = 2_000_000
+# Cells and points per block when comparing the grid against point sets (bounds the distance matrix)
+DISTANCE_CHUNK = 4096
+POINT_CHUNK = 1024
+# Station proximity score is exp(-distance / scale): 1 at a station, ~0.37 at this distance
+STATION_SCALE_KM = 25.0
+DEFAULT_WEIGHTS = {"rainfall": 0.6, "station": 0.4}
+# Neighbouring cells score almost the same; keep picks this far apart so the LLM budget isn't
+# spent on one hotspot. Candidates are drawn from the best k * SEPARATION_POOL cells first.
+MIN_SEPARATION_KM = 10.0
+SEPARATION_POOL = 50
+LAT_COLUMNS = ("lat", "latitude")
+LON_COLUMNS = ("lon", "lng", "long", "longitude")
+
+
+def make_grid(south, west, north, east, resolution):
+    """Cell centers of a regular grid over the bounding box, as flat lat/lon arrays."""
+    if south >= north or west >= east or resolution <= 0:
+        raise Exception("Invalid bounding box or resolution")
+    lats = np.arange(south + resolution / 2, north, resolution)
+    lons = np.arange(west + resolution / 2, east, resolution)
+    if lats.size * lons.size > GRID_MAX_CELLS:
+        raise Exception(f"Grid has {lats.size * lons.size} cells, more than {GRID_MAX_CELLS}; use a coarser resolution")
+    lat, lon = np.meshgrid(np.round(lats, 6), np.round(lons, 6), indexing="ij")
+    return lat.ravel(), lon.ravel()
+
+
+def _chunks(n, size=DISTANCE_CHUNK):
+    for start in range(0, n, size):
+        yield slice(start, min(start + size, n))
+
+
+def _blocks(lat, lon, points_lat, points_lon):
+    # (cell block, point block, distance matrix) covering every cell/point pair
+    points_lat, points_lon = np.asarray(points_lat, dtype=np.float64), np.asarray(points_lon, dtype=np.float64)
+    for block in _chunks(lat.size):
+        for points in _chunks(points_lat.size, POINT_CHUNK):
+            yield block, points, haversine_km(lat[block, None], lon[block, None],
+                                              points_lat[None, points], points_lon[None, points])
+
+
+def nearest_distance_km(lat, lon, points_lat, points_lon):
+    """Distance from every cell to its nearest point (inf when there are no points)."""
+    result = np.full(lat.shape, np.inf)
+    for block, _, distance in _blocks(lat, lon, points_lat, points_lon):
+        np.minimum(result[block], distance.min(axis=1), out=result[block])
+    return result
+
+
+def interpolate(lat, lon, points_lat, points_lon, values, power=2.0):
+    """Inverse-distance-weighted value of the observations at every cell (0 without observations)."""
+    if len(points_lat) == 0:
+        return np.zeros(lat.shape)
+    values = np.asarray(values, dtype=np.float64)
+    weighted, total = np.zeros(lat.shape), np.zeros(lat.shape)
+    for block, points, distance in _blocks(lat, lon, points_lat, points_lon):
+        # Clamp to 1 m so a cell on top of an observation simply takes its value
+        weights = np.maximum(distance, 1e-3) ** -power
+        weighted[block] += weights @ values[points]
+        total[block] += weights.sum(axis=1)
+    return weighted / total
+
+
+def score_cells(lat, lon, rainfall_obs=None, stations=None, weights=None, rainfall=None):
+    """Vectorized features and a combined score in [0, 1] for every cell.
+
+    ``rainfall_obs`` is ``(lats, lons, values)``; ``stations`` is ``(lats, lons)``.
+    ``rainfall`` (one value per cell, NaN for unknown) is used as is instead of
+    interpolating observations. Rainfall is normalized by its maximum over the grid.
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    rainfall_obs = rainfall_obs or (np.empty(0), np.empty(0), np.empty(0))
+    stations = stations or (np.empty(0), np.empty(0))
+    if rainfall is None:
+        rainfall = interpolate(lat, lon, *rainfall_obs)
+    else:
+        rainfall = np.nan_to_num(np.asarray(rainfall, dtype=np.float64), nan=0.0)
+    station_km = nearest_distance_km(lat, lon, *stations)
+    peak = rainfall.max() if rainfall.size else 0.0
+    rainfall_score = rainfall / peak if peak > 0 else np.zeros(lat.shape)
+    station_score = np.exp(-station_km / STATION_SCALE_KM)
+    score = weights["rainfall"] * rainfall_score + weights["station"] * station_score
+    return {"rainfall": rainfall, "station_km": station_km, "score": score}
+
+
+def top_k(score, k):
+    """Indices of the k highest scores, best first (argpartition, then sort only those k)."""
+    k = min(k, score.size)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    best = np.argpartition(-score, k - 1)[:k]
+    return best[np.argsort(-score[best], kind="stable")]
+
+
+def spread_top_k(score, lat, lon, k, min_separation_km=MIN_SEPARATION_KM):
+    """Like top_k, but greedily skip cells closer than min_separation_km to a better pick."""
+    if min_separation_km <= 0:
+        return top_k(score, k)
+    picked = []
+    pool, start = k * SEPARATION_POOL, 0
+    while len(picked) < k and start < score.size:
+        # Widen the pool only when a dense hotspot used up the first candidates
+        ranked = top_k(score, pool)
+        for i in ranked[start:]:
+            if not picked or haversine_km(lat[i], lon[i], lat[picked], lon[picked]).min() >= min_separation_km:
+                picked.append(i)
+                if len(picked) == k:
+                    break
+        start, pool = len(ranked), pool * 4
+    return np.array(picked, dtype=np.intp)
+
+
+def climatology_rainfall(lat, lon):
+    # Annual rainfall of every cell from the local climatology, or None if none is built
+    from climatology import get_climatology
+    climatology = get_climatology()
+    return climatology.lookup(lat, lon) if climatology is not None else None
+
+
+def indexed_stations(bbox, margin=0.5):
+    # Stations from the local index (station_index.py) around the box, if one was built
+    from station_index import get_station_index
+    index = get_station_index()
+    if index is None:
+        return None
+    south, west, north, east = bbox
+    return index.within(south - margin, west - margin, north + margin, east + margin)
+
+
+def scan_region(bbox, resolution, k=5, rainfall_obs=None, stations=None, weights=None,
+                min_separation_km=MIN_SEPARATION_KM):
+    """Score a whole region and return the top-k cells as dicts, best first.
+
+    Rainfall comes from ``rainfall_obs`` when given, else from the local
+    climatology; without either, cells are scored on station distance alone.
+    """
+    lat, lon = make_grid(*bbox, resolution)
+    rainfall = None
+    if rainfall_obs is None:
+        rainfall = climatology_rainfall(lat, lon)
+    if stations is None:
+        stations = indexed_stations(bbox)
+    features = score_cells(lat, lon, rainfall_obs, stations, weights, rainfall)
+    return [
+        {
+            "lat": float(lat[i]),
+            "lon": float(lon[i]),
+            "score": float(features["score"][i]),
+            "rainfall": float(features["rainfall"][i]),
+            "station_km": float(features["station_km"][i]),
+        }
+        for i in spread_top_k(features["score"], lat, lon, k, min_separation_km)
+    ]
+
+
+def analyze_region(bbox, resolution, k=5, rainfall_obs=None, stations=None, weights=None,
+                   min_separation_km=MIN_SEPARATION_KM, **agent_kwargs):
+    """Pre-screen the region, then run the full agent on the top-k cells only."""
+    from waterseeker import run_waterseeker_agent
+    candidates = scan_region(bbox, resolution, k, rainfall_obs, stations, weights, min_separation_km)
+    if not candidates:
+        raise Exception("No candidate cells in the bounding box")
+    result = run_waterseeker_agent([(c["lat"], c["lon"]) for c in candidates], **agent_kwargs)
+    return candidates, result
+
+
+def load_points(path, value_column=None):
+    """Read lat/lon (and optionally one value column) from a CSV into arrays."""
+    lats, lons, values = [], [], []
+    with open(path, newline="", encoding="utf-8") as f:
+        for index, row in enumerate(csv.DictReader(f)):
+            row = {str(k).strip().lower(): v for k, v in row.items()}
+            lat = next((row[c] for c in LAT_COLUMNS if row.get(c)), None)
+            lon = next((row[c] for c in LON_COLUMNS if row.get(c)), None)
+            if lat is None or lon is None:
+                raise ValueError(f"{path}: row {index + 1} has no lat/lon columns")
+            lats.append(float(lat))
+            lons.append(float(lon))
+            if value_column:
+                values.append(float(row.get(value_column) or 0))
+    points = (np.array(lats), np.array(lons))
+    return points + (np.array(values),) if value_column else points
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-screen a region on a grid and analyze the best cells.")
+    parser.add_argument("--bbox", type=float, nargs=4, required=True, metavar=("SOUTH", "WEST", "NORTH", "EAST"))
+    parser.add_argument("--resolution", type=float, default=0.05, help="cell size in degrees")
+    parser.add_argument("--top-k", type=int, default=5, help="cells sent to the LLM")
+    parser.add_argument("--stations", help="CSV of monitoring stations (lat/lon)")
+    parser.add_argument("--rainfall", help="CSV of rainfall observations (lat/lon/rainfall)")
+    parser.add_argument("--min-separation", type=float, default=MIN_SEPARATION_KM, help="km between picked cells")
+    parser.add_argument("--screen-only", action="store_true", help="print the candidates without calling watsonx")
+    args = parser.parse_args(argv)
+
+    stations = load_points(args.stations) if args.stations else None
+    rainfall_obs = load_points(args.rainfall, "rainfall") if args.rainfall else None
+    if args.screen_only:
+        candidates = scan_region(args.bbox, args.resolution, args.top_k, rainfall_obs, stations,
+                                 min_separation_km=args.min_separation)
+    else:
+        candidates, result = analyze_region(args.bbox, args.resolution, args.top_k, rainfall_obs, stations,
+                                            min_separation_km=args.min_separation)
+    for i, c in enumerate(candidates):
+        print(f"Cell {i+1}: (lat: {c['lat']}, lon: {c['lon']}) score {c['score']:.3f}, "
+              f"rainfall {c['rainfall']:.1f}, nearest station {c['station_km']:.1f} km")
+    if not args.screen_only:
+        print("\nAnalysis:\n" + result.analysis)
+        print("\nRecommendation:\n" + result.recommendation)
+
+
+if __name__ == "__main__":
+    main()
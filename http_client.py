@@ -0,0 +1,142 @@
+# waterseeker-agent/http_client.py
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+import telemetry
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) seconds, used for any request that doesn't pass its own timeout
+DEFAULT_TIMEOUT = (5, float(os.environ.get("WATERSEEKER_HTTP_TIMEOUT", "10")))
+POOL_MAXSIZE = int(os.environ.get("WATERSEEKER_HTTP_POOL_MAXSIZE", "10"))
+MAX_PER_HOST = int(os.environ.get("WATERSEEKER_HTTP_MAX_PER_HOST", "8"))
+MAX_RETRIES = int(os.environ.get("WATERSEEKER_HTTP_RETRIES", "3"))
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Statuses meaning the request was turned away unprocessed: only these (and connect errors)
+# are retried for non-idempotent requests such as watsonx generations, which are billed per token
+REJECTED_STATUSES = (429, 503)
+# Tighter per-host concurrency for the public water-data services
+HOST_LIMITS = {
+    "waterservices.usgs.gov": 2,
+    "wateroffice.ec.gc.ca": 2,
+}
+
+
+class _Retry(Retry):
+    # urllib3 already retries connect errors for any method and read errors only for
+    # idempotent ones; this lets the rejected statuses through for every method too
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code in REJECTED_STATUSES and self.status_forcelist and status_code in self.status_forcelist:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+class HttpClient:
+    """One pooled ``requests.Session`` shared by every outbound call.
+
+    Connections are kept alive per host, at most ``max_per_host`` requests
+    run against one host at a time, and connection errors and 429/5xx
+    responses are retried with exponential backoff (honouring Retry-After).
+    Non-idempotent requests (POST) are only retried on connect errors and
+    429/503 unless sent with ``idempotent=True`` (e.g. the IAM token request).
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, pool_maxsize=POOL_MAXSIZE, max_per_host=MAX_PER_HOST,
+                 retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR, host_limits=None):
+        self.timeout = timeout
+        self.max_per_host = max_per_host
+        self.host_limits = dict(host_limits or {})
+        self.session, self._adapter = self._session(retries, backoff_factor, pool_maxsize, Retry.DEFAULT_ALLOWED_METHODS)
+        # Requests marked idempotent are retried on read errors and every status, whatever the method
+        self._idempotent_session, self._idempotent_adapter = self._session(retries, backoff_factor, pool_maxsize, None)
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._stats = {}
+
+    @staticmethod
+    def _session(retries, backoff_factor, pool_maxsize, allowed_methods):
+        retry = _Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=allowed_methods,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=pool_maxsize, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session, adapter
+
+    def request(self, method, url, idempotent=False, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        session = self._idempotent_session if idempotent else self.session
+        host = urlsplit(url).netloc
+        stats = self._host_stats(host)
+        start = time.monotonic()
+        with self._host_semaphore(host):
+            with self._lock:
+                stats["in_flight"] += 1
+            try:
+                response = session.request(method, url, **kwargs)
+            except Exception:
+                with self._lock:
+                    stats["errors"] += 1
+                raise
+            finally:
+                with self._lock:
+                    stats["in_flight"] -= 1
+                    stats["requests"] += 1
+                    stats["total_seconds"] += time.monotonic() - start
+        retries = getattr(response.raw, "retries", None)
+        if retries is not None and retries.history:
+            with self._lock:
+                stats["retries"] += len(retries.history)
+            telemetry.count("retries_total", len(retries.history), operation="http", host=host)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            hosts = {host: dict(stats) for host, stats in self._stats.items()}
+        for host, stats in hosts.items():
+            stats["avg_seconds"] = stats["total_seconds"] / stats["requests"] if stats["requests"] else 0.0
+        pools = {}
+        for adapter in (self._adapter, self._idempotent_adapter):
+            for key in list(adapter.poolmanager.pools.keys()):
+                pool = adapter.poolmanager.pools.get(key)
+                if pool is not None:
+                    totals = pools.setdefault(f"{key.key_scheme}://{key.key_host}:{key.key_port}",
+                                              {"connections_opened": 0, "requests": 0, "idle": 0})
+                    totals["connections_opened"] += pool.num_connections
+                    totals["requests"] += pool.num_requests
+                    totals["idle"] += sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0
+        return {"hosts": hosts, "pools": pools}
+
+    def _host_semaphore(self, host):
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.host_limits.get(host, self.max_per_host))
+                self._semaphores[host] = semaphore
+            return semaphore
+
+    def _host_stats(self, host):
+        with self._lock:
+            return self._stats.setdefault(
+                host, {"requests": 0, "errors": 0, "retries": 0, "in_flight": 0, "total_seconds": 0.0}
+            )
+
+
+http_client = HttpClient(host_limits=HOST_LIMITS)
+telemetry.metrics.register_gauges("http_host", lambda: http_client.stats()["hosts"], label="host")
+telemetry.metrics.register_gauges("http_pool", lambda: http_client.stats()["pools"], label="pool")
@@ -0,0 +1,136 @@
+# waterseeker-agent/iam.py
+import os
+import threading
+import time
+import telemetry
+from http_client import http_client
+from singleflight import SingleFlight
+
+IAM_URL = os.environ.get("WATERSEEKER_IAM_URL", "https://iam.cloud.ibm.com/identity/token")
+# Refresh this many seconds before the token expires
+REFRESH_MARGIN = 300
+
+
+def _token_request(api_key):
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    return headers, f"grant_type=urn:ibm:params:oauth:grant-type:apikey&apikey={api_key}"
+
+
+def request_iam_token(api_key):
+    headers, data = _token_request(api_key)
+    with telemetry.span("iam_token") as span:
+        # Requesting a token has no side effects, so it is retried on any error
+        response = http_client.post(IAM_URL, headers=headers, data=data, timeout=10, idempotent=True)
+        span.set(status_code=response.status_code)
+        if response.status_code != 200:
+            raise Exception(f"Failed to get IAM token: {response.text}")
+        return response.json()
+
+
+async def request_iam_token_async(api_key):
+    from async_http import get_async_http_client
+    headers, data = _token_request(api_key)
+    with telemetry.span("iam_token") as span:
+        response = await get_async_http_client().post(IAM_URL, headers=headers, content=data, timeout=10, idempotent=True)
+        span.set(status_code=response.status_code)
+        if response.status_code != 200:
+            raise Exception(f"Failed to get IAM token: {response.text}")
+        return response.json()
+
+
+def get_iam_token(api_key):
+    return request_iam_token(api_key)["access_token"]
+
+
+class IAMTokenManager:
+    """Thread-safe, lazily fetched IAM bearer token.
+
+    The first ``get_token`` call fetches the token; after that a background
+    timer refreshes it ``refresh_margin`` seconds before ``expires_in`` runs
+    out. Refreshes are single-flight: threads and coroutines that find the
+    token missing or expired wait for the one refresh in progress, sync or
+    async, instead of starting their own. The lock only guards the token, so
+    no one waits on it during the request.
+    """
+
+    def __init__(self, api_key, refresh_margin=REFRESH_MARGIN):
+        # api_key may be a string or a callable, so secrets are only read on first use
+        self._api_key = api_key
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+        self._timer = None
+        self._flight = SingleFlight("iam_token")
+
+    def get_token(self):
+        token = self._token
+        if token is not None and time.time() < self._expires_at:
+            return token
+        return self._refresh(stale_token=token)
+
+    def invalidate(self, token):
+        """Drop ``token`` (e.g. after a 401) and return a fresh one."""
+        return self._refresh(stale_token=token)
+
+    async def get_token_async(self):
+        token = self._token
+        if token is not None and time.time() < self._expires_at:
+            return token
+        return await self._refresh_async(stale_token=token)
+
+    async def invalidate_async(self, token):
+        return await self._refresh_async(stale_token=token)
+
+    def clear(self):
+        """Forget the current token and stop background refreshes."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._token = None
+            self._expires_at = 0.0
+
+    def _refresh(self, stale_token):
+        def refresh():
+            return self._fresh_token(stale_token) or self._store(request_iam_token(self._resolve_api_key()))
+        return self._flight.do("token", refresh)
+
+    async def _refresh_async(self, stale_token):
+        async def refresh():
+            return self._fresh_token(stale_token) or self._store(await request_iam_token_async(self._resolve_api_key()))
+        return await self._flight.do_async("token", refresh)
+
+    def _fresh_token(self, stale_token):
+        # The token, if another caller refreshed it since stale_token was read
+        with self._lock:
+            if self._token is not None and self._token != stale_token and time.time() < self._expires_at:
+                return self._token
+            return None
+
+    def _resolve_api_key(self):
+        return self._api_key() if callable(self._api_key) else self._api_key
+
+    def _store(self, data):
+        expires_in = float(data.get("expires_in", 3600))
+        with self._lock:
+            self._token = data["access_token"]
+            self._expires_at = time.time() + expires_in
+            self._schedule_refresh(expires_in)
+            return self._token
+
+    def _schedule_refresh(self, expires_in):
+        # Called with the lock held
+        if self._timer is not None:
+            self._timer.cancel()
+        delay = max(expires_in - self.refresh_margin, expires_in / 2)
+        self._timer = threading.Timer(delay, self._background_refresh, args=(self._token,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self, token):
+        try:
+            self._refresh(stale_token=token)
+        except Exception:
+            # The current token is still valid; get_token retries once it expires
+            pass
@@ -0,0 +1,113 @@
+# waterseeker-agent/llm_cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from cache import CACHE_DIR, SQLiteCache
+
+LLM_CACHE_ENABLED = os.environ.get("WATERSEEKER_LLM_CACHE", "1") != "0"
+LLM_CACHE_PATH = os.path.join(CACHE_DIR, "llm.sqlite3")
+LLM_CACHE_TTL = float(os.environ.get("WATERSEEKER_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("WATERSEEKER_LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_MEMORY_ENTRIES = int(os.environ.get("WATERSEEKER_LLM_CACHE_MEMORY_ENTRIES", "256"))
+
+
+def cache_key(model_id, parameters, prompt_text):
+    # Greedy decoding with fixed parameters is deterministic, so these fully determine the output
+    blob = json.dumps({"model_id": model_id, "parameters": parameters, "input": prompt_text}, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def templates_fingerprint(*templates):
+    return hashlib.sha256("\x00".join(templates).encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Two-tier (memory LRU + SQLite) cache of generated text keyed by ``cache_key``.
+
+    Each entry remembers how long the original generation took, so the cache
+    can report the latency it has saved. When ``fingerprint`` (a hash of the
+    prompt templates) differs from the one stored on disk, the disk tier is
+    cleared on first use.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES,
+                 memory_entries=LLM_CACHE_MEMORY_ENTRIES, fingerprint=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.fingerprint = fingerprint
+        self._memory = OrderedDict()
+        self._disk = None
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and time.time() - entry["created_at"] > self.ttl:
+                del self._memory[key]
+                entry = None
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self.saved_seconds += entry["latency"]
+                return entry["text"]
+        entry = self._get_disk().get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self.saved_seconds += entry["latency"]
+            self._remember(key, entry)
+        return entry["text"]
+
+    def set(self, key, text, latency):
+        entry = {"text": text, "latency": latency, "created_at": time.time()}
+        with self._lock:
+            self._remember(key, entry)
+        self._get_disk().set(key, entry)
+
+    def invalidate(self):
+        with self._lock:
+            self._memory.clear()
+        self._get_disk().clear()
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": hits / total if total else 0.0,
+                "saved_seconds": self.saved_seconds,
+                "memory_entries": len(self._memory),
+            }
+
+    def _remember(self, key, entry):
+        # Called with the lock held
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _get_disk(self):
+        with self._lock:
+            if self._disk is None:
+                disk = SQLiteCache(self.path, ttl=self.ttl, max_entries=self.max_entries, table="llm_responses")
+                if self.fingerprint is not None:
+                    meta = SQLiteCache(self.path, table="llm_meta")
+                    if meta.get("templates") != self.fingerprint:
+                        disk.clear()
+                        meta.set("templates", self.fingerprint)
+                self._disk = disk
+            return self._disk
@@ -0,0 +1,305 @@
+# waterseeker-agent/policy.py
+import asyncio
+import threading
+import time
+from collections import deque
+import telemetry
+
+# Timeouts and hedge delays follow the observed latencies once this many calls succeeded
+MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+# Never hedge sooner than this (s), however fast the service usually is
+MIN_HEDGE_DELAY = 0.05
+
+
+class CircuitOpen(Exception):
+    """Raised without calling the service while its circuit breaker is open."""
+
+
+class LatencyTracker:
+    """Durations (s) of the last ``window`` successful calls."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q, min_samples=MIN_SAMPLES):
+        """The q-th percentile (nearest rank), or None with fewer than ``min_samples`` calls."""
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            values = sorted(self._samples)
+        return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures and rejects calls for
+    ``reset_timeout`` seconds; then lets one probe through, closing again if it succeeds."""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go out now (False means fail fast)."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if self.clock() - self.opened_at < self.reset_timeout:
+                    return False
+                self._transition("half_open")
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def retry_in(self):
+        with self._lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self.reset_timeout - (self.clock() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            if self.state != "closed":
+                self._transition("closed")
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.opened_at = self.clock()
+                self._transition("open")
+
+    def release(self):
+        # A call that was let through but cancelled says nothing about the service
+        with self._lock:
+            self._probing = False
+
+    def _transition(self, state):
+        # Called with the lock held
+        self.state = state
+        telemetry.count("circuit_transitions_total", circuit=self.name, state=state)
+
+
+class CallPolicy:
+    """Latency-aware timeout, optional hedging and a circuit breaker around calls to one service.
+
+    The timeout is ``timeout_factor`` times the observed p99 latency, kept
+    between ``min_timeout`` and ``max_timeout`` (``max_timeout`` until enough
+    calls have been seen). With ``hedge``, a duplicate request is sent when the
+    first one is slower than the observed p95 and whichever answers first wins.
+    Policies may share a breaker (e.g. plain and streamed calls to one API).
+    """
+
+    def __init__(self, name, max_timeout, min_timeout=1.0, timeout_factor=2.0, hedge=False,
+                 hedge_percentile=95, breaker=None, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.max_timeout = max_timeout
+        self.min_timeout = min_timeout
+        self.timeout_factor = timeout_factor
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.latencies = LatencyTracker()
+
+    def timeout(self):
+        p99 = self.latencies.percentile(99)
+        if p99 is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.timeout_factor))
+
+    def hedge_delay(self):
+        if not self.hedge:
+            return None
+        delay = self.latencies.percentile(self.hedge_percentile)
+        return max(MIN_HEDGE_DELAY, delay) if delay is not None else None
+
+    async def call(self, make_coro, failed=None):
+        """Await ``make_coro()`` under the policy.
+
+        ``failed(result)`` marks results that count as failures for the breaker
+        (e.g. 5xx responses) without raising. Raises CircuitOpen while the
+        breaker is open, and an Exception when the call times out.
+        """
+        self._admit()
+        timeout = self.timeout()
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(self._hedged(make_coro), timeout)
+        except asyncio.TimeoutError:
+            self._record("timeout")
+            raise Exception(f"{self.name} call timed out after {timeout:.1f} s")
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception:
+            self._record("error")
+            raise
+        if failed is not None and failed(result):
+            self._record("error")
+        else:
+            self._record("ok", time.monotonic() - start)
+        return result
+
+    async def stream(self, make_aiter):
+        """Yield the chunks of ``make_aiter()`` under the policy.
+
+        The timeout and hedging apply to the first chunk (the wait users see);
+        the rest of the stream is bounded by the HTTP client's read timeout.
+        """
+        self._admit()
+        timeout = self.timeout()
+        start = time.monotonic()
+        try:
+            chunks, first = await asyncio.wait_for(self._first_chunk(make_aiter), timeout)
+        except asyncio.TimeoutError:
+            self._record("timeout")
+            raise Exception(f"{self.name} call timed out after {timeout:.1f} s")
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception:
+            self._record("error")
+            raise
+        first_chunk_seconds = time.monotonic() - start
+        try:
+            if first is not _END:
+                yield first
+                async for chunk in chunks:
+                    yield chunk
+        except Exception:
+            self._record("error")
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        finally:
+            await chunks.aclose()
+        self._record("ok", first_chunk_seconds)
+
+    def call_sync(self, fn, failed=None):
+        """Blocking counterpart of ``call`` (no hedging): returns ``fn(timeout)``."""
+        self._admit()
+        timeout = self.timeout()
+        start = time.monotonic()
+        try:
+            result = fn(timeout)
+        except Exception:
+            self._record("error")
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        if failed is not None and failed(result):
+            self._record("error")
+        else:
+            self._record("ok", time.monotonic() - start)
+        return result
+
+    async def _hedged(self, make_coro):
+        delay = self.hedge_delay()
+        if delay is None:
+            return await make_coro()
+        tasks = [asyncio.ensure_future(make_coro())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                telemetry.count("hedges_total", policy=self.name)
+                tasks.append(asyncio.ensure_future(make_coro()))
+            return (await _first_success(tasks, self.name)).result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _first_chunk(self, make_aiter):
+        # Returns (stream, first chunk or _END) of the stream that produced a chunk first
+        delay = self.hedge_delay()
+        streams, tasks = [], []
+
+        def start():
+            stream = make_aiter()
+            streams.append(stream)
+            tasks.append(asyncio.ensure_future(_next(stream)))
+        start()
+        winner = None
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    telemetry.count("hedges_total", policy=self.name)
+                    start()
+            task = await _first_success(tasks, self.name)
+            winner = streams[tasks.index(task)]
+            return winner, task.result()
+        finally:
+            for task, stream in zip(tasks, streams):
+                if stream is not winner:
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    await stream.aclose()
+
+    def _admit(self):
+        if not self.breaker.allow():
+            telemetry.count("policy_calls_total", policy=self.name, outcome="rejected")
+            raise CircuitOpen(f"{self.breaker.name} is unavailable (circuit open, retrying in {self.breaker.retry_in():.0f} s).")
+
+    def _record(self, outcome, seconds=None):
+        telemetry.count("policy_calls_total", policy=self.name, outcome=outcome)
+        if outcome == "ok":
+            self.latencies.add(seconds)
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def stats(self):
+        return {
+            "timeout": self.timeout(),
+            "hedge_delay": self.hedge_delay(),
+            "samples": len(self.latencies),
+            "circuit": self.breaker.state,
+            "failures": self.breaker.failures,
+        }
+
+
+_END = object()
+
+
+async def _next(stream):
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return _END
+
+
+async def _first_success(tasks, name):
+    # The first task to succeed; raises only once every task has failed
+    pending = set(tasks)
+    error = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                if task is not tasks[0]:
+                    telemetry.count("hedges_won_total", policy=name)
+                return task
+            error = task.exception()
+    raise error
@@ -0,0 +1,36 @@
+# waterseeker-agent/ranking.py
+from results import format_number
+
+
+def rank_locations(records):
+    """Sort LocationRecords best first.
+
+    Highest capacity wins; rainfall breaks ties and the lower location id
+    breaks exact ties, so the result is deterministic.
+    """
+    return sorted(records, key=lambda r: (-r.capacity, -r.rainfall, r.location_id))
+
+
+def local_justification(ranked):
+    best = ranked[0]
+    others = ", ".join(f"Location {r.location_id} ({format_number(r.capacity)}M liters)" for r in ranked[1:])
+    if not others:
+        return f"Only location analyzed, with a capacity of {format_number(best.capacity)}M liters and rainfall of {format_number(best.rainfall)}mm/year."
+    tied = [r for r in ranked[1:] if r.capacity == best.capacity]
+    if tied:
+        tied_text = ", ".join(f"Location {r.location_id} ({format_number(r.rainfall)}mm/year)" for r in tied)
+        return (f"Highest capacity ({format_number(best.capacity)}M liters) compared to {others}. "
+                f"Capacity is tied, so rainfall decides: {format_number(best.rainfall)}mm/year versus {tied_text}.")
+    return (f"Highest capacity ({format_number(best.capacity)}M liters) compared to {others}. "
+            f"Rainfall at this location is {format_number(best.rainfall)}mm/year.")
+
+
+def build_recommendation(ranked, justification=None):
+    """Build the '- Recommended:' / '- Justification:' lines for the top-ranked record."""
+    if not ranked:
+        return "- No recommendation: No location has a usable analysis."
+    if ranked[0].capacity <= 0:
+        return "- No recommendation: No location has a positive estimated capacity."
+    best = ranked[0]
+    justification = justification or local_justification(ranked)
+    return f"- Recommended: Location {best.location_id} (lat: {best.lat}, lon: {best.lon})\n- Justification: {justification}"
@@ -0,0 +1,36 @@
+# waterseeker-agent/ratelimit.py
+import threading
+import time
+
+
+class RateLimiter:
+    """Spaces out calls so that at most one starts every ``min_interval`` seconds.
+
+    Shared by every thread in the process, so all Streamlit sessions together
+    stay within a provider's usage policy.
+    """
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_allowed = 0.0
+
+    def reserve(self):
+        """Claim the next slot and return how many seconds to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_allowed - now
+            self._next_allowed = max(now, self._next_allowed) + self.min_interval
+        return delay
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        # Same schedule as wait(), so threads and coroutines share one limit
+        import asyncio
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
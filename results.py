@@ -0,0 +1,67 @@
+# waterseeker-agent/results.py
+from dataclasses import asdict, dataclass, field
+
+
+def format_number(value):
+    # Fixed-point, so large values stay parseable by analysis_parser (no exponent form)
+    return f"{value:.1f}".rstrip("0").rstrip(".")
+
+
+@dataclass
+class LocationRecord:
+    """Parsed analysis for one input location, plus enrichment filled in later."""
+
+    __slots__ = ("location_id", "lat", "lon", "rainfall", "capacity", "found", "country", "city", "water_resources")
+
+    location_id: int
+    lat: float
+    lon: float
+    rainfall: float  # mm/year
+    capacity: float  # M liters
+    found: bool  # False when the LLM output had no usable row for this location
+    country: str
+    city: str
+    water_resources: str
+
+    def line(self):
+        return (f"- Location {self.location_id} (lat: {self.lat}, lon: {self.lon}): "
+                f"Rainfall: {format_number(self.rainfall)}mm/year, Capacity: {format_number(self.capacity)}M liters")
+
+    def enriched_line(self):
+        return f"{self.line()}, Country: {self.country}, City: {self.city}"
+
+
+@dataclass
+class AgentResult:
+    """Everything run_waterseeker_agent produces.
+
+    Unpacks like the old 5-tuple
+    ``(analysis, recommendation, coords, agent_log, water_resources)``.
+    """
+
+    analysis: str
+    recommendation: str
+    locations: list
+    agent_log: str
+    water_resources: list
+    records: list = field(default_factory=list)
+    recommended_index: int = -1
+    raw_analysis: str = ""
+    trace: object = None  # telemetry.Trace of the run: spans, counters, and the log lines
+
+    def __iter__(self):
+        return iter((self.analysis, self.recommendation, self.locations, self.agent_log, self.water_resources))
+
+    def to_dict(self):
+        """JSON-serializable form (the HTTP service's job result)."""
+        return {
+            "analysis": self.analysis,
+            "recommendation": self.recommendation,
+            "recommended_index": self.recommended_index,
+            "locations": [list(location) for location in self.locations],
+            "records": [asdict(record) for record in self.records],
+            "water_resources": list(self.water_resources),
+            "agent_log": self.agent_log,
+            "trace_id": self.trace.trace_id if self.trace is not None else None,
+            "timings": self.trace.summary() if self.trace is not None else {},
+        }
@@ -0,0 +1,419 @@
+# waterseeker-agent/service.py
+# Headless analysis service:
+#   python service.py --port 8080 --workers 4 --queue-size 32
+# POST /analyses {"locations": [[lat, lon], ...]} queues a job (202, or 429 when the
+# queue is full); GET /analyses/<id> polls it (?wait=30 long-polls until it finishes),
+# GET /analyses/<id>/events streams the location rows and the result as server-sent
+# events. Identical requests submitted while one is queued or running share that job.
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import telemetry
+import waterseeker
+from event_loop import get_background_loop
+
+# Analyses running at once (each is a task on the shared event loop, not a thread)
+WORKERS = int(os.environ.get("WATERSEEKER_SERVICE_WORKERS", "4"))
+# Jobs waiting for a worker before submissions are refused with 429
+QUEUE_SIZE = int(os.environ.get("WATERSEEKER_SERVICE_QUEUE", "32"))
+# How long finished jobs stay available for polling (s)
+JOB_TTL = float(os.environ.get("WATERSEEKER_SERVICE_JOB_TTL", "900"))
+MAX_LOCATIONS = int(os.environ.get("WATERSEEKER_SERVICE_MAX_LOCATIONS", "500"))
+MAX_BODY = 1 << 20
+# Longest ?wait= a poll may block for, and the SSE keep-alive interval (s)
+MAX_WAIT = 60.0
+HEARTBEAT = 15.0
+RECOMMENDATION_MODES = ("local", "hybrid", "llm")
+OUTPUT_MODES = ("text", "json")
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    """One queued analysis and everything streamed from it so far."""
+
+    def __init__(self, key, locations, recommendation_mode, output_mode):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.locations = locations
+        self.recommendation_mode = recommendation_mode
+        self.output_mode = output_mode
+        self.status = "queued"
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.submissions = 1
+        self.result = None
+        self.error = None
+        self.events = []  # (event, data), numbered by position for Last-Event-ID
+        self._changed = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in ("succeeded", "failed")
+
+    def emit(self, event, data, status=None):
+        with self._changed:
+            if status is not None:
+                self.status = status
+            self.events.append((event, data))
+            self._changed.notify_all()
+
+    def wait(self, timeout):
+        """Block until the job is done or ``timeout`` passes; returns whether it is done."""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.done, timeout)
+
+    def events_after(self, index, timeout):
+        """Events from position ``index`` on, waiting up to ``timeout`` for a new one."""
+        with self._changed:
+            self._changed.wait_for(lambda: len(self.events) > index or self.done, timeout)
+            return self.events[index:]
+
+    def to_dict(self, with_result=True):
+        job = {
+            "id": self.id,
+            "status": self.status,
+            "locations": [list(location) for location in self.locations],
+            "recommendation_mode": self.recommendation_mode,
+            "output_mode": self.output_mode,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "submissions": self.submissions,
+        }
+        if with_result and self.done:
+            job["result"] = self.result
+            job["error"] = self.error
+        return job
+
+
+class AnalysisService:
+    """Bounded job queue in front of ``run_waterseeker_agent_async``.
+
+    ``workers`` coroutines on the shared background event loop take jobs in
+    submission order; at most ``queue_size`` jobs wait behind them, after which
+    ``submit`` raises QueueFull (the HTTP layer answers 429 with Retry-After).
+    """
+
+    def __init__(self, workers=WORKERS, queue_size=QUEUE_SIZE, job_ttl=JOB_TTL):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.job_ttl = job_ttl
+        self._jobs = {}
+        self._active = {}  # coalescing key -> queued or running job
+        self._queued = 0
+        self._running = 0
+        self._lock = threading.Lock()
+        self._loop = None
+        self._queue = None
+        self._tasks = []
+        self._durations = []  # recent job run times, for Retry-After
+
+    def start(self):
+        self._loop = get_background_loop()
+        self._loop.submit(self._start_workers()).result()
+        return self
+
+    async def _start_workers(self):
+        # Created on the loop so the queue and tasks belong to it
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.submit(self._stop_workers()).result()
+            self._loop = None
+
+    async def _stop_workers(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, locations, recommendation_mode=None, output_mode=None):
+        """Queue an analysis; returns ``(job, coalesced)``."""
+        # Resolved first, so leaving a mode out and asking for the default share a job
+        recommendation_mode = recommendation_mode or waterseeker.RECOMMENDATION_MODE
+        output_mode = output_mode or waterseeker.ANALYSIS_OUTPUT_MODE
+        key = (tuple(locations), recommendation_mode, output_mode)
+        with self._lock:
+            self._expire()
+            job = self._active.get(key)
+            if job is not None:
+                job.submissions += 1
+                telemetry.count("service_jobs_total", outcome="coalesced")
+                return job, True
+            if self._queued + self._running >= self.workers + self.queue_size:
+                telemetry.count("service_jobs_total", outcome="rejected")
+                raise QueueFull(f"{self._queued} analyses are already waiting.")
+            job = Job(key, list(locations), recommendation_mode, output_mode)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._queued += 1
+        telemetry.count("service_jobs_total", outcome="accepted")
+        job.emit("status", {"status": "queued"})
+        self._loop.loop.call_soon_threadsafe(self._queue.put_nowait, job)
+        return job, False
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+            try:
+                await self._run(job)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._active.pop(job.key, None)
+
+    async def _run(self, job):
+        job.started_at = time.time()
+        job.emit("status", {"status": "running"}, status="running")
+
+        def on_location(loc_id, line):
+            job.emit("location", {"location": loc_id, "line": line})
+        try:
+            queue_wait_ms = (job.started_at - job.submitted_at) * 1000
+            with telemetry.span("service_job", locations=len(job.locations), queue_wait_ms=queue_wait_ms):
+                result = await waterseeker.run_waterseeker_agent_async(
+                    job.locations, on_location=on_location,
+                    recommendation_mode=job.recommendation_mode, output_mode=job.output_mode,
+                )
+        except asyncio.CancelledError:
+            job.error = "Service stopped."
+            job.finished_at = time.time()
+            job.emit("error", {"error": job.error}, status="failed")
+            raise
+        except Exception as e:
+            job.error = str(e)
+            job.finished_at = time.time()
+            job.emit("error", {"error": job.error}, status="failed")
+            telemetry.count("service_jobs_total", outcome="failed")
+        else:
+            job.result = result.to_dict()
+            job.finished_at = time.time()
+            job.emit("result", job.result, status="succeeded")
+            telemetry.count("service_jobs_total", outcome="succeeded")
+        with self._lock:
+            self._durations = (self._durations + [job.finished_at - job.started_at])[-20:]
+
+    def _expire(self):
+        # Called with the lock held
+        cutoff = time.time() - self.job_ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def retry_after(self):
+        """Seconds until a queue slot is likely to free up."""
+        with self._lock:
+            average = sum(self._durations) / len(self._durations) if self._durations else 5.0
+            return max(1, round(average * (self._queued + 1) / self.workers))
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.workers, "queue_size": self.queue_size, "queued": self._queued,
+                    "running": self._running, "jobs": len(self._jobs)}
+
+    def prometheus(self):
+        stats = self.stats()
+        metric = telemetry.METRICS_PREFIX + "service_jobs"
+        lines = [f"# TYPE {metric} gauge"]
+        lines += [f'{metric}{{state="{state}"}} {stats[state]}' for state in ("queued", "running")]
+        return telemetry.metrics.prometheus() + "\n".join(lines) + "\n"
+
+
+def parse_request(body):
+    """``(locations, recommendation_mode, output_mode)`` from a POST body; raises ValueError."""
+    try:
+        request = json.loads(body or b"{}")
+    except ValueError:
+        raise ValueError("Body must be JSON.")
+    if not isinstance(request, dict):
+        raise ValueError("Body must be a JSON object.")
+    locations = request.get("locations")
+    if not isinstance(locations, list) or not locations:
+        raise ValueError("'locations' must be a non-empty list of [lat, lon] pairs.")
+    if len(locations) > MAX_LOCATIONS:
+        raise ValueError(f"At most {MAX_LOCATIONS} locations per analysis.")
+    points = []
+    for location in locations:
+        if isinstance(location, dict):
+            location = (location.get("lat"), location.get("lon"))
+        try:
+            lat, lon = (float(value) for value in location)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid location: {location!r}")
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError(f"Location out of range: {location!r}")
+        # Same rounding the map clicks get, so equivalent requests coalesce
+        points.append((round(lat, 6), round(lon, 6)))
+    recommendation_mode = request.get("recommendation_mode")
+    if recommendation_mode is not None and recommendation_mode not in RECOMMENDATION_MODES:
+        raise ValueError(f"'recommendation_mode' must be one of {', '.join(RECOMMENDATION_MODES)}.")
+    output_mode = request.get("output_mode")
+    if output_mode is not None and output_mode not in OUTPUT_MODES:
+        raise ValueError(f"'output_mode' must be one of {', '.join(OUTPUT_MODES)}.")
+    return points, recommendation_mode, output_mode
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    server_version = "WaterSeeker"
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, message, headers=None):
+        self.send_json(status, {"error": message}, headers)
+
+    def do_POST(self):
+        path = urlsplit(self.path).path.rstrip("/")
+        # Plain digits only (int() would also take signs, "_" and non-ASCII digits). The body
+        # is not read on a bad length, so the connection can't be reused
+        value = self.headers.get("Content-Length", "0").strip()
+        if not (value.isascii() and value.isdigit()):
+            self.close_connection = True
+            return self.send_error_json(400, "Invalid Content-Length.")
+        length = int(value)
+        if length > MAX_BODY:
+            self.close_connection = True
+            return self.send_error_json(413, "Request body too large.")
+        body = self.rfile.read(length)
+        if path != "/analyses":
+            return self.send_error_json(404, "Not found.")
+        try:
+            request = parse_request(body)
+        except ValueError as e:
+            return self.send_error_json(400, str(e))
+        try:
+            job, coalesced = self.service.submit(*request)
+        except QueueFull as e:
+            return self.send_error_json(429, str(e), {"Retry-After": str(self.service.retry_after())})
+        payload = dict(job.to_dict(with_result=False), coalesced=coalesced,
+                       links={"self": f"/analyses/{job.id}", "events": f"/analyses/{job.id}/events"})
+        self.send_json(202, payload, {"Location": f"/analyses/{job.id}"})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = url.path.strip("/").split("/")
+        if url.path == "/healthz":
+            return self.send_json(200, dict(self.service.stats(), status="ok"))
+        if url.path == "/metrics":
+            body = self.service.prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            return self.wfile.write(body)
+        if parts[0] != "analyses" or len(parts) not in (2, 3) or (len(parts) == 3 and parts[2] != "events"):
+            return self.send_error_json(404, "Not found.")
+        job = self.service.get(parts[1])
+        if job is None:
+            return self.send_error_json(404, "No such analysis (finished jobs expire).")
+        if len(parts) == 3:
+            return self.stream_events(job)
+        try:
+            wait = min(float(parse_qs(url.query).get("wait", ["0"])[0]), MAX_WAIT)
+        except ValueError:
+            return self.send_error_json(400, "'wait' must be a number of seconds.")
+        if wait > 0:
+            job.wait(wait)
+        self.send_json(200, job.to_dict())
+
+    def stream_events(self, job):
+        try:
+            index = max(int(self.headers.get("Last-Event-ID", "-1")) + 1, 0)
+        except ValueError:
+            return self.send_error_json(400, "Invalid Last-Event-ID.")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            while True:
+                events = job.events_after(index, HEARTBEAT)
+                if not events:
+                    if job.done:
+                        break
+                    self.wfile.write(b": keep-alive\n\n")
+                for offset, (event, data) in enumerate(events):
+                    payload = json.dumps(data, default=str)
+                    self.wfile.write(f"id: {index + offset}\nevent: {event}\ndata: {payload}\n\n".encode())
+                self.wfile.flush()
+                index += len(events)
+                if job.done and index >= len(job.events):
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class ServiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service, verbose=False):
+        super().__init__(address, ServiceHandler)
+        self.service = service
+        self.verbose = verbose
+
+
+def serve(host="127.0.0.1", port=8080, workers=WORKERS, queue_size=QUEUE_SIZE, verbose=True):
+    service = AnalysisService(workers, queue_size).start()
+    server = ServiceServer((host, port), service, verbose)
+    print(f"WaterSeeker service on http://{host}:{server.server_address[1]} "
+          f"({service.workers} workers, queue {service.queue_size})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve WaterSeeker analyses over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="analyses running at once")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="jobs waiting before 429s")
+    parser.add_argument("--quiet", action="store_true", help="don't log requests")
+    args = parser.parse_args(argv)
+    serve(args.host, args.port, args.workers, args.queue_size, not args.quiet)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+# waterseeker-agent/singleflight.py
+import threading
+from concurrent.futures import Future
+import telemetry
+
+
+class _Abandoned(Exception):
+    # The leading call was cancelled or closed early; a waiting caller takes over
+    pass
+
+
+class SingleFlight:
+    """Process-wide deduplication of concurrent calls with the same key.
+
+    The first caller for a key (the leader) does the work; callers arriving
+    while it is in flight wait for it and share its result or exception
+    instead of sending the same request again. Works across threads and
+    event loops, so Streamlit sessions, batch workers and async agent runs
+    all share one request. Shared results must be treated as read-only.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.leaders = 0
+        self.shared = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, on_shared=None):
+        """Return ``fn()``, or the result of the call for ``key`` already in flight."""
+        while True:
+            flight, leader = self._join(key)
+            if leader:
+                return self._lead(key, flight, fn)
+            try:
+                result = flight.result()
+            except _Abandoned:
+                continue
+            except Exception:
+                self._share(on_shared)
+                raise
+            self._share(on_shared)
+            return result
+
+    async def do_async(self, key, make_coro, on_shared=None):
+        """Coroutine version of ``do``: awaits ``make_coro()`` or joins the call in flight."""
+        import asyncio
+        while True:
+            flight, leader = self._join(key)
+            if leader:
+                try:
+                    result = await make_coro()
+                except BaseException as e:
+                    self._finish(key, flight, error=e)
+                    raise
+                self._finish(key, flight, result)
+                return result
+            try:
+                # Shielded: a cancelled waiter must not cancel the flight for the others
+                result = await asyncio.shield(asyncio.wrap_future(flight))
+            except _Abandoned:
+                continue
+            except Exception:
+                self._share(on_shared)
+                raise
+            self._share(on_shared)
+            return result
+
+    def stream(self, key, make_iter, join="".join, on_shared=None):
+        """Generator version of ``do``: the leader yields chunks as they arrive,
+        callers joining its flight get ``join(chunks)`` as one chunk when it completes."""
+        while True:
+            flight, leader = self._join(key)
+            if not leader:
+                try:
+                    result = flight.result()
+                except _Abandoned:
+                    continue
+                except Exception:
+                    self._share(on_shared)
+                    raise
+                self._share(on_shared)
+                yield result
+                return
+            chunks = []
+            try:
+                for chunk in make_iter():
+                    chunks.append(chunk)
+                    yield chunk
+            except BaseException as e:
+                self._finish(key, flight, error=e)
+                raise
+            self._finish(key, flight, join(chunks))
+            return
+
+    async def stream_async(self, key, make_aiter, join="".join, on_shared=None):
+        """Async generator version of ``stream``."""
+        import asyncio
+        while True:
+            flight, leader = self._join(key)
+            if not leader:
+                try:
+                    result = await asyncio.shield(asyncio.wrap_future(flight))
+                except _Abandoned:
+                    continue
+                except Exception:
+                    self._share(on_shared)
+                    raise
+                self._share(on_shared)
+                yield result
+                return
+            chunks = []
+            try:
+                async for chunk in make_aiter():
+                    chunks.append(chunk)
+                    yield chunk
+            except BaseException as e:
+                self._finish(key, flight, error=e)
+                raise
+            self._finish(key, flight, join(chunks))
+            return
+
+    def _join(self, key):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = Future()
+            # A running future can't be cancelled by a waiter
+            flight.set_running_or_notify_cancel()
+            self.leaders += 1
+        telemetry.count("singleflight_calls_total", flight=self.name, role="leader")
+        return flight, True
+
+    def _lead(self, key, flight, fn):
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, flight, error=e)
+            raise
+        self._finish(key, flight, result)
+        return result
+
+    def _finish(self, key, flight, result=None, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        if error is None:
+            flight.set_result(result)
+        elif isinstance(error, Exception):
+            flight.set_exception(error)
+        else:
+            # Cancellation, GeneratorExit, KeyboardInterrupt: only the leader's own call ends
+            flight.set_exception(_Abandoned())
+
+    def _share(self, on_shared):
+        # Counted for shared exceptions too: the request was still collapsed
+        with self._lock:
+            self.shared += 1
+        telemetry.count("singleflight_calls_total", flight=self.name, role="shared")
+        if on_shared is not None:
+            on_shared()
+
+    def stats(self):
+        with self._lock:
+            total = self.leaders + self.shared
+            return {
+                "leaders": self.leaders,
+                "shared": self.shared,
+                "shared_ratio": self.shared / total if total else 0.0,
+                "in_flight": len(self._flights),
+            }
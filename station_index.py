@@ -0,0 +1,222 @@
+# waterseeker-agent/station_index.py
+# Offline index of monitoring stations for nearest-station queries without network calls.
+#   python station_index.py build usgs_sites.rdb hydat_stations.csv my_wells.csv
+#   python station_index.py query 35.7 -78.4 -k 5 --radius 50
+# Inputs: USGS NWIS site-service RDB files, Environment Canada station lists
+# (STATION_NUMBER, STATION_NAME, LATITUDE, LONGITUDE) or any CSV with lat/lon columns.
+import argparse
+import csv
+import math
+import os
+import threading
+from dataclasses import dataclass
+import numpy as np
+from cache import CACHE_DIR
+from geo import EARTH_RADIUS_KM, haversine_km
+import usgs
+
+STATION_INDEX_PATH = os.environ.get("WATERSEEKER_STATION_INDEX", os.path.join(CACHE_DIR, "stations"))
+# Stations are bucketed into cells of this many degrees and stored sorted by cell
+CELL_DEG = 0.25
+NAME_CHARS = 64
+STATION_DTYPE = np.dtype([
+    ("cell", "<i8"),
+    ("lat", "<f8"),
+    ("lon", "<f8"),
+    ("id", "<U20"),
+    ("name", f"<U{NAME_CHARS}"),
+    ("kind", "<U8"),
+    ("source", "<U20"),
+])
+ID_COLUMNS = ("id", "site_no", "station_number", "station_id")
+NAME_COLUMNS = ("name", "station_nm", "station_name")
+KIND_COLUMNS = ("kind", "type", "site_tp_cd")
+LAT_COLUMNS = ("lat", "latitude", "dec_lat_va")
+LON_COLUMNS = ("lon", "lng", "long", "longitude", "dec_long_va")
+
+_index = None
+_index_loaded = False
+_index_lock = threading.Lock()
+
+
+@dataclass
+class Station:
+    """One indexed station, as returned by StationIndex.nearest."""
+
+    __slots__ = ("station_id", "name", "kind", "source", "lat", "lon", "distance_km")
+
+    station_id: str
+    name: str
+    kind: str
+    source: str
+    lat: float
+    lon: float
+    distance_km: float
+
+    def label(self):
+        kind = f"{self.kind}, " if self.kind else ""
+        return f"{self.name} ({kind}{self.distance_km:.1f} km, {self.source})"
+
+
+def _cell_columns():
+    return int(round(360 / CELL_DEG))
+
+
+def cell_of(lat, lon):
+    row = np.floor((np.asarray(lat) + 90) / CELL_DEG).astype(np.int64)
+    col = np.floor((np.asarray(lon) + 180) / CELL_DEG).astype(np.int64) % _cell_columns()
+    return row * _cell_columns() + col
+
+
+def _pick(row, names, default=""):
+    for name in names:
+        if row.get(name):
+            return row[name].strip()
+    return default
+
+
+def read_catalog(path):
+    """Yield (id, name, kind, source, lat, lon) from one station catalog file."""
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        first = f.readline()
+        f.seek(0)
+        if path.endswith(".rdb") or first.startswith("#"):
+            for site in usgs.parse_sites(f):
+                yield site.site_no, site.name, site.site_type, "USGS", site.lat, site.lon
+            return
+        for index, row in enumerate(csv.DictReader(f)):
+            row = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+            lat, lon = _pick(row, LAT_COLUMNS), _pick(row, LON_COLUMNS)
+            if not lat or not lon:
+                continue
+            source = "Environment Canada" if "station_number" in row else os.path.basename(path)
+            name = _pick(row, NAME_COLUMNS, "Unnamed station")
+            yield _pick(row, ID_COLUMNS, str(index)), name, _pick(row, KIND_COLUMNS), source, float(lat), float(lon)
+
+
+def build_index(paths, out_dir=None):
+    """Write a cell-sorted station array plus its cell offsets to out_dir; returns the count."""
+    out_dir = out_dir or STATION_INDEX_PATH
+    rows = [row for path in paths for row in read_catalog(path)]
+    stations = np.empty(len(rows), dtype=STATION_DTYPE)
+    for i, (station_id, name, kind, source, lat, lon) in enumerate(rows):
+        stations[i] = (0, lat, lon, station_id, name[:NAME_CHARS], kind, source)
+    stations["cell"] = cell_of(stations["lat"], stations["lon"])
+    stations = stations[np.argsort(stations["cell"], kind="stable")]
+    cells, starts = np.unique(stations["cell"], return_index=True)
+    offsets = np.append(starts, len(stations)).astype(np.int64)
+    os.makedirs(out_dir, exist_ok=True)
+    for name, array in (("stations.npy", stations), ("cells.npy", cells), ("offsets.npy", offsets)):
+        # Written under a temporary name first so a running app never maps a half-written file
+        tmp = os.path.join(out_dir, name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp, os.path.join(out_dir, name))
+    return len(stations)
+
+
+class StationIndex:
+    """Memory-mapped, cell-bucketed station array.
+
+    A query only reads the cells overlapping the search radius: one
+    binary search per cell row, then a vectorized distance over the
+    stations found.
+    """
+
+    def __init__(self, path=None):
+        path = path or STATION_INDEX_PATH
+        self.stations = np.load(os.path.join(path, "stations.npy"), mmap_mode="r")
+        self.cells = np.load(os.path.join(path, "cells.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.stations)
+
+    def _candidates(self, lat, lon, radius_km):
+        columns = _cell_columns()
+        lat_span = math.degrees(radius_km / EARTH_RADIUS_KM)
+        cos_lat = max(math.cos(math.radians(min(abs(lat) + lat_span, 90.0))), 1e-6)
+        lon_span = min(lat_span / cos_lat, 180.0)
+        row_min = int(math.floor((max(lat - lat_span, -90.0) + 90) / CELL_DEG))
+        row_max = int(math.floor((min(lat + lat_span, 90.0) + 90) / CELL_DEG))
+        col_min = int(math.floor((lon - lon_span + 180) / CELL_DEG))
+        col_max = int(math.floor((lon + lon_span + 180) / CELL_DEG))
+        # Split the column range where it wraps around the antimeridian
+        if col_max - col_min + 1 >= columns:
+            col_ranges = [(0, columns - 1)]
+        elif col_min < 0:
+            col_ranges = [(0, col_max), (col_min + columns, columns - 1)]
+        elif col_max >= columns:
+            col_ranges = [(col_min, columns - 1), (0, col_max - columns)]
+        else:
+            col_ranges = [(col_min, col_max)]
+        slices = []
+        for row in range(row_min, row_max + 1):
+            for first, last in col_ranges:
+                lo, hi = np.searchsorted(self.cells, [row * columns + first, row * columns + last + 1])
+                if hi > lo:
+                    slices.append(slice(int(self.offsets[lo]), int(self.offsets[hi])))
+        return slices
+
+    def nearest(self, lat, lon, k=5, radius_km=50.0):
+        """Up to k stations within radius_km of the point, nearest first."""
+        slices = self._candidates(lat, lon, radius_km)
+        if not slices:
+            return []
+        # Distances use only the coordinate columns; full records are read for the winners
+        rows = np.concatenate([np.arange(s.start, s.stop) for s in slices])
+        distances = haversine_km(lat, lon, self.stations["lat"][rows], self.stations["lon"][rows])
+        inside = np.flatnonzero(distances <= radius_km)
+        if inside.size > k:
+            inside = inside[np.argpartition(distances[inside], k - 1)[:k]]
+        inside = inside[np.argsort(distances[inside], kind="stable")]
+        return [
+            Station(str(c["id"]), str(c["name"]), str(c["kind"]), str(c["source"]),
+                    float(c["lat"]), float(c["lon"]), float(distances[i]))
+            for i, c in zip(inside, self.stations[rows[inside]])
+        ]
+
+    def within(self, south, west, north, east):
+        """(lats, lons) of every station in the bounding box."""
+        lat, lon = self.stations["lat"], self.stations["lon"]
+        mask = (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+        return np.asarray(lat[mask]), np.asarray(lon[mask])
+
+
+def get_station_index():
+    """The shared index, loaded on first use; None when no index has been built."""
+    global _index, _index_loaded
+    if not _index_loaded:
+        with _index_lock:
+            # Set only after the index is assigned, so no caller sees the flag with the index still unset
+            if not _index_loaded:
+                if os.path.exists(os.path.join(STATION_INDEX_PATH, "stations.npy")):
+                    _index = StationIndex(STATION_INDEX_PATH)
+                _index_loaded = True
+    return _index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the local station index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="index one or more station catalogs")
+    build.add_argument("catalogs", nargs="+")
+    build.add_argument("-o", "--output", default=STATION_INDEX_PATH, help="index directory")
+    query = commands.add_parser("query", help="nearest stations to a point")
+    query.add_argument("lat", type=float)
+    query.add_argument("lon", type=float)
+    query.add_argument("-k", type=int, default=5)
+    query.add_argument("--radius", type=float, default=50.0, help="km")
+    query.add_argument("--index", default=STATION_INDEX_PATH, help="index directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        count = build_index(args.catalogs, args.output)
+        print(f"Indexed {count} stations into {args.output}")
+    else:
+        for station in StationIndex(args.index).nearest(args.lat, args.lon, args.k, args.radius):
+            print(f"{station.station_id}\t{station.label()}")
+
+
+if __name__ == "__main__":
+    main()
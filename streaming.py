@@ -0,0 +1,50 @@
+# waterseeker-agent/streaming.py
+import json
+
+
+def iter_sse_data(lines):
+    """Yield the decoded JSON ``data:`` payload of each server-sent event."""
+    data_lines = []
+    for line in lines:
+        event = _feed_line(line, data_lines)
+        if event is not None:
+            yield event
+    event = _decode(data_lines)
+    if event is not None:
+        yield event
+
+
+async def aiter_sse_data(lines):
+    """``iter_sse_data`` for an async iterator of lines (e.g. httpx ``aiter_lines``)."""
+    data_lines = []
+    async for line in lines:
+        event = _feed_line(line, data_lines)
+        if event is not None:
+            yield event
+    event = _decode(data_lines)
+    if event is not None:
+        yield event
+
+
+def _feed_line(line, data_lines):
+    # Returns the event's payload when this line ends one, else None
+    if line is None:
+        return None
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    line = line.rstrip("\r")
+    if not line:
+        # A blank line ends the event
+        event = _decode(data_lines)
+        data_lines.clear()
+        return event
+    if line.startswith("data:"):
+        data_lines.append(line[5:].lstrip(" "))
+    return None
+
+
+def _decode(data_lines):
+    payload = "\n".join(data_lines)
+    if payload.strip() and payload.strip() != "[DONE]":
+        return json.loads(payload)
+    return None
@@ -0,0 +1,330 @@
+# waterseeker-agent/telemetry.py
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# When set, every agent run writes its trace here as <trace_id>.json
+TRACE_DIR = os.environ.get("WATERSEEKER_TRACE_DIR")
+# When set, the process-wide metrics are rewritten here in Prometheus text format after
+# every run (e.g. for the node_exporter textfile collector)
+METRICS_PATH = os.environ.get("WATERSEEKER_METRICS_PATH")
+METRICS_PREFIX = "waterseeker_"
+# Upper bounds (seconds) of the span duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_current_trace = contextvars.ContextVar("waterseeker_trace", default=None)
+
+
+class Span:
+    """One timed operation: an IAM token request, an LLM call, a geocode, ..."""
+
+    __slots__ = ("name", "attributes", "start", "end", "status", "error", "_t0", "_trace")
+
+    def __init__(self, name, attributes, trace=None):
+        self.name = name
+        self.attributes = attributes
+        self.start = time.time()
+        self.end = None
+        self.status = "ok"
+        self.error = None
+        self._t0 = time.perf_counter()
+        self._trace = trace
+
+    @property
+    def duration(self):
+        return (self.end - self.start) if self.end is not None else None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Wall-clock start for export, monotonic clock for the duration
+        self.end = self.start + (time.perf_counter() - self._t0)
+        if exc_type is GeneratorExit:
+            self.status = "cancelled"
+        elif exc_type is not None:
+            self.status, self.error = "error", str(exc)
+        metrics.observe(self)
+        if self._trace is not None:
+            self._trace.add_span(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "start": self.start,
+            "end": self.end,
+            "duration_ms": self.duration * 1000 if self.end is not None else None,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+    def log_line(self):
+        line = f"⏱️ {self.name}: {self.duration * 1000:.0f} ms"
+        if self.attributes.get("cached"):
+            line += " (cached)"
+        elif self.attributes.get("shared"):
+            line += " (shared)"
+        if self.status != "ok":
+            line += f" ({self.status}{': ' + self.error if self.error else ''})"
+        return line
+
+
+class Trace:
+    """Spans, counters and log lines of one agent run.
+
+    Drop-in for the old ``agent_log`` list: ``append`` adds a log line, and
+    ``text()`` renders the human-readable log, with a timing line wherever a
+    span finished.
+    """
+
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.started_at = time.time()
+        self.counters = {}
+        self._events = []  # ("log", str) or ("span", Span), in order
+        self._lock = threading.Lock()
+
+    def append(self, line):
+        with self._lock:
+            self._events.append(("log", line))
+
+    def extend(self, other):
+        # Another Trace (e.g. a worker's) is merged with its spans and counters; anything else is lines
+        if isinstance(other, Trace):
+            with other._lock:
+                events, counters = list(other._events), dict(other.counters)
+            with self._lock:
+                self._events.extend(events)
+                for key, value in counters.items():
+                    self.counters[key] = self.counters.get(key, 0) + value
+        else:
+            for line in other:
+                self.append(line)
+
+    def add_span(self, span):
+        with self._lock:
+            self._events.append(("span", span))
+
+    def add_count(self, key, value):
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    @property
+    def spans(self):
+        with self._lock:
+            return [payload for kind, payload in self._events if kind == "span"]
+
+    def lines(self, timings=True):
+        with self._lock:
+            events = list(self._events)
+        return [payload if kind == "log" else payload.log_line() for kind, payload in events if kind == "log" or timings]
+
+    def text(self, timings=True):
+        return "\n".join(self.lines(timings))
+
+    def summary(self):
+        """{span name: {"count", "total_ms", "max_ms", "errors"}}, in order of first appearance."""
+        stages = {}
+        for span in self.spans:
+            stage = stages.setdefault(span.name, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "errors": 0})
+            stage["count"] += 1
+            stage["total_ms"] += span.duration * 1000
+            stage["max_ms"] = max(stage["max_ms"], span.duration * 1000)
+            stage["errors"] += span.status == "error"
+        return stages
+
+    def to_dict(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.started_at,
+            "spans": [span.to_dict() for span in self.spans],
+            "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in counters.items()],
+            "log": self.lines(timings=False),
+        }
+
+    def to_json(self, indent=None):
+        return json.dumps(self.to_dict(), indent=indent, default=str)
+
+
+class Metrics:
+    """Process-wide counters, span duration histograms and gauges (what Prometheus scrapes).
+
+    Gauges are read when exported from the ``stats()`` of long-lived objects
+    (caches, connection pools) registered with ``register_gauges``.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = []
+        self._lock = threading.Lock()
+
+    def inc(self, key, value=1):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, span):
+        with self._lock:
+            histogram = self._histograms.get(span.name)
+            if histogram is None:
+                histogram = self._histograms[span.name] = {"buckets": [0] * len(self.buckets), "count": 0, "sum": 0.0, "errors": 0}
+            for i, bound in enumerate(self.buckets):
+                if span.duration <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["count"] += 1
+            histogram["sum"] += span.duration
+            histogram["errors"] += span.status == "error"
+
+    def register_gauges(self, name, collect, label=None):
+        """Export ``collect()``, a ``{key: number}`` dict, as gauges ``<name>_<key>``.
+
+        With ``label``, ``collect()`` returns ``{label value: {key: number}}`` instead,
+        e.g. per-host stats. Non-numeric values are skipped.
+        """
+        with self._lock:
+            self._gauges.append((name, collect, label))
+
+    def gauges(self):
+        """``[(name, labels, value)]`` read from the registered collectors, sorted."""
+        with self._lock:
+            registered = list(self._gauges)
+        samples = []
+        for name, collect, label in registered:
+            groups = collect().items() if label else [(None, collect())]
+            for group, stats in groups:
+                labels = ((label, str(group)),) if label else ()
+                samples.extend((f"{name}_{key}", labels, value) for key, value in stats.items()
+                               if isinstance(value, (int, float)))
+        return sorted(samples)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def to_dict(self):
+        gauges = [{"name": name, "labels": dict(labels), "value": value} for name, labels, value in self.gauges()]
+        with self._lock:
+            return {
+                "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in self._counters.items()],
+                "spans": {name: {"count": h["count"], "sum_seconds": h["sum"], "errors": h["errors"],
+                                 "buckets": dict(zip(map(str, self.buckets), h["buckets"]))}
+                          for name, h in self._histograms.items()},
+                "gauges": gauges,
+            }
+
+    def prometheus(self):
+        """Counters, span histograms and gauges in the Prometheus text exposition format."""
+        gauges = self.gauges()
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((name, dict(h, buckets=list(h["buckets"]))) for name, h in self._histograms.items())
+        lines, typed = [], set()
+        for (name, labels), value in counters:
+            metric = METRICS_PREFIX + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_labels(labels)} {value}")
+        for name, labels, value in gauges:
+            metric = METRICS_PREFIX + name
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} gauge")
+                typed.add(metric)
+            lines.append(f"{metric}{_labels(labels)} {value}")
+        if histograms:
+            metric = METRICS_PREFIX + "span_duration_seconds"
+            lines.append(f"# HELP {metric} Duration of instrumented operations.")
+            lines.append(f"# TYPE {metric} histogram")
+            for name, h in histograms:
+                for bound, count in zip(self.buckets, h["buckets"]):
+                    lines.append(f"{metric}_bucket{_labels((('span', name), ('le', f'{bound:g}')))} {count}")
+                lines.append(f"{metric}_bucket{_labels((('span', name), ('le', '+Inf')))} {h['count']}")
+                lines.append(f"{metric}_sum{_labels((('span', name),))} {h['sum']:.6f}")
+                lines.append(f"{metric}_count{_labels((('span', name),))} {h['count']}")
+            metric = METRICS_PREFIX + "span_errors_total"
+            lines.append(f"# TYPE {metric} counter")
+            for name, h in histograms:
+                lines.append(f"{metric}{_labels((('span', name),))} {h['errors']}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+metrics = Metrics()
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def use_trace(trace):
+    """Make ``trace`` the current trace (for this thread / context) inside the block."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def span(name, **attributes):
+    """Time a block: ``with telemetry.span("geocode", lat=lat) as s: ...; s.set(cached=True)``.
+
+    Always feeds the process-wide histograms; also recorded on the current trace, if any.
+    """
+    return Span(name, attributes, current_trace())
+
+
+def count(name, value=1, **labels):
+    """Add to a counter, e.g. ``count("cache_requests_total", cache="geocode", result="hit")``."""
+    key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+    metrics.inc(key, value)
+    trace = current_trace()
+    if trace is not None:
+        trace.add_count(key, value)
+
+
+def cache_lookup(cache, hit):
+    count("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def export(trace, trace_dir=None, metrics_path=None):
+    """Write the trace JSON and/or the Prometheus metrics file, where configured."""
+    trace_dir = trace_dir or TRACE_DIR
+    metrics_path = metrics_path or METRICS_PATH
+    try:
+        if trace_dir:
+            _write_atomic(os.path.join(trace_dir, f"{trace.trace_id}.json"), trace.to_json(indent=2))
+        if metrics_path:
+            _write_atomic(metrics_path, metrics.prometheus())
+    except OSError:
+        # Telemetry must never fail an analysis
+        pass
@@ -0,0 +1,8 @@
+# waterseeker-agent/tests/conftest.py
+import os
+import sys
+import tempfile
+
+# The modules live at the repository root; caches go to a scratch directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("WATERSEEKER_CACHE_DIR", tempfile.mkdtemp(prefix="waterseeker-tests-"))
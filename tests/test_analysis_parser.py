@@ -0,0 +1,104 @@
+# waterseeker-agent/tests/test_analysis_parser.py
+import pytest
+import json
+from analysis_parser import AnalysisJSONParser, AnalysisParser, parse_analysis
+from results import LocationRecord, format_number
+
+LOCATIONS = [(35.7, -78.4), (-15.8, -47.9), (51.5, -0.1)]
+
+
+def _record(location_id, rainfall, capacity):
+    lat, lon = LOCATIONS[location_id - 1]
+    return LocationRecord(location_id, lat, lon, rainfall, capacity, True, "Unknown", "Unknown", "")
+
+
+@pytest.mark.parametrize("value, text", [(1e6, "1000000"), (1234567.89, "1234567.9"), (40.0, "40"), (2.5, "2.5"), (0, "0")])
+def test_format_number_is_fixed_point(value, text):
+    assert format_number(value) == text
+
+
+def test_record_lines_round_trip():
+    # Large values (e.g. DEM capacities) must survive being written as text and parsed back
+    records = [_record(1, 1951.0, 486.7), _record(2, 2202.0, 1234567.9), _record(3, 0.0, 2500000.0)]
+    text = "Here is the analysis:\n" + "\n".join(record.line() for record in records)
+    assert parse_analysis(text, LOCATIONS) == records
+
+
+def test_fed_one_character_at_a_time():
+    text = "\n".join(_record(i + 1, 100.0 * (i + 1), i + 1.5).line() for i in range(3))
+    parser = AnalysisParser(LOCATIONS)
+    completed = []
+    for character in text:
+        completed.extend(parser.feed(character))
+    # A row is reported once its line ends; the last one at close
+    assert [record.location_id for record in completed] == [1, 2]
+    completed.extend(parser.close())
+    assert [record.capacity for record in completed] == [1.5, 2.5, 3.5]
+
+
+def test_sub_bullet_format():
+    text = ("- Location 1 (lat: 35.7, lon: -78.4):\n"
+            "  - Rainfall: 1200mm/year\n"
+            "  - Capacity: 5M liters\n"
+            "- Location 2 (lat: -15.8, lon: -47.9):\n"
+            "  - Rainfall: 800mm/year\n"
+            "  - Capacity: 3M liters\n")
+    records = parse_analysis(text, LOCATIONS)
+    assert [(r.rainfall, r.capacity, r.found) for r in records] == [(1200, 5, True), (800, 3, True), (0, 0, False)]
+
+
+def test_unknown_ids_mismatched_coordinates_and_repeats_ignored():
+    text = ("- Location 4 (lat: 1.0, lon: 2.0): Rainfall: 1mm/year, Capacity: 1M liters\n"
+            "- Location 1 (lat: 10.0, lon: 10.0): Rainfall: 2mm/year, Capacity: 2M liters\n"
+            "- Location 2 (lat: -15.8, lon: -47.9): Rainfall: 3mm/year, Capacity: 3M liters\n"
+            "- Location 2 (lat: -15.8, lon: -47.9): Rainfall: 4mm/year, Capacity: 4M liters\n")
+    parser = AnalysisParser(LOCATIONS)
+    parser.feed(text)
+    parser.close()
+    assert parser.missing_ids() == [1, 3]
+    assert parser.records()[1].rainfall == 3
+
+
+@pytest.mark.parametrize("text", ["- Location 1 (lat: 35.7, lon: -78.4): Rainfall: unknown, Capacity: 5M liters\n",
+                                  "- Location 1 (lat: 35.7, lon: -78.4): Capacity: 5M liters\n",
+                                  "- Location 1 (lat: 35.7, lon: -78.4):\n  - Rainfall: n/a\n  - Capacity: 5M liters\n"])
+def test_unreadable_or_absent_field_leaves_location_missing(text):
+    parser = AnalysisParser(LOCATIONS)
+    parser.feed(text)
+    parser.close()
+    assert parser.missing_ids() == [1, 2, 3]
+
+
+def _json_items(records):
+    return [{"location": r.location_id, "rainfall_mm_per_year": r.rainfall, "capacity_m_liters": r.capacity} for r in records]
+
+
+def _parse_json(text, chunk=None):
+    parser = AnalysisJSONParser(LOCATIONS)
+    chunk = chunk or len(text)
+    for start in range(0, len(text), chunk):
+        parser.feed(text[start:start + chunk])
+    parser.close()
+    return parser
+
+
+@pytest.mark.parametrize("wrap", [lambda items: items,
+                                  lambda items: {"locations": items},
+                                  lambda items: {"analysis": {"results": items}},
+                                  lambda items: [{"analysis": item} for item in items]])
+@pytest.mark.parametrize("chunk", [None, 1, 7])
+def test_json_round_trip_and_wrappers(wrap, chunk):
+    records = [_record(1, 1951.0, 486.7), _record(2, 2202.0, 1234567.9), _record(3, 0.0, 2500000.0)]
+    text = "```json\n" + json.dumps(wrap(_json_items(records))) + "\n```"
+    parser = _parse_json(text, chunk)
+    assert parser.missing_ids() == []
+    assert parser.records() == records
+
+
+def test_json_invalid_items_stay_missing():
+    items = _json_items([_record(1, 10.0, 1.0), _record(2, 20.0, 2.0), _record(3, 30.0, 3.0)])
+    items[1]["capacity_m_liters"] = "lots"
+    del items[2]["rainfall_mm_per_year"]
+    parser = _parse_json(json.dumps({"locations": items}) + ' {"location": 9, oops')
+    assert parser.missing_ids() == [2, 3]
+    assert parser.records()[0].rainfall == 10
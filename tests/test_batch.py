@@ -0,0 +1,83 @@
+# waterseeker-agent/tests/test_batch.py
+import json
+
+import pytest
+
+import batch
+from batch import read_sites, run_batch
+
+
+@pytest.fixture
+def sites(tmp_path):
+    path = tmp_path / "sites.csv"
+    path.write_text("id,Latitude,Longitude\n" + "".join(f"s{i},{35 + i / 10},{-78 - i / 10}\n" for i in range(7)),
+                    encoding="utf-8")
+    return str(path)
+
+
+class FakeScreen:
+    # Screens chunks without the LLM; chunk indices in fail_once fail on their first attempt
+    def __init__(self, fail_once=()):
+        self.fail_once = set(fail_once)
+        self.calls = []
+
+    def __call__(self, chunk_index, chunk, output_mode, enrich):
+        self.calls.append(chunk_index)
+        if chunk_index in self.fail_once:
+            self.fail_once.discard(chunk_index)
+            raise Exception("API call failed: 500")
+        return [{"chunk": chunk_index, "row": row, "id": site_id, "lat": lat, "lon": lon}
+                for row, site_id, lat, lon in chunk]
+
+
+def _rows(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_read_sites_column_aliases(sites, tmp_path):
+    assert list(read_sites(sites))[1] == (1, "s1", 35.1, -78.1)
+    bad = tmp_path / "bad.csv"
+    bad.write_text("x,y\n1,2\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(read_sites(str(bad)))
+
+
+def test_failed_chunk_is_retried_on_resume(sites, tmp_path, monkeypatch):
+    output = str(tmp_path / "out.jsonl")
+    screen = FakeScreen(fail_once={1})
+    monkeypatch.setattr(batch, "screen_chunk", screen)
+
+    summary = run_batch(sites, output, batch_size=3, concurrency=2, log=lambda line: None)
+    assert summary["sites"] == 4 and summary["failed_chunks"] == 1
+    assert sorted(row["row"] for row in _rows(output)) == [0, 1, 2, 6]
+
+    summary = run_batch(sites, output, batch_size=3, concurrency=2, log=lambda line: None)
+    # Only the failed chunk runs again
+    assert summary["sites"] == 3 and summary["failed_chunks"] == 0
+    assert sorted(screen.calls) == [0, 1, 1, 2]
+    assert sorted(row["row"] for row in _rows(output)) == list(range(7))
+
+
+def test_rows_of_unfinished_chunks_are_dropped(sites, tmp_path, monkeypatch):
+    output = str(tmp_path / "out.jsonl")
+    monkeypatch.setattr(batch, "screen_chunk", FakeScreen())
+    run_batch(sites, output, batch_size=3, log=lambda line: None)
+    # An interrupted run wrote chunk 1 but never checkpointed it
+    checkpoint = output + ".checkpoint.json"
+    with open(checkpoint, encoding="utf-8") as f:
+        saved = json.load(f)
+    with open(checkpoint, "w", encoding="utf-8") as f:
+        json.dump(dict(saved, done=[0, 2]), f)
+
+    summary = run_batch(sites, output, batch_size=3, log=lambda line: None)
+    assert summary["sites"] == 3
+    assert sorted(row["row"] for row in _rows(output)) == list(range(7))
+
+
+def test_checkpoint_for_another_batch_size_is_refused(sites, tmp_path, monkeypatch):
+    output = str(tmp_path / "out.jsonl")
+    monkeypatch.setattr(batch, "screen_chunk", FakeScreen())
+    run_batch(sites, output, batch_size=3, log=lambda line: None)
+    with pytest.raises(SystemExit):
+        run_batch(sites, output, batch_size=4, log=lambda line: None)
@@ -0,0 +1,70 @@
+# waterseeker-agent/tests/test_cache.py
+import itertools
+import sqlite3
+import threading
+import time
+import pytest
+import cache
+import geocache
+from cache import SQLiteCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # A strictly increasing clock, so entries never share an access time
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(cache.time, "time", lambda: float(next(ticks)))
+
+
+def test_evicts_the_least_recently_used(tmp_path, clock):
+    c = SQLiteCache(str(tmp_path / "c.sqlite3"), max_entries=3)
+    for key in "abc":
+        c.set(key, key.upper())
+    assert c.get("a") == "A"  # a is now more recent than b and c
+    c.set("d", "D")
+    assert c.get("b") is None
+    assert [c.get(key) for key in "acd"] == ["A", "C", "D"]
+    c.set("e", "E")
+    assert c.get("a") is None and len(c) == 3
+
+
+def test_ttl_counts_from_creation_not_access(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    c = SQLiteCache(str(tmp_path / "c.sqlite3"), ttl=10)
+    c.set("a", {"x": 1})
+    now[0] += 8
+    assert c.get("a") == {"x": 1}
+    now[0] += 8
+    assert c.get("a") is None and len(c) == 0
+
+
+def test_caches_without_access_times_are_upgraded(tmp_path, clock):
+    path = str(tmp_path / "old.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE TABLE cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)")
+        conn.executemany("INSERT INTO cache VALUES (?, ?, ?)", [("old", '"1"', 1.0), ("older", '"2"', 0.5)])
+    c = SQLiteCache(path, max_entries=2)
+    assert c.get("older") == "2"
+    c.set("new", "3")
+    assert c.get("old") is None
+    assert c.get("older") == "2" and c.get("new") == "3"
+
+
+def test_geocode_cache_is_created_once(monkeypatch):
+    created = []
+
+    def slow_cache(*args, **kwargs):
+        # Widen the window between the None check and the assignment
+        time.sleep(0.05)
+        created.append(object())
+        return created[-1]
+    monkeypatch.setattr(geocache, "_geocode_cache", None)
+    monkeypatch.setattr(geocache, "SQLiteCache", slow_cache)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(geocache.get_geocode_cache())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1 and all(result is created[0] for result in results)
@@ -0,0 +1,110 @@
+# waterseeker-agent/tests/test_capacity.py
+import math
+import threading
+import time
+import numpy as np
+import pytest
+import capacity
+from capacity import M_PER_DEGREE, ElevationModel, build_dem, reservoir
+
+CELL = 10.0
+N = 401
+
+
+def _xy(n=N, cell=CELL):
+    y, x = (np.mgrid[0:n, 0:n] - n // 2) * cell
+    return x, y
+
+
+@pytest.mark.parametrize("dam_height", [5.0, 10.0])
+def test_paraboloid_bowl_matches_closed_form(dam_height):
+    x, y = _xy()
+    a = 1e-4
+    estimate = reservoir(a * (x ** 2 + y ** 2), (N // 2, N // 2), dam_height, CELL, CELL)
+    # Volume of a paraboloid of revolution filled to H: pi H^2 / (2a) m3
+    assert estimate.capacity == pytest.approx(math.pi * dam_height ** 2 / (2 * a) / 1000, rel=0.01)
+    assert estimate.area == pytest.approx(math.pi * dam_height / a / 1e6, rel=0.02)
+    assert estimate.water_level == dam_height and not estimate.truncated
+
+
+@pytest.mark.parametrize("dam_height", [5.0, 10.0])
+def test_v_valley_matches_closed_form(dam_height):
+    x, y = _xy()
+    s, k = 0.01, 0.1
+    estimate = reservoir(s * x + k * np.abs(y), (N // 2, N // 2), dam_height, CELL, CELL)
+    # A tilted V valley dammed at x = 0 holds H^3 / (3 s k) m3
+    assert estimate.capacity == pytest.approx(dam_height ** 3 / (3 * s * k) / 1000, rel=0.03)
+    # The dam spans the valley from one side at height H to the other
+    assert estimate.dam_length == pytest.approx(2 * dam_height / k, abs=2 * CELL)
+    assert not estimate.truncated
+
+
+def test_water_spills_over_a_lower_saddle():
+    x, y = _xy(201)
+    s, k = 0.01, 0.1
+    # The V valley, walled off by a 12 m ridge from a parallel valley that joins it downstream
+    z = np.where(y > 150, s * x, np.minimum(s * x + k * np.abs(y), 12.0))
+    joined = (y > 130) & (y <= 150) & (x < -100)
+    z[joined] = s * x[joined]
+    # A notch 4 m up through the ridge, upstream of the dam
+    notch = (y > 0) & (y <= 150) & (x >= 100) & (x < 140)
+    z[notch] = np.maximum(np.minimum(z[notch], 4.0), s * x[notch])
+    estimate = reservoir(z, (100, 100), 10.0, CELL, CELL)
+    assert estimate.water_level == pytest.approx(4.0, abs=0.05)
+    assert estimate.capacity == pytest.approx(4.0 ** 3 / (3 * s * k) / 1000, rel=0.05)
+
+
+def test_no_data_at_the_site():
+    z = np.zeros((5, 5))
+    z[2, 2] = np.nan
+    assert reservoir(z, (2, 2), 10.0, CELL, CELL) is None
+
+
+def _bowl_tile(tmp_path, reservoir_radius, dam_height=10.0, n=481):
+    # A 1 arc-second tile at the equator holding one paraboloid bowl
+    dy = M_PER_DEGREE / 3600
+    y, x = (np.mgrid[0:n, 0:n] - n // 2) * dy
+    a = dam_height / reservoir_radius ** 2
+    np.save(tmp_path / "bowl.npy", (100 + a * (x ** 2 + y ** 2)).astype(np.float32))
+    extent = n / 3600
+    build_dem([str(tmp_path / "bowl.npy")], str(tmp_path), bounds=(-extent / 2, -extent / 2, extent / 2, extent / 2))
+    return ElevationModel(str(tmp_path)), math.pi * dam_height ** 2 / (2 * a) / 1000
+
+
+def test_window_grows_to_fit_the_reservoir(tmp_path):
+    model, exact = _bowl_tile(tmp_path, reservoir_radius=3000.0)
+    estimate = model.estimate(0.0, 0.0, 10.0, radius=1000.0, max_radius=8000.0)
+    assert not estimate.truncated
+    assert estimate.capacity == pytest.approx(exact, rel=0.02)
+    assert (estimate.lat, estimate.lon) == pytest.approx((0.0, 0.0), abs=1 / 3600)
+
+
+def test_reservoir_beyond_the_largest_window_is_a_lower_bound(tmp_path):
+    model, exact = _bowl_tile(tmp_path, reservoir_radius=3000.0)
+    estimate = model.estimate(0.0, 0.0, 10.0, radius=1000.0, max_radius=2000.0)
+    assert estimate.truncated
+    assert 0 < estimate.capacity < exact
+    assert model.estimate(10.0, 10.0) is None  # outside every tile
+
+
+def test_concurrent_first_use_loads_once(tmp_path, monkeypatch):
+    (tmp_path / capacity.INDEX_FILE).touch()
+    loads = []
+
+    class SlowModel:
+        def __init__(self, path):
+            loads.append(path)
+            time.sleep(0.1)
+
+    monkeypatch.setattr(capacity, "DEM_PATH", str(tmp_path))
+    monkeypatch.setattr(capacity, "ElevationModel", SlowModel)
+    monkeypatch.setattr(capacity, "_model", None)
+    monkeypatch.setattr(capacity, "_model_loaded", False)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(capacity.get_elevation_model())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert len(results) == 8 and all(isinstance(model, SlowModel) for model in results)
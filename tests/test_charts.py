@@ -0,0 +1,64 @@
+# waterseeker-agent/tests/test_charts.py
+import os
+import subprocess
+import sys
+
+import pytest
+
+import charts
+from charts import ChartCache, bar_chart
+
+LABELS = ["Location 1", "Location 2", "Location 3"]
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    # Counts real renders behind the cache
+    calls = []
+    render = charts._render_svg
+
+    def counting(*args):
+        calls.append(args)
+        return render(*args)
+    monkeypatch.setattr(charts, "_render_svg", counting)
+    return calls
+
+
+def test_same_input_is_rendered_once(renders):
+    cache = ChartCache()
+    first = bar_chart(LABELS, [10, 20, 5], 1, "Capacity (M liters)", "Capacity", backend="svg", cache=cache)
+    assert bar_chart(LABELS, [10.0, 20.0, 5.0], 1, "Capacity (M liters)", "Capacity", backend="svg", cache=cache) is first
+    # Anything that changes the image is part of the key
+    bar_chart(LABELS, [10, 20, 5], 0, "Capacity (M liters)", "Capacity", backend="svg", cache=cache)
+    bar_chart(LABELS, [10, 20, 6], 1, "Capacity (M liters)", "Capacity", backend="svg", cache=cache)
+    assert len(renders) == 3
+    assert cache.stats() == {"hits": 1, "misses": 3, "entries": 3}
+
+
+def test_cache_is_lru(renders):
+    cache = ChartCache(max_entries=2)
+    for values in ([1], [2], [1], [3], [1], [2]):
+        bar_chart(["Location 1"], values, 0, "y", "t", backend="svg", cache=cache)
+    # [2] was the least recently used when [3] came in
+    assert [args[1] for args in renders] == [[1.0], [2.0], [3.0], [2.0]]
+
+
+def test_svg_highlights_the_recommended_bar():
+    svg = bar_chart(LABELS, [10, 20, 5], 1, "Rainfall (mm/year)", "Rain & capacity", "{:.0f}", backend="svg", cache=ChartCache())
+    bars = [part for part in svg.split("<rect ") if 'fill="green"' in part or 'fill="blue"' in part]
+    assert ['fill="green"' in bar for bar in bars] == [False, True, False]
+    assert "Rain &amp; capacity" in svg and ">20<" in svg
+
+
+def test_matplotlib_backend_renders_png():
+    pytest.importorskip("matplotlib")
+    image = bar_chart(LABELS, [10, 20, 5], 1, "Capacity", "Capacity", backend="matplotlib", cache=ChartCache())
+    assert image.startswith(b"\x89PNG")
+
+
+def test_svg_backend_never_imports_matplotlib():
+    code = ("import sys, charts; charts.bar_chart(['a'], [1], 0, 'y', 't', backend='svg'); "
+            "print('matplotlib' in sys.modules)")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "False"
@@ -0,0 +1,95 @@
+# waterseeker-agent/tests/test_climatology.py
+import math
+import threading
+import time
+import numpy as np
+import pytest
+import climatology
+from climatology import Climatology, build_climatology
+
+
+def _climatology(tmp_path, grid, bounds):
+    np.save(tmp_path / "grid.npy", np.asarray(grid, dtype=np.float32))
+    build_climatology([str(tmp_path / "grid.npy")], str(tmp_path), bounds=bounds)
+    return Climatology(str(tmp_path))
+
+
+def test_bilinear_between_cell_centres(tmp_path):
+    # 1-degree cells over 0..2 N, 0..2 E; centres at 0.5 and 1.5
+    c = _climatology(tmp_path, [[0, 0], [0, 4]], (0, 0, 2, 2))
+    assert c.lookup(1.0, 1.0)[0] == pytest.approx(1.0)  # midway between the four centres
+    assert c.lookup(0.75, 1.25)[0] == pytest.approx(4 * 0.75 * 0.75)
+    assert c.lookup(0.5, 1.5)[0] == pytest.approx(4.0)  # on a centre
+    assert c.lookup(1.9, 0.1)[0] == pytest.approx(0.0)  # past the outer centres: nearest edge values
+
+
+def test_reproduces_a_linear_field(tmp_path):
+    rows, cols = np.mgrid[0:5, 0:8]
+    c = _climatology(tmp_path, 100 + 10 * rows + cols, (10, 20, 15, 28))
+    rng = np.random.default_rng(0)
+    # Stay between the outermost cell centres, where interpolation is exact for a linear field
+    lat, lon = rng.uniform(10.5, 14.5, 200), rng.uniform(20.5, 27.5, 200)
+    expected = 100 + 10 * (15 - lat - 0.5) + (lon - 20 - 0.5)
+    np.testing.assert_allclose(c.lookup(lat, lon), expected, rtol=1e-6)
+    # A scalar latitude broadcasts against an array of longitudes
+    np.testing.assert_allclose(c.lookup(12.0, lon[:5]), 100 + 10 * 2.5 + (lon[:5] - 20.5), rtol=1e-6)
+
+
+def test_cells_without_data_and_points_off_the_grid(tmp_path):
+    c = _climatology(tmp_path, [[np.nan, 2], [4, 6]], (0, 0, 2, 2))
+    # The NaN cell is left out of the weights
+    assert c.lookup(1.0, 1.0)[0] == pytest.approx((2 + 4 + 6) / 3)
+    assert math.isnan(c.lookup(1.5, 0.5)[0])
+    assert c.point(1.5, 0.5) is None
+    assert np.isnan(c.lookup([2.5, 1.0, -0.1], [1.0, 3.0, 1.0])).all()
+
+
+def test_global_grid_wraps_around_the_antimeridian(tmp_path):
+    c = _climatology(tmp_path, [[0, 1, 2, 3], [0, 1, 2, 3]], (-90, -180, 90, 180))
+    assert c.wraps
+    np.testing.assert_allclose(c.lookup([0.0, 0.0, 0.0], [-180.0, 180.0, 540.0]), [1.5, 1.5, 1.5])
+    assert c.point(0.0, 190.0) == pytest.approx(c.point(0.0, -170.0))
+
+
+def test_ascii_grid_matches_the_array_build(tmp_path):
+    asc = tmp_path / "rain.asc"
+    asc.write_text("ncols 3\nnrows 2\nxllcenter 10.5\nyllcenter 40.5\ncellsize 1\nNODATA_value -9999\n"
+                   "100 200 -9999\n300 400 500\n")
+    out = tmp_path / "climatology"
+    assert build_climatology([str(asc)], str(out)) == (2, 3)
+    c = Climatology(str(out))
+    assert (c.west, c.north, c.resolution) == (10.0, 42.0, 1.0)
+    assert c.point(41.5, 10.5) == pytest.approx(100)
+    assert c.point(41.0, 11.0) == pytest.approx((100 + 200 + 300 + 400) / 4)
+    assert c.point(41.5, 12.5) is None
+
+
+def test_monthly_rasters_are_summed(tmp_path):
+    for month in range(12):
+        np.save(tmp_path / f"prec_{month}.npy", np.full((2, 2), month + 1, dtype=np.float32))
+    paths = [str(tmp_path / f"prec_{month}.npy") for month in range(12)]
+    build_climatology(paths, str(tmp_path / "out"), bounds=(0, 0, 2, 2))
+    assert Climatology(str(tmp_path / "out")).point(1.0, 1.0) == pytest.approx(78)
+
+
+def test_concurrent_first_use_loads_once(tmp_path, monkeypatch):
+    (tmp_path / climatology.META_FILE).touch()
+    loads = []
+
+    class SlowClimatology:
+        def __init__(self, path):
+            loads.append(path)
+            time.sleep(0.1)
+
+    monkeypatch.setattr(climatology, "CLIMATOLOGY_PATH", str(tmp_path))
+    monkeypatch.setattr(climatology, "Climatology", SlowClimatology)
+    monkeypatch.setattr(climatology, "_climatology", None)
+    monkeypatch.setattr(climatology, "_climatology_loaded", False)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(climatology.get_climatology())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert len(results) == 8 and all(isinstance(c, SlowClimatology) for c in results)
@@ -0,0 +1,121 @@
+# waterseeker-agent/tests/test_event_loop.py
+import asyncio
+import threading
+
+import pytest
+
+import telemetry
+import waterseeker
+from event_loop import get_background_loop
+from telemetry import Trace
+
+LOCATIONS = [(35.7, -78.4), (-15.8, -47.9)]
+ANSWER = ("- Location 1 (lat: 35.7, lon: -78.4): Rainfall: 1000mm/year, Capacity: 10M liters\n"
+          "- Location 2 (lat: -15.8, lon: -47.9): Rainfall: 2000mm/year, Capacity: 20M liters")
+
+
+def test_run_returns_the_result_and_raises_its_errors():
+    loop = get_background_loop()
+
+    async def double(value):
+        await asyncio.sleep(0)
+        return value * 2
+
+    async def failing():
+        raise Exception("down")
+    assert loop.run(lambda emit: double(21)) == 42
+    with pytest.raises(Exception, match="down"):
+        loop.run(lambda emit: failing())
+
+
+def test_events_are_delivered_on_the_calling_thread_in_order():
+    events = []
+
+    async def produce(emit):
+        for i in range(5):
+            emit(i, threading.current_thread().name)
+            await asyncio.sleep(0)
+        return "done"
+    caller = threading.current_thread()
+    assert get_background_loop().run(produce, lambda i, producer: events.append((i, threading.current_thread()))) == "done"
+    assert events == [(i, caller) for i in range(5)]
+
+
+def test_context_variables_follow_the_coroutine():
+    trace = Trace()
+
+    async def work():
+        with telemetry.span("on_loop"):
+            pass
+    with telemetry.use_trace(trace):
+        get_background_loop().run(lambda emit: work())
+    assert [span.name for span in trace.spans] == ["on_loop"]
+
+
+def test_blocking_from_the_loop_thread_is_refused():
+    loop = get_background_loop()
+
+    async def nested():
+        coro = asyncio.sleep(0)
+        try:
+            loop.submit(coro)
+        finally:
+            coro.close()
+    with pytest.raises(Exception, match="own thread"):
+        loop.run(lambda emit: nested())
+
+
+def test_iterate_and_early_close():
+    finished = threading.Event()
+
+    async def numbers():
+        try:
+            for i in range(100):
+                yield i
+                await asyncio.sleep(0.01)
+        finally:
+            finished.set()
+    items = get_background_loop().iterate(numbers())
+    assert [next(items) for _ in range(3)] == [0, 1, 2]
+    items.close()
+    # Closing the sync side cancels the async generator on the loop
+    assert finished.wait(5)
+
+
+@pytest.fixture
+def offline(monkeypatch):
+    monkeypatch.setattr(waterseeker, "_local_facts", lambda locations: {"rainfall": None, "capacity": None})
+
+    async def location_info(lat, lon, log):
+        log.append(f"📍 Looked up {lat}, {lon}")
+        return "Country", "City", "Water"
+
+    async def call(prompt_text):
+        return ANSWER
+
+    async def stream(prompt_text):
+        for line in ANSWER.splitlines(keepends=True):
+            await asyncio.sleep(0)
+            yield line
+    monkeypatch.setattr(waterseeker, "get_location_info_async", location_info)
+    monkeypatch.setattr(waterseeker, "cached_call_watsonx_async", call)
+    monkeypatch.setattr(waterseeker, "cached_stream_watsonx_async", stream)
+
+
+def test_sync_agent_streams_rows_to_the_calling_thread(offline):
+    rows = []
+    caller = threading.current_thread()
+    result = waterseeker.run_waterseeker_agent(
+        LOCATIONS, on_location=lambda loc_id, line: rows.append((loc_id, threading.current_thread() is caller)))
+    assert rows == [(1, True), (2, True)]
+    assert result.recommended_index == 1
+    analysis, recommendation, coords, agent_log, water_resources = result
+    assert coords == LOCATIONS and water_resources == ["Water", "Water"]
+    assert "📍 Looked up 35.7, -78.4" in agent_log
+
+
+def test_sync_wrappers(offline):
+    log = []
+    _, records = waterseeker.analyze_locations(LOCATIONS, agent_log=log)
+    assert [record.capacity for record in records] == [10, 20]
+    assert waterseeker.get_location_info(35.7, -78.4, log) == ("Country", "City", "Water")
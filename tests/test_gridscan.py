@@ -0,0 +1,75 @@
+# waterseeker-agent/tests/test_gridscan.py
+import numpy as np
+import pytest
+
+import gridscan
+from geo import haversine_km
+from gridscan import interpolate, make_grid, nearest_distance_km, scan_region
+
+BBOX = (34.0, -80.0, 35.0, -79.0)
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    # Blocks that don't divide the grid or the point set evenly
+    monkeypatch.setattr(gridscan, "DISTANCE_CHUNK", 7)
+    monkeypatch.setattr(gridscan, "POINT_CHUNK", 3)
+
+
+def _points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(33.5, 35.5, n), rng.uniform(-80.5, -78.5, n)
+
+
+def test_make_grid_cell_centers():
+    lat, lon = make_grid(*BBOX, 0.25)
+    assert lat.size == lon.size == 16
+    assert (lat[0], lon[0]) == (34.125, -79.875)
+    with pytest.raises(Exception):
+        make_grid(35.0, -80.0, 34.0, -79.0, 0.25)
+
+
+def test_nearest_distance_matches_brute_force(small_blocks):
+    lat, lon = make_grid(*BBOX, 0.1)
+    points_lat, points_lon = _points(10)
+    expected = haversine_km(lat[:, None], lon[:, None], points_lat[None, :], points_lon[None, :]).min(axis=1)
+    np.testing.assert_allclose(nearest_distance_km(lat, lon, points_lat, points_lon), expected)
+    assert np.isinf(nearest_distance_km(lat, lon, [], [])).all()
+
+
+def test_interpolate_matches_brute_force(small_blocks):
+    lat, lon = make_grid(*BBOX, 0.1)
+    points_lat, points_lon = _points(10, seed=1)
+    values = np.arange(10, dtype=np.float64) * 100
+    weights = np.maximum(haversine_km(lat[:, None], lon[:, None], points_lat[None, :], points_lon[None, :]), 1e-3) ** -2
+    np.testing.assert_allclose(interpolate(lat, lon, points_lat, points_lon, values), weights @ values / weights.sum(axis=1))
+
+
+def test_interpolate_at_observations_and_without_any(small_blocks):
+    lat, lon = make_grid(*BBOX, 0.25)
+    # A cell on top of an observation takes its value; a constant field stays constant
+    result = interpolate(lat, lon, [lat[5], 34.9], [lon[5], -79.1], [1000.0, 0.0])
+    assert result[5] == pytest.approx(1000.0, rel=1e-6)
+    np.testing.assert_allclose(interpolate(lat, lon, *_points(4), [500.0] * 4), 500.0)
+    assert not interpolate(lat, lon, [], [], []).any()
+
+
+def test_scan_region_picks_are_separated_and_ranked(small_blocks):
+    # Wettest in the north-east corner, stations in the south-west
+    rainfall_obs = (np.array([35.0, 34.0]), np.array([-79.0, -80.0]), np.array([2000.0, 500.0]))
+    stations = (np.array([34.05]), np.array([-79.95]))
+    candidates = scan_region(BBOX, 0.05, k=3, rainfall_obs=rainfall_obs, stations=stations, min_separation_km=20.0)
+    assert len(candidates) == 3
+    scores = [c["score"] for c in candidates]
+    assert scores == sorted(scores, reverse=True)
+    assert candidates[0]["lat"] > 34.9 and candidates[0]["lon"] > -79.1
+    for i, a in enumerate(candidates):
+        for b in candidates[i + 1:]:
+            assert haversine_km(a["lat"], a["lon"], b["lat"], b["lon"]) >= 20.0
+
+
+def test_scan_region_without_rainfall_scores_station_distance(monkeypatch):
+    monkeypatch.setattr(gridscan, "climatology_rainfall", lambda lat, lon: None)
+    candidates = scan_region(BBOX, 0.1, k=1, stations=(np.array([34.45]), np.array([-79.55])))
+    assert (candidates[0]["lat"], candidates[0]["lon"]) == (34.45, -79.55)
+    assert candidates[0]["rainfall"] == 0.0
@@ -0,0 +1,111 @@
+# waterseeker-agent/tests/test_http_client.py
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from async_http import AsyncHttpClient
+from http_client import HttpClient
+from telemetry import Metrics
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Answers every request with the server's status (or stalls), counting requests per method
+    def _answer(self):
+        self.server.requests[self.command] += 1
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        if self.server.stall:
+            time.sleep(self.server.stall)
+        try:
+            self.send_response(self.server.status)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up waiting (the read timeout tests)
+            pass
+
+    do_GET = do_POST = _answer
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.requests = {"GET": 0, "POST": 0}
+    httpd.status, httpd.stall = 200, 0
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/"
+    yield httpd
+    httpd.shutdown()
+
+
+@pytest.mark.parametrize("status, get_requests, post_requests", [(500, 3, 1), (503, 3, 3), (429, 3, 3)])
+def test_post_only_retried_when_rejected(server, status, get_requests, post_requests):
+    client = HttpClient(retries=2, backoff_factor=0)
+    server.status = status
+    assert client.get(server.url).status_code == status
+    assert client.post(server.url, json={}).status_code == status
+    assert server.requests == {"GET": get_requests, "POST": post_requests}
+
+
+def test_post_not_resent_after_read_timeout(server):
+    client = HttpClient(retries=2, backoff_factor=0)
+    server.stall = 0.5
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client.post(server.url, json={}, timeout=(1, 0.1))
+    assert server.requests["POST"] == 1
+
+
+def test_idempotent_post_retried(server):
+    client = HttpClient(retries=2, backoff_factor=0)
+    server.status = 500
+    client.post(server.url, data="x", idempotent=True)
+    assert server.requests["POST"] == 3
+
+
+@pytest.mark.parametrize("status, get_requests, post_requests", [(500, 3, 1), (503, 3, 3)])
+def test_async_post_only_retried_when_rejected(server, status, get_requests, post_requests):
+    async def run():
+        client = AsyncHttpClient(retries=2, backoff_factor=0)
+        try:
+            await client.get(server.url)
+            await client.post(server.url, json={})
+        finally:
+            await client.aclose()
+    server.status = status
+    asyncio.run(run())
+    assert server.requests == {"GET": get_requests, "POST": post_requests}
+
+
+def test_async_post_not_resent_after_read_timeout(server):
+    async def run():
+        client = AsyncHttpClient(retries=2, backoff_factor=0)
+        try:
+            await client.post(server.url, json={}, timeout=0.1)
+        finally:
+            await client.aclose()
+    server.stall = 0.5
+    with pytest.raises(Exception):
+        asyncio.run(run())
+    assert server.requests["POST"] == 1
+
+
+def test_stats_exported_as_gauges(server):
+    client = HttpClient(retries=2, backoff_factor=0)
+    metrics = Metrics()
+    metrics.register_gauges("http_host", lambda: client.stats()["hosts"], label="host")
+    metrics.register_gauges("http_pool", lambda: client.stats()["pools"], label="pool")
+    server.status = 503
+    client.get(server.url)
+    host = server.url.split("/")[2]
+    text = metrics.prometheus()
+    assert "# TYPE waterseeker_http_host_requests gauge" in text
+    assert f'waterseeker_http_host_requests{{host="{host}"}} 1' in text
+    assert f'waterseeker_http_host_retries{{host="{host}"}} 2' in text
+    assert f'waterseeker_http_pool_requests{{pool="http://{host}"}} 3' in text
@@ -0,0 +1,138 @@
+# waterseeker-agent/tests/test_iam.py
+import asyncio
+import threading
+
+import pytest
+
+import async_http
+import iam
+import waterseeker
+from iam import IAMTokenManager
+
+
+class FakeIAM:
+    # Hands out t1, t2, ... from either the sync or the async request function
+    def __init__(self, monkeypatch, block=None):
+        self.requests = []
+        self.entered = threading.Event()
+        self.block = block
+        monkeypatch.setattr(iam, "request_iam_token", self.request)
+        monkeypatch.setattr(iam, "request_iam_token_async", self.request_async)
+
+    def _issue(self, kind):
+        self.requests.append(kind)
+        return {"access_token": f"t{len(self.requests)}", "expires_in": 3600}
+
+    def request(self, api_key):
+        self.entered.set()
+        if self.block is not None:
+            self.block.wait(5)
+        return self._issue("sync")
+
+    async def request_async(self, api_key):
+        self.entered.set()
+        await asyncio.sleep(0.1)
+        return self._issue("async")
+
+
+@pytest.fixture
+def manager():
+    manager = IAMTokenManager(lambda: "key")
+    yield manager
+    manager.clear()
+
+
+def test_async_caller_joins_sync_refresh_without_blocking_the_loop(monkeypatch, manager):
+    release = threading.Event()
+    fake = FakeIAM(monkeypatch, block=release)
+    results = []
+    leader = threading.Thread(target=lambda: results.append(manager.get_token()))
+    leader.start()
+    assert fake.entered.wait(5)
+
+    async def main():
+        waiter = asyncio.create_task(manager.get_token_async())
+        ticks = 0
+        for _ in range(5):
+            await asyncio.sleep(0.01)
+            ticks += 1
+        # The loop kept running while the sync refresh was in flight
+        assert ticks == 5 and not waiter.done()
+        release.set()
+        return await waiter
+
+    token = asyncio.run(main())
+    leader.join(5)
+    assert token == results[0] == "t1"
+    assert fake.requests == ["sync"]
+
+
+def test_sync_caller_joins_async_refresh(monkeypatch, manager):
+    fake = FakeIAM(monkeypatch)
+
+    async def main():
+        return await asyncio.gather(manager.get_token_async(), asyncio.to_thread(manager.get_token))
+
+    assert asyncio.run(main()) == ["t1", "t1"]
+    assert fake.requests == ["async"]
+
+
+def test_invalidate_refreshes_once_per_stale_token(monkeypatch, manager):
+    fake = FakeIAM(monkeypatch)
+    stale = manager.get_token()
+
+    async def main():
+        return await asyncio.gather(manager.invalidate_async(stale), asyncio.to_thread(manager.invalidate, stale))
+
+    assert asyncio.run(main()) == ["t2", "t2"]
+    # A caller still holding the old token gets the new one without another request
+    assert manager.invalidate(stale) == "t2"
+    assert fake.requests == ["sync", "async"]
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = ""
+
+    def json(self):
+        return {"results": [{"generated_text": "ok"}]}
+
+    def close(self):
+        pass
+
+
+def _watsonx_server(tokens):
+    # Rejects t1 as revoked, accepts any other token
+    def respond(headers):
+        token = headers["Authorization"].removeprefix("Bearer ")
+        tokens.append(token)
+        return FakeResponse(401 if token == "t1" else 200)
+    return respond
+
+
+def test_sync_call_retries_once_after_401(monkeypatch, manager):
+    FakeIAM(monkeypatch)
+    monkeypatch.setattr(waterseeker, "token_manager", manager)
+    tokens = []
+    respond = _watsonx_server(tokens)
+    monkeypatch.setattr(waterseeker, "_post_watsonx", lambda url, payload, token, **kwargs: respond(waterseeker._watsonx_headers(token)))
+
+    assert waterseeker._request_watsonx(waterseeker.BASE_URL, "prompt").status_code == 200
+    assert tokens == ["t1", "t2"]
+
+
+def test_async_call_retries_once_after_401(monkeypatch, manager):
+    FakeIAM(monkeypatch)
+    monkeypatch.setattr(waterseeker, "token_manager", manager)
+    tokens = []
+    respond = _watsonx_server(tokens)
+
+    class FakeClient:
+        async def post(self, url, json, headers, timeout):
+            return respond(headers)
+
+    monkeypatch.setattr(async_http, "get_async_http_client", lambda: FakeClient())
+
+    assert asyncio.run(waterseeker._call_watsonx_async("prompt")) == "ok"
+    assert tokens == ["t1", "t2"]
@@ -0,0 +1,73 @@
+# waterseeker-agent/tests/test_llm_cache.py
+import pytest
+
+import telemetry
+from llm_cache import LLMResponseCache, cache_key, templates_fingerprint
+from telemetry import Metrics
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "llm.sqlite3")
+
+
+def test_memory_then_disk_tier(path):
+    cache = LLMResponseCache(path)
+    assert cache.get("a") is None
+    cache.set("a", "text", latency=2.0)
+    assert cache.get("a") == "text"
+    # A new process starts with an empty memory tier and reads through the disk
+    reopened = LLMResponseCache(path)
+    assert reopened.get("a") == "text"
+    assert reopened.get("a") == "text"
+    assert (reopened.memory_hits, reopened.disk_hits, reopened.misses) == (1, 1, 0)
+    assert cache.stats()["hit_ratio"] == 0.5
+    assert reopened.stats()["saved_seconds"] == 4.0
+
+
+def test_memory_tier_is_lru(path):
+    cache = LLMResponseCache(path, memory_entries=2)
+    for key in "abc":
+        cache.set(key, key, latency=1.0)
+    assert cache.stats()["memory_entries"] == 2
+    # "a" was evicted from memory but is still on disk
+    assert cache.get("a") == "a"
+    assert (cache.memory_hits, cache.disk_hits) == (0, 1)
+
+
+def test_changed_templates_clear_the_disk_tier(path):
+    old = templates_fingerprint("Analyze {locations}")
+    new = templates_fingerprint("Analyze these {locations}")
+    key = cache_key("model", {"decoding_method": "greedy"}, "prompt")
+    LLMResponseCache(path, fingerprint=old).set(key, "old answer", latency=1.0)
+    assert LLMResponseCache(path, fingerprint=old).get(key) == "old answer"
+    assert LLMResponseCache(path, fingerprint=new).get(key) is None
+    # The new fingerprint is stored: entries written under it survive a restart
+    LLMResponseCache(path, fingerprint=new).set(key, "new answer", latency=1.0)
+    assert LLMResponseCache(path, fingerprint=new).get(key) == "new answer"
+
+
+def test_invalidate_clears_both_tiers(path):
+    cache = LLMResponseCache(path)
+    cache.set("a", "text", latency=1.0)
+    cache.invalidate()
+    assert cache.get("a") is None
+    assert LLMResponseCache(path).get("a") is None
+
+
+def test_stats_exported_as_gauges(path):
+    cache = LLMResponseCache(path)
+    metrics = Metrics()
+    metrics.register_gauges("llm_cache", cache.stats)
+    cache.set("a", "text", latency=1.5)
+    cache.get("a")
+    cache.get("b")
+    text = metrics.prometheus()
+    assert "# TYPE waterseeker_llm_cache_hit_ratio gauge" in text
+    assert "waterseeker_llm_cache_hit_ratio 0.5" in text
+    assert "waterseeker_llm_cache_saved_seconds 1.5" in text
+
+
+def test_agent_cache_is_registered():
+    import waterseeker
+    assert any(name == "llm_cache_hit_ratio" for name, _, _ in telemetry.metrics.gauges())
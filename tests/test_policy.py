@@ -0,0 +1,174 @@
+# waterseeker-agent/tests/test_policy.py
+import asyncio
+
+import pytest
+
+import telemetry
+from policy import MIN_HEDGE_DELAY, MIN_SAMPLES, CallPolicy, CircuitBreaker, CircuitOpen
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _transitions(name):
+    return [c["labels"]["state"] for c in telemetry.metrics.to_dict()["counters"]
+            if c["name"] == "circuit_transitions_total" and c["labels"]["circuit"] == name]
+
+
+def test_breaker_opens_probes_and_closes():
+    clock = FakeClock()
+    breaker = CircuitBreaker("breaker_cycle", failure_threshold=3, reset_timeout=30.0, clock=clock)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    clock.now += 10
+    assert breaker.retry_in() == 20.0 and not breaker.allow()
+    # After reset_timeout, exactly one probe goes through
+    clock.now += 20
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0 and breaker.allow()
+    assert sorted(_transitions("breaker_cycle")) == ["closed", "half_open", "open"]
+
+
+def test_failed_probe_reopens_and_cancelled_probe_is_released():
+    clock = FakeClock()
+    breaker = CircuitBreaker("breaker_probe", failure_threshold=1, reset_timeout=5.0, clock=clock)
+    breaker.record_failure()
+    clock.now += 5
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.retry_in() == 5.0
+    clock.now += 5
+    assert breaker.allow()
+    # A cancelled probe says nothing about the service: the next caller probes instead
+    breaker.release()
+    assert breaker.state == "half_open" and breaker.allow()
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker("breaker_reset", failure_threshold=2, clock=FakeClock())
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_adaptive_timeout():
+    policy = CallPolicy("adaptive_timeout", max_timeout=30.0, min_timeout=1.0, timeout_factor=2.0)
+    for _ in range(MIN_SAMPLES - 1):
+        policy.latencies.add(2.0)
+    # Too few samples: the configured maximum
+    assert policy.timeout() == 30.0
+    policy.latencies.add(2.0)
+    assert policy.timeout() == 4.0
+    for _ in range(MIN_SAMPLES * 10):
+        policy.latencies.add(0.1)
+    assert policy.timeout() == 1.0
+    for _ in range(MIN_SAMPLES * 10):
+        policy.latencies.add(60.0)
+    assert policy.timeout() == 30.0
+
+
+def test_open_circuit_rejects_without_calling():
+    policy = CallPolicy("rejects", max_timeout=1.0, failure_threshold=1)
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        raise Exception("down")
+
+    async def main():
+        with pytest.raises(Exception, match="down"):
+            await policy.call(failing)
+        with pytest.raises(CircuitOpen):
+            await policy.call(failing)
+    asyncio.run(main())
+    assert len(calls) == 1 and policy.stats()["circuit"] == "open"
+
+
+def test_timeout_counts_as_failure():
+    policy = CallPolicy("times_out", max_timeout=0.05, min_timeout=0.01, failure_threshold=1)
+
+    async def main():
+        with pytest.raises(Exception, match="timed out"):
+            await policy.call(lambda: asyncio.sleep(1))
+    asyncio.run(main())
+    assert policy.breaker.state == "open"
+
+
+def test_failed_results_count_as_failures():
+    policy = CallPolicy("failed_results", max_timeout=1.0, failure_threshold=2)
+
+    async def answer():
+        return 503
+
+    async def main():
+        for _ in range(2):
+            assert await policy.call(answer, failed=lambda status: status >= 500) == 503
+    asyncio.run(main())
+    assert policy.breaker.state == "open" and len(policy.latencies) == 0
+
+
+def _hedging_policy(name):
+    policy = CallPolicy(name, max_timeout=5.0, hedge=True)
+    for _ in range(MIN_SAMPLES):
+        policy.latencies.add(0.001)
+    assert policy.hedge_delay() == MIN_HEDGE_DELAY
+    return policy
+
+
+def test_slow_call_is_hedged_and_the_hedge_wins():
+    policy = _hedging_policy("hedge_call")
+    started, cancelled = [], []
+
+    async def attempt():
+        started.append(1)
+        try:
+            # The first attempt stalls, the hedge answers at once
+            await asyncio.sleep(1 if len(started) == 1 else 0)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+        return len(started)
+
+    assert asyncio.run(policy.call(attempt)) == 2
+    assert len(started) == 2 and cancelled == [1]
+
+
+def test_fast_call_is_not_hedged():
+    policy = _hedging_policy("hedge_fast")
+    started = []
+
+    async def attempt():
+        started.append(1)
+        return "ok"
+
+    assert asyncio.run(policy.call(attempt)) == "ok"
+    assert len(started) == 1
+
+
+def test_slow_stream_is_hedged():
+    policy = _hedging_policy("hedge_stream")
+    started = []
+
+    async def stream():
+        started.append(1)
+        if len(started) == 1:
+            await asyncio.sleep(1)
+        for chunk in ("a", "b"):
+            yield chunk
+
+    async def main():
+        return [chunk async for chunk in policy.stream(stream)]
+    assert asyncio.run(main()) == ["a", "b"]
+    assert len(started) == 2
@@ -0,0 +1,95 @@
+# waterseeker-agent/tests/test_ranking.py
+import asyncio
+
+import pytest
+
+import waterseeker
+from ranking import build_recommendation, rank_locations
+from results import LocationRecord
+
+LOCATIONS = [(35.7, -78.4), (-15.8, -47.9), (51.5, -0.1)]
+
+
+def _records(*values, found=(True, True, True)):
+    return [LocationRecord(i + 1, *LOCATIONS[i], rainfall, capacity, found[i], "Unknown", "Unknown", "")
+            for i, (rainfall, capacity) in enumerate(values)]
+
+
+def test_capacity_first_then_rainfall_then_id():
+    records = _records((900, 50), (1200, 50), (1200, 50))
+    assert [r.location_id for r in rank_locations(records)] == [2, 3, 1]
+    records = _records((3000, 10), (100, 80), (2000, 60))
+    assert [r.location_id for r in rank_locations(records)] == [2, 3, 1]
+
+
+def test_recommendation_lines():
+    text = build_recommendation(rank_locations(_records((900, 50), (1200, 50), (500, 10))))
+    assert text.splitlines()[0] == "- Recommended: Location 2 (lat: -15.8, lon: -47.9)"
+    assert "Capacity is tied, so rainfall decides: 1200mm/year versus Location 1 (900mm/year)." in text
+    assert build_recommendation(rank_locations(_records((900, 0), (1200, 0), (500, 0)))).startswith("- No recommendation:")
+    assert build_recommendation([]).startswith("- No recommendation:")
+
+
+class FakeLLM:
+    def __init__(self, answer=None, error=None):
+        self.answer, self.error, self.prompts = answer, error, []
+
+    async def __call__(self, prompt_text):
+        self.prompts.append(prompt_text)
+        if self.error:
+            raise Exception(self.error)
+        return self.answer
+
+
+def _recommend(monkeypatch, llm, records, mode):
+    monkeypatch.setattr(waterseeker, "cached_call_watsonx_async", llm)
+    log = []
+
+    async def main():
+        recommendation, task = await waterseeker._recommend(records, LOCATIONS, log, mode)
+        if task is not None:
+            recommendation = await waterseeker._apply_justification(recommendation, task, log)
+        return recommendation
+    return asyncio.run(main()), log
+
+
+def test_local_mode_makes_no_llm_call(monkeypatch):
+    llm = FakeLLM("unused")
+    recommendation, _ = _recommend(monkeypatch, llm, _records((900, 50), (1200, 70), (500, 10)), "local")
+    assert recommendation.startswith("- Recommended: Location 2") and llm.prompts == []
+
+
+def test_unfound_locations_are_left_out(monkeypatch):
+    # Location 2 would win on made-up numbers, but its row was never parsed
+    records = _records((900, 50), (1200, 70), (500, 10), found=(True, False, True))
+    recommendation, _ = _recommend(monkeypatch, FakeLLM(), records, "local")
+    assert recommendation.startswith("- Recommended: Location 1")
+
+
+def test_hybrid_mode_keeps_the_local_pick_with_the_llm_justification(monkeypatch):
+    llm = FakeLLM("- Justification: Much larger reservoir.")
+    recommendation, _ = _recommend(monkeypatch, llm, _records((900, 50), (1200, 70), (500, 10)), "hybrid")
+    assert recommendation == "- Recommended: Location 2 (lat: -15.8, lon: -47.9)\n- Justification: Much larger reservoir."
+    assert len(llm.prompts) == 1 and "Location 2 has been selected" in llm.prompts[0]
+
+
+@pytest.mark.parametrize("llm", [FakeLLM(error="API call timed out"), FakeLLM("No justification here.")])
+def test_hybrid_mode_falls_back_to_the_local_justification(monkeypatch, llm):
+    records = _records((900, 50), (1200, 70), (500, 10))
+    recommendation, log = _recommend(monkeypatch, llm, records, "hybrid")
+    assert recommendation == build_recommendation(rank_locations(records))
+    assert any("keeping the local one" in line for line in log)
+
+
+def test_llm_mode_uses_the_model_pick(monkeypatch):
+    llm = FakeLLM("- Recommended: Location 3 (lat: 51.5, lon: -0.1)\n- Justification: Wettest.\n"
+                  "- Recommended: Location 1 (lat: 35.7, lon: -78.4)")
+    recommendation, _ = _recommend(monkeypatch, llm, _records((900, 50), (1200, 70), (500, 10)), "llm")
+    assert recommendation == "- Recommended: Location 3 (lat: 51.5, lon: -0.1)\n- Justification: Wettest."
+
+
+def test_llm_mode_falls_back_to_the_local_ranking(monkeypatch):
+    records = _records((900, 50), (1200, 70), (500, 10))
+    recommendation, log = _recommend(monkeypatch, FakeLLM(error="API call failed: 500"), records, "llm")
+    assert recommendation == build_recommendation(rank_locations(records))
+    assert any("ranking locally instead" in line for line in log)
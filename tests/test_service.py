@@ -0,0 +1,107 @@
+# waterseeker-agent/tests/test_service.py
+import asyncio
+import http.client
+import json
+import socket
+import threading
+import pytest
+import service
+import waterseeker
+
+
+@pytest.fixture(scope="module")
+def address():
+    server = service.ServiceServer(("127.0.0.1", 0), service.AnalysisService(workers=1, queue_size=1))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address
+    server.shutdown()
+    server.server_close()
+
+
+def _post(address, content_length, body=b""):
+    headers = "POST /analyses HTTP/1.1\r\nHost: test\r\nContent-Type: application/json\r\n"
+    if content_length is not None:
+        headers += f"Content-Length: {content_length}\r\n"
+    with socket.create_connection(address, timeout=5) as sock:
+        sock.sendall(headers.encode() + b"\r\n" + body)
+        response = b""
+        while chunk := sock.recv(65536):
+            response += chunk
+            head, _, payload = response.partition(b"\r\n\r\n")
+            if payload and len(payload) >= int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0]):
+                break
+    status = int(response.split(b" ", 2)[1])
+    return status, json.loads(response.partition(b"\r\n\r\n")[2])
+
+
+@pytest.mark.parametrize("value", ["-1", "abc", "1.5", "+10", "1_0", "١٠", ""])
+def test_invalid_content_length_is_rejected(address, value):
+    status, payload = _post(address, value, b"{}")
+    assert status == 400
+    assert payload == {"error": "Invalid Content-Length."}
+
+
+def test_oversized_body_is_rejected_unread(address):
+    status, payload = _post(address, service.MAX_BODY + 1)
+    assert status == 413
+    assert payload == {"error": "Request body too large."}
+
+
+def test_valid_length_reaches_request_parsing(address):
+    body = b'{"locations": "nope"}'
+    status, payload = _post(address, len(body), body)
+    assert status == 400 and payload["error"] != "Invalid Content-Length."
+    # No Content-Length: an empty body
+    assert _post(address, None)[0] == 400
+
+
+@pytest.fixture
+def running(monkeypatch):
+    # A started service whose analyses fail after a moment, without calling any API
+    async def agent(locations, **kwargs):
+        await asyncio.sleep(0.2)
+        raise Exception("No API in tests.")
+    monkeypatch.setattr(waterseeker, "run_waterseeker_agent_async", agent)
+    analysis_service = service.AnalysisService(workers=1, queue_size=4).start()
+    server = service.ServiceServer(("127.0.0.1", 0), analysis_service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield analysis_service, server.server_address
+    server.shutdown()
+    server.server_close()
+    analysis_service.stop()
+
+
+def test_default_modes_coalesce_with_explicit_ones(running, monkeypatch):
+    analysis_service, _ = running
+    monkeypatch.setattr(waterseeker, "RECOMMENDATION_MODE", "hybrid")
+    job, coalesced = analysis_service.submit([(35.7, -78.4)])
+    assert not coalesced and (job.recommendation_mode, job.output_mode) == ("hybrid", waterseeker.ANALYSIS_OUTPUT_MODE)
+    same, coalesced = analysis_service.submit([(35.7, -78.4)], "hybrid", waterseeker.ANALYSIS_OUTPUT_MODE)
+    assert coalesced and same is job
+    assert analysis_service.submit([(35.7, -78.4)], "local")[0] is not job
+
+
+def _events(address, job_id, last_event_id):
+    connection = http.client.HTTPConnection(*address, timeout=5)
+    connection.request("GET", f"/analyses/{job_id}/events", headers={"Last-Event-ID": last_event_id})
+    response = connection.getresponse()
+    body = response.read().decode()
+    connection.close()
+    return response.status, body
+
+
+@pytest.mark.parametrize("last_event_id, first_id", [("-5", 0), ("-1", 0), ("1", 2)])
+def test_last_event_id_resumes_from_the_next_event(running, last_event_id, first_id):
+    analysis_service, address = running
+    job, _ = analysis_service.submit([(35.7, -78.4)])
+    assert job.wait(5)
+    status, body = _events(address, job.id, last_event_id)
+    ids = [int(line[4:]) for line in body.splitlines() if line.startswith("id: ")]
+    assert status == 200 and ids == list(range(first_id, len(job.events)))
+
+
+def test_invalid_last_event_id_is_rejected(running):
+    analysis_service, address = running
+    job, _ = analysis_service.submit([(35.7, -78.4)])
+    status, body = _events(address, job.id, "abc")
+    assert status == 400 and json.loads(body) == {"error": "Invalid Last-Event-ID."}
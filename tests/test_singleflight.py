@@ -0,0 +1,141 @@
+# waterseeker-agent/tests/test_singleflight.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+import geocache  # noqa: F401 (registers its flight)
+import telemetry
+import waterseeker  # noqa: F401
+import weather  # noqa: F401
+from singleflight import SingleFlight
+from telemetry import Metrics
+
+
+def test_concurrent_calls_share_one():
+    flight = SingleFlight("test_do")
+    calls = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.1)
+        return "result"
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", work))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["result"] * 4 and len(calls) == 1
+    assert flight.stats() == {"leaders": 1, "shared": 3, "shared_ratio": 0.75, "in_flight": 0}
+
+
+def test_exceptions_are_shared():
+    flight = SingleFlight("test_error")
+
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise Exception("down")
+
+    async def main():
+        return await asyncio.gather(flight.do_async("key", failing), flight.do_async("key", failing),
+                                    return_exceptions=True)
+    results = asyncio.run(main())
+    assert [str(result) for result in results] == ["down", "down"]
+    assert flight.leaders == 1 and flight.shared == 1
+
+
+def test_cancelled_leader_hands_over_to_a_waiter():
+    flight = SingleFlight("test_cancel")
+    calls = []
+
+    async def work(name):
+        calls.append(name)
+        await asyncio.sleep(0.1)
+        return name
+
+    async def main():
+        leader = asyncio.create_task(flight.do_async("key", lambda: work("leader")))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(flight.do_async("key", lambda: work("waiter")))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        # The waiter is not cancelled with it: it runs the call itself
+        return await waiter
+    assert asyncio.run(main()) == "waiter"
+    assert calls == ["leader", "waiter"] and flight.leaders == 2
+
+
+def _chunks(calls, name):
+    def make_iter():
+        calls.append(name)
+        for chunk in ("a", "b", "c"):
+            time.sleep(0.03)
+            yield chunk
+    return make_iter
+
+
+def test_stream_waiter_gets_the_joined_result():
+    flight = SingleFlight("test_stream")
+    calls, results = [], {}
+    leader = threading.Thread(target=lambda: results.update(leader=list(flight.stream("key", _chunks(calls, "leader")))))
+    leader.start()
+    time.sleep(0.01)
+    results["waiter"] = list(flight.stream("key", _chunks(calls, "waiter")))
+    leader.join()
+    assert results == {"leader": ["a", "b", "c"], "waiter": ["abc"]}
+    assert calls == ["leader"]
+
+
+def test_closed_stream_leader_hands_over():
+    flight = SingleFlight("test_stream_close")
+    calls, results = [], []
+    stream = flight.stream("key", _chunks(calls, "leader"))
+    assert next(stream) == "a"
+    waiter = threading.Thread(target=lambda: results.extend(flight.stream("key", _chunks(calls, "waiter"))))
+    waiter.start()
+    time.sleep(0.01)
+    # The leader's consumer stops reading: the waiter streams on its own
+    stream.close()
+    waiter.join()
+    assert calls == ["leader", "waiter"] and results == ["a", "b", "c"]
+
+
+def test_stream_async_waiter_gets_the_joined_result():
+    flight = SingleFlight("test_stream_async")
+    calls = []
+
+    def make_aiter(name):
+        async def chunks():
+            calls.append(name)
+            for chunk in ("a", "b", "c"):
+                await asyncio.sleep(0.02)
+                yield chunk
+        return chunks
+
+    async def collect(name):
+        return [chunk async for chunk in flight.stream_async("key", make_aiter(name))]
+
+    async def main():
+        return await asyncio.gather(collect("leader"), collect("waiter"))
+    assert asyncio.run(main()) == [["a", "b", "c"], ["abc"]]
+    assert calls == ["leader"]
+
+
+def test_stats_exported_as_gauges():
+    flight = SingleFlight("test_gauges")
+    metrics = Metrics()
+    metrics.register_gauges("singleflight", lambda: {flight.name: flight.stats()}, label="flight")
+    flight.do("key", lambda: 1)
+    text = metrics.prometheus()
+    assert "# TYPE waterseeker_singleflight_leaders gauge" in text
+    assert 'waterseeker_singleflight_leaders{flight="test_gauges"} 1' in text
+    assert 'waterseeker_singleflight_in_flight{flight="test_gauges"} 0' in text
+
+
+def test_module_flights_are_registered():
+    flights = {dict(labels)["flight"] for name, labels, _ in telemetry.metrics.gauges() if name == "singleflight_leaders"}
+    assert {"geocode", "weather", "llm"} <= flights
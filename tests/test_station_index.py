@@ -0,0 +1,29 @@
+# waterseeker-agent/tests/test_station_index.py
+import threading
+import time
+import station_index
+
+
+def test_concurrent_first_use_loads_the_index_once(tmp_path, monkeypatch):
+    (tmp_path / "stations.npy").touch()
+    loads = []
+
+    class SlowIndex:
+        def __init__(self, path):
+            loads.append(path)
+            time.sleep(0.1)
+
+    monkeypatch.setattr(station_index, "STATION_INDEX_PATH", str(tmp_path))
+    monkeypatch.setattr(station_index, "StationIndex", SlowIndex)
+    monkeypatch.setattr(station_index, "_index", None)
+    monkeypatch.setattr(station_index, "_index_loaded", False)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(station_index.get_station_index())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # No caller gets None while the first one is still loading
+    assert len(loads) == 1
+    assert len(results) == 8 and all(isinstance(index, SlowIndex) for index in results)
+    assert len({id(index) for index in results}) == 1
@@ -0,0 +1,117 @@
+# waterseeker-agent/tests/test_streaming.py
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from streaming import iter_sse_data
+
+CHUNKS = ["Here is the analysis:\n- Location 1 (lat: 35.7, lon: -78.4): Rain",
+          "fall: 1200mm/year, Capacity: 5M liters — café 💧\n",
+          "- Location 2 (lat: 10.0, lon: 20.0): Rainfall: 800mm/year, Capacity: 3M liters\n"]
+# Seconds the stand-in waits before the last event
+LAST_EVENT_DELAY = 0.5
+
+
+def _event(text, split_data=False, newline="\n"):
+    data = json.dumps({"results": [{"generated_text": text}]}, ensure_ascii=False)
+    if split_data:
+        # One event's JSON spread over several data: lines
+        middle = data.index('"generated_text"')
+        lines = [f"data: {data[:middle]}", f"data: {data[middle:]}"]
+    else:
+        lines = [f"data: {data}"]
+    return newline.join(["id: 1", "event: message"] + lines) + newline + newline
+
+
+def sse_body():
+    return (": keep-alive comment\n\n" + _event(CHUNKS[0]) + _event(CHUNKS[1], split_data=True, newline="\r\n"),
+            _event(CHUNKS[2]) + "data: [DONE]\n\n")
+
+
+def test_events_split_over_lines():
+    lines = "".join(sse_body()).splitlines()
+    assert [event["results"][0]["generated_text"] for event in iter_sse_data(lines)] == CHUNKS
+
+
+def test_bytes_and_unterminated_last_event():
+    lines = [b"data: {\"a\": 1}", b"", b"data: {\"a\":", "data: 2}"]
+    assert list(iter_sse_data(lines)) == [{"a": 1}, {"a": 2}]
+
+
+def test_done_and_blank_events_skipped():
+    assert list(iter_sse_data(["data: [DONE]", "", "", "event: ping", ""])) == []
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    # IAM token endpoint and a watsonx generation stream sent, like watsonx does, with
+    # chunked transfer encoding, in small chunks that don't line up with lines or events
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if "identity/token" in self.path:
+            body = json.dumps({"access_token": "token", "expires_in": 3600, "expiration": time.time() + 3600}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        first, last = (part.encode("utf-8") for part in sse_body())
+        # 7-byte chunks split lines, events and multi-byte characters
+        for i in range(0, len(first), 7):
+            self._chunk(first[i:i + 7])
+        time.sleep(LAST_EVENT_DELAY)
+        self._chunk(last)
+        self._chunk(b"")
+
+    def _chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    import iam
+    import waterseeker
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    monkeypatch.setattr(iam, "IAM_URL", url + "/identity/token")
+    monkeypatch.setattr(waterseeker, "STREAM_URL", url + "/ml/v1/text/generation_stream")
+    monkeypatch.setattr(waterseeker, "token_manager", iam.IAMTokenManager(lambda: "key"))
+    yield waterseeker
+    httpd.shutdown()
+
+
+def test_stream_watsonx_yields_before_the_stream_ends(stand_in):
+    start = time.monotonic()
+    chunks, first_chunk = [], None
+    for chunk in stand_in.stream_watsonx("prompt"):
+        first_chunk = first_chunk or time.monotonic() - start
+        chunks.append(chunk)
+    assert chunks == CHUNKS
+    assert first_chunk < LAST_EVENT_DELAY
+
+
+def test_stream_watsonx_async_yields_before_the_stream_ends(stand_in):
+    async def run():
+        start = time.monotonic()
+        chunks, first_chunk = [], None
+        async for chunk in stand_in._stream_watsonx_async("prompt"):
+            first_chunk = first_chunk or time.monotonic() - start
+            chunks.append(chunk)
+        return chunks, first_chunk
+    chunks, first_chunk = asyncio.run(run())
+    assert chunks == CHUNKS
+    assert first_chunk < LAST_EVENT_DELAY
@@ -0,0 +1,92 @@
+# waterseeker-agent/tests/test_telemetry.py
+import json
+
+import pytest
+
+import telemetry
+from telemetry import Metrics, Span, Trace
+
+
+def _span(metrics, name, seconds, status="ok"):
+    span = Span(name, {})
+    span.end, span.status = span.start + seconds, status
+    metrics.observe(span)
+
+
+def test_spans_and_counts_land_on_the_current_trace():
+    trace = Trace("trace-1")
+    trace.append("🤖 Running analysis...")
+    with telemetry.use_trace(trace):
+        with telemetry.span("llm", model="granite") as span:
+            span.set(cached=True)
+        with pytest.raises(ValueError):
+            with telemetry.span("geocode"):
+                raise ValueError("no address")
+        telemetry.count("retries_total", operation="http")
+    # Outside the block nothing is recorded on it
+    with telemetry.span("weather"):
+        pass
+
+    assert [s.name for s in trace.spans] == ["llm", "geocode"]
+    assert trace.spans[0].attributes == {"model": "granite", "cached": True}
+    assert (trace.spans[1].status, trace.spans[1].error) == ("error", "no address")
+    lines = trace.lines()
+    assert lines[0] == "🤖 Running analysis..."
+    assert lines[1].startswith("⏱️ llm: ") and lines[1].endswith(" ms (cached)")
+    assert lines[2].endswith("(error: no address)")
+    assert trace.lines(timings=False) == ["🤖 Running analysis..."]
+    assert trace.summary()["geocode"]["errors"] == 1
+    exported = json.loads(trace.to_json())
+    assert exported["trace_id"] == "trace-1"
+    assert exported["counters"] == [{"name": "retries_total", "labels": {"operation": "http"}, "value": 1}]
+
+
+def test_worker_traces_merge_into_the_run():
+    run, worker = Trace(), Trace()
+    with telemetry.use_trace(worker):
+        with telemetry.span("usgs"):
+            pass
+        telemetry.count("cache_requests_total", cache="usgs_tiles", result="hit")
+    run.add_count(("cache_requests_total", (("cache", "usgs_tiles"), ("result", "hit"))), 2)
+    run.extend(worker)
+    run.extend(["plain line"])
+    assert [s.name for s in run.spans] == ["usgs"]
+    assert run.to_dict()["counters"][0]["value"] == 3
+    assert run.lines(timings=False) == ["plain line"]
+
+
+def test_prometheus_exposition():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.inc(("retries_total", (("host", 'a"b'),)), 2)
+    _span(metrics, "llm", 0.05)
+    _span(metrics, "llm", 0.5)
+    _span(metrics, "llm", 5.0, status="error")
+    text = metrics.prometheus()
+    assert text.splitlines() == [
+        "# TYPE waterseeker_retries_total counter",
+        'waterseeker_retries_total{host="a\\"b"} 2',
+        "# HELP waterseeker_span_duration_seconds Duration of instrumented operations.",
+        "# TYPE waterseeker_span_duration_seconds histogram",
+        'waterseeker_span_duration_seconds_bucket{span="llm",le="0.1"} 1',
+        'waterseeker_span_duration_seconds_bucket{span="llm",le="1"} 2',
+        'waterseeker_span_duration_seconds_bucket{span="llm",le="+Inf"} 3',
+        'waterseeker_span_duration_seconds_sum{span="llm"} 5.550000',
+        'waterseeker_span_duration_seconds_count{span="llm"} 3',
+        "# TYPE waterseeker_span_errors_total counter",
+        'waterseeker_span_errors_total{span="llm"} 1',
+    ]
+    metrics.reset()
+    assert metrics.prometheus() == "\n"
+
+
+def test_export_writes_the_trace_and_the_metrics(tmp_path):
+    trace = Trace("trace-2")
+    with telemetry.use_trace(trace):
+        with telemetry.span("agent_run"):
+            pass
+    metrics_path = tmp_path / "metrics" / "waterseeker.prom"
+    telemetry.export(trace, trace_dir=str(tmp_path / "traces"), metrics_path=str(metrics_path))
+    saved = json.loads((tmp_path / "traces" / "trace-2.json").read_text(encoding="utf-8"))
+    assert [span["name"] for span in saved["spans"]] == ["agent_run"]
+    assert 'waterseeker_span_duration_seconds_count{span="agent_run"}' in metrics_path.read_text(encoding="utf-8")
+    assert [p.name for p in metrics_path.parent.iterdir()] == ["waterseeker.prom"]
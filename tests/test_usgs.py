@@ -0,0 +1,62 @@
+# waterseeker-agent/tests/test_usgs.py
+import asyncio
+import threading
+import time
+import usgs
+from usgs import parse_sites, parse_sites_async
+
+RDB = ("# US Geological Survey\n"
+       "# retrieved: 2024-01-01\n"
+       "agency_cd\tsite_no\tstation_nm\tsite_tp_cd\tdec_lat_va\tdec_long_va\n"
+       "5s\t15s\t50s\t7s\t16s\t16s\n"
+       "USGS\t0208500\tNEUSE RIVER NEAR CLAYTON\tST\t35.647\t-78.405\n"
+       "USGS\t0208600\tNO COORDINATES\tGW\t\t\n"
+       "\n"
+       "USGS\t0208700\t \tGW\t35.7\t-78.4\n")
+
+
+def _rows(sites):
+    return [(s.site_no, s.name, s.site_type, s.lat, s.lon) for s in sites]
+
+
+def test_parse_sites_skips_comments_formats_and_rows_without_coordinates():
+    assert _rows(parse_sites(RDB.splitlines())) == [("0208500", "NEUSE RIVER NEAR CLAYTON", "ST", 35.647, -78.405),
+                                                    ("0208700", "Unnamed site", "GW", 35.7, -78.4)]
+
+
+def test_parse_sites_async_yields_each_site_as_its_line_arrives():
+    lines_sent = []
+
+    async def lines():
+        for line in RDB.encode().splitlines():
+            lines_sent.append(line)
+            yield line
+
+    async def run():
+        seen = []
+        async for site in parse_sites_async(lines()):
+            seen.append((site.site_no, len(lines_sent)))
+        return seen
+
+    # The first site is parsed before the rest of the body has been read
+    assert asyncio.run(run()) == [("0208500", 5), ("0208700", 8)]
+    assert _rows(parse_sites(RDB.splitlines())) == _rows(parse_sites(RDB.encode().splitlines()))
+
+
+def test_tile_cache_is_created_once(monkeypatch):
+    created = []
+
+    def slow_cache(*args, **kwargs):
+        # Widen the window between the None check and the assignment
+        time.sleep(0.05)
+        created.append(object())
+        return created[-1]
+    monkeypatch.setattr(usgs, "_tile_cache", None)
+    monkeypatch.setattr(usgs, "SQLiteCache", slow_cache)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(usgs.get_tile_cache())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1 and all(result is created[0] for result in results)
@@ -0,0 +1,76 @@
+# waterseeker-agent/tests/test_view_model.py
+import pickle
+
+import telemetry
+from results import AgentResult, LocationRecord
+from telemetry import Trace
+from view_model import build_result_view, clean_recommendation
+from weather import DEFAULT_WEATHER
+
+LOCATIONS = [(35.7, -78.4), (-15.8, -47.9), (51.5, -0.1)]
+CENTER = [0.0, 0.0]
+
+
+def _result(recommendation="- Recommended: Location 2 (lat: -15.8, lon: -47.9)\n- Justification: Largest.",
+            recommended_index=1, found=(True, True, False), trace=None):
+    records = [LocationRecord(i + 1, lat, lon, 1000.0 + i, 10.0 * (i + 1), found[i], "Country", f"City {i + 1}", f"Water {i + 1}")
+               for i, (lat, lon) in enumerate(LOCATIONS)]
+    return AgentResult("analysis", recommendation, LOCATIONS, "🤖 Running analysis...", [r.water_resources for r in records],
+                       records, recommended_index, " raw analysis \n", trace)
+
+
+def _weather(rain):
+    return dict(DEFAULT_WEATHER, rain_1h=rain, weather_description="light rain")
+
+
+def test_snapshot_of_a_result():
+    weather = [_weather(1), dict(DEFAULT_WEATHER, error="timed out")]
+    view = build_result_view(_result(), weather, DEFAULT_WEATHER, CENTER)
+
+    assert [location.color for location in view.locations] == ["blue", "green", "blue"]
+    assert view.map_center == [-15.8, -47.9]
+    assert view.locations[1].title == "Location 2 Details"
+    assert view.locations[1].tooltip == "Location 2: Country, City 2"
+    assert view.locations[0].weather_lines[0] == "- Recent Rainfall (last 1 hour): 1 mm"
+    assert view.locations[0].weather_lines[-1] == "- Weather Description: Light rain"
+    # A missing weather entry falls back to the default one
+    assert view.locations[2].weather_lines[-1] == "- Weather Description: N/a"
+    assert view.warnings == ["Error fetching weather data for Location 2: timed out"]
+    assert [location.found for location in view.locations] == [True, True, False]
+    assert view.capacities == [10.0, 20.0, 30.0] and view.rainfalls == [1000.0, 1001.0, 1002.0]
+    assert view.raw_analysis == "raw analysis" and not view.parsing_failed
+    # Plain data: it can be kept in the session and rendered again without the result
+    assert pickle.loads(pickle.dumps(view)) == view
+
+
+def test_no_recommendation_centers_on_the_first_location():
+    view = build_result_view(_result("- No recommendation: No location has a usable analysis.", -1, (False,) * 3),
+                             [], DEFAULT_WEATHER, CENTER)
+    assert view.map_center == [35.7, -78.4]
+    assert view.parsing_failed
+    assert all(location.color == "blue" for location in view.locations)
+
+
+def test_error_recommendation_is_kept_as_is():
+    view = build_result_view(_result("Error: API call failed: 500", -1), [], DEFAULT_WEATHER, CENTER)
+    assert view.recommendation_is_error and view.recommendation == "Error: API call failed: 500"
+
+
+def test_recommendation_details_are_dropped():
+    text = "- Recommended: Location 1 (lat: 35.7, lon: -78.4): Rainfall: 1200mm/year, Capacity: 50M liters\n- Justification: Wet."
+    assert clean_recommendation(text) == "- Recommended: Location 1 (lat: 35.7, lon: -78.4)\n- Justification: Wet."
+
+
+def test_log_and_timings_come_from_the_trace():
+    trace = Trace()
+    trace.append("🤖 Running analysis...")
+    trace.append("missing ScriptRunContext! This warning can be ignored")
+    with telemetry.use_trace(trace):
+        for _ in range(2):
+            with telemetry.span("geocode"):
+                pass
+    view = build_result_view(_result(trace=trace), [], DEFAULT_WEATHER, CENTER)
+    assert "ScriptRunContext" not in view.agent_log
+    assert view.agent_log.splitlines()[0] == "🤖 Running analysis..."
+    assert len(view.timings) == 1 and view.timings[0].startswith("geocode: 2 × ")
+    assert '"trace_id"' in view.trace_json
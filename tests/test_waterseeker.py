@@ -0,0 +1,180 @@
+# waterseeker-agent/tests/test_waterseeker.py
+import asyncio
+import json
+
+import pytest
+
+import waterseeker
+from capacity import ReservoirEstimate
+from policy import CircuitOpen
+
+LOCATIONS = [(35.7, -78.4), (-15.8, -47.9), (51.5, -0.1)]
+
+
+def _row(number, location, rainfall, capacity):
+    lat, lon = location
+    return f"- Location {number} (lat: {lat}, lon: {lon}): Rainfall: {rainfall}mm/year, Capacity: {capacity}M liters"
+
+
+def _json_answer(*items):
+    return json.dumps([{"location": n, "rainfall_mm_per_year": r, "capacity_m_liters": c} for n, r, c in items])
+
+
+async def _async(value):
+    return value
+
+
+class FakeLLM:
+    # Answers prompts in order and keeps them for inspection
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.prompts = []
+
+    async def call(self, prompt_text):
+        self.prompts.append(prompt_text)
+        return self.answers.pop(0)
+
+    async def stream(self, prompt_text):
+        answer = await self.call(prompt_text)
+        for start in range(0, len(answer), 5):
+            yield answer[start:start + 5]
+
+
+@pytest.mark.parametrize("streamed", [False, True])
+@pytest.mark.parametrize("output_mode", ["text", "json"])
+def test_reask_renumbers_skipped_location(monkeypatch, output_mode, streamed):
+    # The model skips Location 2; the re-ask lists it as Location 1 of 1
+    if output_mode == "json":
+        llm = FakeLLM(_json_answer((1, 1000, 10), (3, 3000, 30)), _json_answer((1, 2000, 20)))
+    else:
+        llm = FakeLLM(_row(1, LOCATIONS[0], 1000, 10) + "\n" + _row(3, LOCATIONS[2], 3000, 30),
+                      _row(1, LOCATIONS[1], 2000, 20))
+    monkeypatch.setattr(waterseeker, "cached_call_watsonx_async", llm.call)
+    monkeypatch.setattr(waterseeker, "cached_stream_watsonx_async", llm.stream)
+    reported = []
+    on_location = (lambda location_id, line: reported.append(location_id)) if streamed else None
+
+    _, records = asyncio.run(waterseeker._analyze(LOCATIONS, waterseeker._locations_text(LOCATIONS), [],
+                                                  on_location, output_mode))
+
+    reask = llm.prompts[1]
+    assert "Location 1: (lat: -15.8, lon: -47.9)" in reask
+    assert "Location 2:" not in reask and "Location 3:" not in reask
+    if output_mode == "text":
+        assert "beyond Location 1." in reask
+    assert [(r.location_id, r.rainfall, r.capacity, r.found) for r in records] == [
+        (1, 1000, 10, True), (2, 2000, 20, True), (3, 3000, 30, True)]
+    assert (records[1].lat, records[1].lon) == LOCATIONS[1]
+    if streamed:
+        assert reported == [1, 3, 2]
+
+
+def test_reask_maps_rows_back_to_original_ids(monkeypatch):
+    llm = FakeLLM(_row(1, LOCATIONS[0], 1000, 10), _row(2, LOCATIONS[2], 3000, 30))
+    monkeypatch.setattr(waterseeker, "cached_call_watsonx_async", llm.call)
+    log = []
+
+    _, records = asyncio.run(waterseeker._analyze(LOCATIONS, waterseeker._locations_text(LOCATIONS), log))
+
+    # Locations 2 and 3 were re-asked as 1 and 2; row "2" is checked against Location 3's coordinates
+    assert "beyond Location 2" in llm.prompts[1]
+    assert [r.found for r in records] == [True, False, True]
+    assert "Location(s) 2;" in log[-1]
+
+
+def _estimate(capacity):
+    return ReservoirEstimate(0.0, 0.0, 100.0, 20.0, 20.0, capacity, 1.0, 200.0, False)
+
+
+def test_open_circuit_falls_back_to_measured_values(monkeypatch):
+    async def unavailable(prompt_text):
+        raise CircuitOpen("watsonx is unavailable (circuit open, retrying in 30 s).")
+    monkeypatch.setattr(waterseeker, "cached_call_watsonx_async", unavailable)
+    facts = {"rainfall": [1000, None, 3000], "capacity": [_estimate(10.04), _estimate(20.0), _estimate(5.0)]}
+    log = []
+
+    analysis, records = asyncio.run(waterseeker._analyze(LOCATIONS, waterseeker._locations_text(LOCATIONS, facts),
+                                                         log, facts=facts))
+
+    assert [(r.rainfall, r.capacity, r.found) for r in records] == [(1000, 10.0, True), (0, 0, False), (3000, 5.0, True)]
+    assert analysis.splitlines() == [records[0].line(), records[2].line()]
+    assert any("circuit open" in line for line in log)
+    recommendation, _ = asyncio.run(waterseeker._recommend(records, LOCATIONS, log, "llm"))
+    assert recommendation.startswith("- Recommended: Location 1")
+
+
+def test_open_circuit_during_reask_keeps_the_rows_so_far(monkeypatch):
+    answers = [_row(1, LOCATIONS[0], 1000, 10)]
+
+    async def llm(prompt_text):
+        if not answers:
+            raise CircuitOpen("watsonx is unavailable (circuit open, retrying in 30 s).")
+        return answers.pop(0)
+    monkeypatch.setattr(waterseeker, "cached_call_watsonx_async", llm)
+
+    _, records = asyncio.run(waterseeker._analyze(LOCATIONS, waterseeker._locations_text(LOCATIONS), []))
+
+    assert [r.found for r in records] == [True, False, False]
+
+
+FIVE = [(35.0 + i, -78.0 - i) for i in range(5)]
+
+
+def _answer_all(locations):
+    return "\n".join(_row(i + 1, location, 1000 + i, 10 + i) for i, location in enumerate(locations))
+
+
+@pytest.fixture
+def offline_agent(monkeypatch):
+    # No local facts and no network: the LLM and the lookups are fakes
+    monkeypatch.setattr(waterseeker, "_local_facts", lambda locations: {"rainfall": None, "capacity": None})
+    lookups = {"active": 0, "peak": 0, "started": []}
+
+    async def location_info(lat, lon, log):
+        lookups["started"].append(lat)
+        lookups["active"] += 1
+        lookups["peak"] = max(lookups["peak"], lookups["active"])
+        await asyncio.sleep(0.02)
+        lookups["active"] -= 1
+        return "Country", f"City {lat:g}", f"Water near {lat:g}"
+    monkeypatch.setattr(waterseeker, "get_location_info_async", location_info)
+    return lookups
+
+
+def test_lookups_overlap_the_llm_call_within_the_limit(monkeypatch, offline_agent):
+    lookups_before_answer = []
+
+    async def llm(prompt_text):
+        await asyncio.sleep(0.05)
+        lookups_before_answer.append(len(offline_agent["started"]))
+        return _answer_all(FIVE)
+    monkeypatch.setattr(waterseeker, "cached_call_watsonx_async", llm)
+
+    result = asyncio.run(waterseeker.run_waterseeker_agent_async(FIVE, max_workers=2))
+
+    # The lookups ran while the model was generating, at most two at a time
+    assert lookups_before_answer[0] > 0
+    assert offline_agent["peak"] == 2
+    assert [(r.country, r.city) for r in result.records] == [("Country", f"City {lat:g}") for lat, _ in FIVE]
+    assert result.water_resources == [f"Water near {lat:g}" for lat, _ in FIVE]
+
+
+def test_lookups_are_cancelled_when_the_analysis_fails(monkeypatch, offline_agent):
+    async def llm(prompt_text):
+        await asyncio.sleep(0.01)
+        raise Exception("API call failed: 500")
+    monkeypatch.setattr(waterseeker, "cached_call_watsonx_async", llm)
+
+    async def main():
+        with pytest.raises(Exception, match="500"):
+            await waterseeker.run_waterseeker_agent_async(FIVE, max_workers=1)
+        # Give cancelled lookups a chance to run if they were left behind
+        await asyncio.sleep(0.2)
+    asyncio.run(main())
+    assert len(offline_agent["started"]) < len(FIVE)
+
+
+def test_sequential_lookups_without_pipelining(monkeypatch, offline_agent):
+    monkeypatch.setattr(waterseeker, "cached_call_watsonx_async", lambda prompt_text: _async(_answer_all(FIVE)))
+    result = asyncio.run(waterseeker.run_waterseeker_agent_async(FIVE, pipelined=False))
+    assert offline_agent["peak"] == 1 and len(result.records) == 5
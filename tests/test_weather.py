@@ -0,0 +1,100 @@
+# waterseeker-agent/tests/test_weather.py
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+import weather
+from weather import DEFAULT_WEATHER, WeatherCache, get_weather_batch
+
+
+class FakeTime:
+    now = 1000.0
+
+    @classmethod
+    def monotonic(cls):
+        return cls.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.setattr(FakeTime, "now", 1000.0)
+    monkeypatch.setattr(weather, "time", FakeTime)
+    return FakeTime
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = WeatherCache(ttl=600)
+    key = cache.key(35.1234, -78.5678)
+    assert key == (35.12, -78.57)
+    cache.set(key, {"rain_1h": 1})
+    clock.now += 599
+    assert cache.get(key) == {"rain_1h": 1}
+    clock.now += 1
+    assert cache.get(key) is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_ratio": 0.5, "entries": 0}
+
+
+def test_full_cache_drops_expired_then_oldest(clock):
+    cache = WeatherCache(ttl=600, max_entries=3)
+    cache.set("old", 1)
+    clock.now += 300
+    cache.set("a", 2)
+    cache.set("b", 3)
+    clock.now += 300
+    # "old" has expired: it goes, the live entries stay
+    cache.set("c", 4)
+    assert [cache.get(key) for key in ("a", "b", "c")] == [2, 3, 4]
+    # Nothing expired: the oldest live entry goes
+    cache.set("d", 5)
+    assert [cache.get(key) for key in ("a", "b", "c", "d")] == [None, 3, 4, 5]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Answers with rain_1h equal to the latitude; latitudes >= 50 are not found
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        lat = float(query["lat"][0])
+        with self.server.lock:
+            self.server.requests.append(lat)
+        status, body = (404, {}) if lat >= 50 else (200, {"rain": {"1h": lat}, "weather": [{"description": "rain"}]})
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def owm(monkeypatch):
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.requests, httpd.lock = [], threading.Lock()
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    monkeypatch.setattr(weather, "OWM_URL", f"http://127.0.0.1:{httpd.server_address[1]}/weather")
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_batch_fetches_each_quantized_point_once(owm):
+    cache = WeatherCache()
+    # The first two points share a key; the last one fails
+    points = [(35.001, -78.0), (35.004, -78.0), (36.0, -79.0), (51.0, -0.1)]
+    results = get_weather_batch(points, "key", cache)
+    assert [result["rain_1h"] for result in results] == [35.0, 35.0, 36.0, 0]
+    assert results[0] is results[1] and results[0]["weather_description"] == "rain"
+    assert "error" in results[3] and {k: v for k, v in results[3].items() if k != "error"} == DEFAULT_WEATHER
+    assert sorted(owm.requests) == [35.0, 36.0, 51.0]
+    # A second batch is served from the cache, except the point that failed
+    assert get_weather_batch(points[:3], "key", cache) == results[:3]
+    assert len(owm.requests) == 3
+
+
+def test_empty_batch():
+    assert get_weather_batch([], "key", WeatherCache()) == []
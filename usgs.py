@@ -0,0 +1,223 @@
+# waterseeker-agent/usgs.py
+import asyncio
+import math
+import os
+import threading
+from dataclasses import dataclass
+import numpy as np
+import telemetry
+from cache import CACHE_DIR, SQLiteCache
+from geo import haversine_km
+from http_client import http_client
+from policy import CallPolicy
+
+USGS_SITE_URL = os.environ.get("WATERSEEKER_USGS_URL", "https://waterservices.usgs.gov/nwis/site/")
+# Points are snapped to tiles of this many degrees; one download covers the tile plus
+# SEARCH_MARGIN on every side, so every click inside a tile reuses it
+USGS_TILE_SIZE = float(os.environ.get("WATERSEEKER_USGS_TILE_SIZE", "0.5"))
+USGS_SEARCH_MARGIN = 0.5
+USGS_TTL = float(os.environ.get("WATERSEEKER_USGS_TTL", str(7 * 24 * 3600)))
+USGS_MAX_ENTRIES = 5000
+USGS_CACHE_PATH = os.path.join(CACHE_DIR, "usgs.sqlite3")
+# Budget (s) for one tile download; see policy.py for the adaptive timeout and breaker
+USGS_TIMEOUT = float(os.environ.get("WATERSEEKER_USGS_TIMEOUT", "10"))
+usgs_policy = CallPolicy("usgs", USGS_TIMEOUT, min_timeout=2.0, hedge=True, reset_timeout=60.0)
+
+_tile_cache = None
+_tile_cache_lock = threading.Lock()
+
+
+@dataclass
+class USGSSite:
+    """One monitoring site from an NWIS site-service RDB response."""
+
+    __slots__ = ("site_no", "name", "site_type", "lat", "lon", "distance_km")
+
+    site_no: str
+    name: str
+    site_type: str  # site_tp_cd, e.g. ST (stream) or GW (well)
+    lat: float
+    lon: float
+    distance_km: float  # from the query point; 0 until ranked
+
+    def label(self):
+        return f"{self.name} ({self.site_type}, {self.distance_km:.1f} km)"
+
+
+class RDBReader:
+    """Line-at-a-time reader for an RDB (tab-separated) response.
+
+    Comment lines start with ``#``; the first other line holds the column
+    names and the one after it the column formats (``5s 15s ...``), which
+    is skipped.
+    """
+
+    def __init__(self):
+        self.columns = None
+        self.format_row_seen = False
+
+    def feed(self, line):
+        """The row dict for a data line, else None."""
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", "replace")
+        line = line.rstrip("\r\n")
+        if not line.strip() or line.startswith("#"):
+            return None
+        fields = line.split("\t")
+        if self.columns is None:
+            self.columns = fields
+        elif not self.format_row_seen:
+            self.format_row_seen = True
+        else:
+            return dict(zip(self.columns, fields))
+        return None
+
+    def site(self, line):
+        """The USGSSite for a data line with usable coordinates, else None."""
+        row = self.feed(line)
+        if row is None:
+            return None
+        try:
+            lat, lon = float(row["dec_lat_va"]), float(row["dec_long_va"])
+        except (KeyError, ValueError):
+            return None
+        return USGSSite(row.get("site_no", ""), row.get("station_nm", "").strip() or "Unnamed site",
+                        row.get("site_tp_cd", ""), lat, lon, 0.0)
+
+
+def iter_rdb(lines):
+    """Yield one dict per data row of an RDB response."""
+    reader = RDBReader()
+    for line in lines:
+        row = reader.feed(line)
+        if row is not None:
+            yield row
+
+
+def parse_sites(lines):
+    """Yield a USGSSite for every RDB row with usable coordinates."""
+    reader = RDBReader()
+    for line in lines:
+        site = reader.site(line)
+        if site is not None:
+            yield site
+
+
+async def parse_sites_async(lines):
+    """parse_sites over an async iterator of lines, parsing each as it arrives."""
+    reader = RDBReader()
+    async for line in lines:
+        site = reader.site(line)
+        if site is not None:
+            yield site
+
+
+def get_tile_cache():
+    global _tile_cache
+    if _tile_cache is None:
+        with _tile_cache_lock:
+            if _tile_cache is None:
+                _tile_cache = SQLiteCache(USGS_CACHE_PATH, ttl=USGS_TTL, max_entries=USGS_MAX_ENTRIES, table="usgs_sites")
+    return _tile_cache
+
+
+def tile_bbox(lat, lon, tile_size=None):
+    """(lon_min, lat_min, lon_max, lat_max) of the download covering the point's tile."""
+    tile_size = tile_size or USGS_TILE_SIZE
+    lat0 = math.floor(lat / tile_size) * tile_size
+    lon0 = math.floor(lon / tile_size) * tile_size
+    return (round(lon0 - USGS_SEARCH_MARGIN, 6), round(lat0 - USGS_SEARCH_MARGIN, 6),
+            round(lon0 + tile_size + USGS_SEARCH_MARGIN, 6), round(lat0 + tile_size + USGS_SEARCH_MARGIN, 6))
+
+
+def fetch_tile(bbox, timeout=USGS_TIMEOUT):
+    """All stream/groundwater sites with quality or level data in the bbox.
+
+    Returns None (not cached) when USGS answers with an unexpected status, and
+    raises policy.CircuitOpen without a request while USGS keeps failing.
+    """
+    key, sites = _cached_tile(bbox)
+    if sites is not None:
+        return sites
+    sites = usgs_policy.call_sync(lambda budget: _download_tile(key, min(timeout, budget)), failed=_download_failed)
+    if sites is not None:
+        _cache_tile(key, sites)
+    return sites
+
+
+def _download_tile(key, timeout):
+    with http_client.get(_tile_url(key), timeout=timeout, stream=True) as response:
+        if response.status_code == 404:
+            # NWIS answers 404 when no site matches
+            return []
+        if response.status_code != 200:
+            return None
+        return list(parse_sites(response.iter_lines(decode_unicode=True)))
+
+
+async def fetch_tile_async(bbox, timeout=USGS_TIMEOUT):
+    """Coroutine version of fetch_tile (same cache, read and written in a worker thread)."""
+    from async_http import get_async_http_client
+    key, sites = await asyncio.to_thread(_cached_tile, bbox)
+    if sites is not None:
+        return sites
+
+    async def download():
+        async with get_async_http_client().stream("GET", _tile_url(key), timeout=timeout) as response:
+            if response.status_code == 404:
+                return []
+            if response.status_code != 200:
+                return None
+            return [site async for site in parse_sites_async(response.aiter_lines())]
+    sites = await usgs_policy.call(download, failed=_download_failed)
+    if sites is not None:
+        await asyncio.to_thread(_cache_tile, key, sites)
+    return sites
+
+
+def _download_failed(sites):
+    return sites is None
+
+
+def _cached_tile(bbox):
+    key = ",".join(f"{v:g}" for v in bbox)
+    rows = get_tile_cache().get(key)
+    telemetry.cache_lookup("usgs_tiles", rows is not None)
+    return key, [USGSSite(*row) for row in rows] if rows is not None else None
+
+
+def _tile_url(key):
+    return f"{USGS_SITE_URL}?format=rdb&bBox={key}&siteType=ST,GW&hasDataTypeCd=qw,gw"
+
+
+def _cache_tile(key, sites):
+    get_tile_cache().set(key, [[s.site_no, s.name, s.site_type, s.lat, s.lon, s.distance_km] for s in sites])
+
+
+def rank_sites(lat, lon, sites, radius_km=None):
+    """Sites sorted by great-circle distance to the point, with distance_km filled in."""
+    if not sites:
+        return []
+    distances = haversine_km(lat, lon, np.array([s.lat for s in sites]), np.array([s.lon for s in sites]))
+    ranked = []
+    for i in np.argsort(distances, kind="stable"):
+        if radius_km is not None and distances[i] > radius_km:
+            break
+        site = sites[i]
+        ranked.append(USGSSite(site.site_no, site.name, site.site_type, site.lat, site.lon, float(distances[i])))
+    return ranked
+
+
+def nearby_sites(lat, lon, radius_km=None, timeout=USGS_TIMEOUT):
+    """USGS sites around the point, nearest first ([] when none; None if USGS failed)."""
+    sites = fetch_tile(tile_bbox(lat, lon), timeout=timeout)
+    if sites is None:
+        return None
+    return rank_sites(lat, lon, sites, radius_km)
+
+
+async def nearby_sites_async(lat, lon, radius_km=None, timeout=USGS_TIMEOUT):
+    sites = await fetch_tile_async(tile_bbox(lat, lon), timeout=timeout)
+    if sites is None:
+        return None
+    return rank_sites(lat, lon, sites, radius_km)
@@ -0,0 +1,146 @@
+# waterseeker-agent/view_model.py
+import re
+from dataclasses import dataclass, field
+
+# Drop the "Rainfall/Capacity" part an LLM recommendation may repeat after the coordinates
+RECOMMENDATION_DETAILS = re.compile(r": Rainfall: \d+mm/year, Capacity: \d+M liters")
+
+
+@dataclass
+class LocationView:
+    """Everything the results section shows for one location, already formatted."""
+
+    __slots__ = ("title", "line", "found", "water_resources", "weather_lines", "lat", "lon", "color", "tooltip", "popup_html")
+
+    title: str
+    line: str
+    found: bool
+    water_resources: str
+    weather_lines: list
+    lat: float
+    lon: float
+    color: str
+    tooltip: str
+    popup_html: str
+
+
+@dataclass
+class ResultView:
+    """Snapshot of one analysis, built once and rendered on every rerun without network calls."""
+
+    agent_log: str
+    parsing_failed: bool
+    raw_analysis: str
+    recommendation: str
+    recommendation_is_error: bool
+    recommended_index: int
+    map_center: list
+    locations: list
+    capacities: list
+    rainfalls: list
+    warnings: list = field(default_factory=list)
+    timings: list = field(default_factory=list)
+    trace_json: str = ""
+
+
+def weather_lines(weather_data):
+    return [
+        f"- Recent Rainfall (last 1 hour): {weather_data['rain_1h']} mm",
+        f"- Recent Rainfall (last 3 hours): {weather_data['rain_3h']} mm",
+        f"- Humidity: {weather_data['humidity']}%",
+        f"- Cloud Cover: {weather_data['cloud_cover']}%",
+        f"- Temperature: {weather_data['temperature']}°C",
+        f"- Wind Speed: {weather_data['wind_speed']} m/s",
+        f"- Wind Direction: {weather_data['wind_direction']}°",
+        f"- Atmospheric Pressure: {weather_data['pressure']} hPa",
+        f"- Weather Description: {weather_data['weather_description'].capitalize()}",
+    ]
+
+
+def popup_html(i, record, weather_data):
+    water_info = record.water_resources or "Data not available."
+    return f"""
+        <b>Location {i+1}</b><br>
+        Lat: {record.lat:.2f}, Lon: {record.lon:.2f}<br>
+        Country: {record.country}<br>
+        City: {record.city}<br>
+        Rainfall: {record.rainfall}mm/year<br>
+        Recent Rainfall (last 1h): {weather_data['rain_1h']}mm<br>
+        Recent Rainfall (last 3h): {weather_data['rain_3h']}mm<br>
+        Humidity: {weather_data['humidity']}% <br>
+        Cloud Cover: {weather_data['cloud_cover']}% <br>
+        Temperature: {weather_data['temperature']}°C <br>
+        Wind: {weather_data['wind_speed']} m/s, {weather_data['wind_direction']}° <br>
+        Pressure: {weather_data['pressure']} hPa <br>
+        Weather: {weather_data['weather_description'].capitalize()} <br>
+        Capacity: {record.capacity}M liters<br>
+        Water Resources: {water_info}<br>
+        Country Info: Population ~{int(record.lat*1e6):,} (simulated)<br>
+        Reservoir Status: Active (simulated)
+        """
+
+
+def clean_recommendation(recommendation):
+    return "\n".join(
+        RECOMMENDATION_DETAILS.sub("", line) if "Rainfall:" in line and "Capacity:" in line else line
+        for line in recommendation.split("\n")
+    )
+
+
+def timing_lines(trace):
+    lines = []
+    for name, stage in trace.summary().items():
+        line = f"{name}: {stage['count']} × {stage['total_ms'] / stage['count']:.0f} ms avg, {stage['max_ms']:.0f} ms max"
+        if stage["errors"]:
+            line += f", {stage['errors']} failed"
+        lines.append(line)
+    return lines
+
+
+def build_result_view(result, weather, default_weather, default_center):
+    """Materialize an AgentResult plus its weather list into a ResultView.
+
+    ``weather`` holds one dict per location (``default_weather`` fills any
+    gap); failed lookups carry an "error" entry and become warnings.
+    """
+    records = result.records
+    recommended_index = result.recommended_index
+    warnings = [f"Error fetching weather data for Location {i+1}: {w['error']}" for i, w in enumerate(weather) if "error" in w]
+    locations = []
+    for i, record in enumerate(records):
+        weather_data = weather[i] if i < len(weather) else default_weather
+        locations.append(LocationView(
+            title=f"Location {i+1} Details",
+            line=record.enriched_line(),
+            found=record.found,
+            water_resources=record.water_resources or "Data not available.",
+            weather_lines=weather_lines(weather_data),
+            lat=record.lat,
+            lon=record.lon,
+            color="green" if i == recommended_index else "blue",
+            tooltip=f"Location {i+1}: {record.country}, {record.city}",
+            popup_html=popup_html(i, record, weather_data),
+        ))
+    coords = result.locations
+    if recommended_index != -1 and recommended_index < len(coords):
+        map_center = list(coords[recommended_index])
+    else:
+        map_center = list(coords[0]) if coords else list(default_center)
+    trace = result.trace
+    # Re-rendered from the trace so spans recorded after the run (weather) are included
+    agent_log = trace.text() if trace is not None else result.agent_log
+    return ResultView(
+        agent_log="\n".join(line for line in agent_log.split("\n") if "missing ScriptRunContext" not in line),
+        parsing_failed=bool(records) and not any(record.found for record in records),
+        raw_analysis=result.raw_analysis.strip(),
+        recommendation=result.recommendation if result.recommendation.startswith("Error:") else clean_recommendation(result.recommendation),
+        recommendation_is_error=result.recommendation.startswith("Error:"),
+        recommended_index=recommended_index,
+        map_center=map_center,
+        locations=locations,
+        capacities=[record.capacity for record in records],
+        rainfalls=[record.rainfall for record in records],
+        warnings=warnings,
+        timings=timing_lines(trace) if trace is not None else [],
+        trace_json=trace.to_json(indent=2) if trace is not None else "",
+    )
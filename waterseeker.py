@@ -1,91 +1,353 @@
 
 import requests
-import streamlit as st
-from langchain.prompts import PromptTemplate
-from langchain_core.runnables import RunnableSequence
-from langchain_core.output_parsers import StrOutputParser
-from geopy.geocoders import Nominatim
+from geocache import reverse_geocode_async, city_and_country
+from iam import IAMTokenManager
+from http_client import http_client
+from streaming import aiter_sse_data, iter_sse_data
+from analysis_parser import AnalysisJSONParser, AnalysisParser
+from ranking import build_recommendation, rank_locations
+from results import AgentResult, LocationRecord, format_number
+from llm_cache import LLM_CACHE_ENABLED, LLMResponseCache, cache_key, templates_fingerprint
+from policy import CallPolicy, CircuitBreaker, CircuitOpen
+from singleflight import SingleFlight
+from telemetry import Trace
+import telemetry
+import asyncio
+import os
 import re
+import threading
 import time
 import json
-
-# API Keys
-WATSON_API_KEY = st.secrets["WATSON_API_KEY"]
+import math
 
 PROJECT_ID = "d7260761-7525-4bb8-b618-6f0928271382"
-BASE_URL = "https://us-south.ml.cloud.ibm.com/ml/v1/text/generation?version=2023-05-29"
+# Service endpoints can be pointed elsewhere (e.g. the local fakes in benchmarks/fake_services.py)
+WATSONX_URL = os.environ.get("WATERSEEKER_WATSONX_URL", "https://us-south.ml.cloud.ibm.com")
+BASE_URL = f"{WATSONX_URL}/ml/v1/text/generation?version=2023-05-29"
+STREAM_URL = f"{WATSONX_URL}/ml/v1/text/generation_stream?version=2023-05-29"
+EC_STATION_URL = os.environ.get("WATERSEEKER_EC_URL", "https://wateroffice.ec.gc.ca/search/station_e.html")
 
-def get_iam_token(api_key):
-    url = "https://iam.cloud.ibm.com/identity/token"
-    headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    data = f"grant_type=urn:ibm:params:oauth:grant-type:apikey&apikey={api_key}"
-    response = requests.post(url, headers=headers, data=data, timeout=10)
-    if response.status_code != 200:
-        raise Exception(f"Failed to get IAM token: {response.text}")
-    return response.json()["access_token"]
+# Call policies (see policy.py): timeouts follow the observed latency, up to these
+# budgets (s), and after repeated failures calls fail fast instead of waiting them out.
+# Hedged duplicate generations cost watsonx tokens, so they are opt-in.
+WATSONX_TIMEOUT = float(os.environ.get("WATERSEEKER_WATSONX_TIMEOUT", "30"))
+WATSONX_HEDGE = os.environ.get("WATERSEEKER_WATSONX_HEDGE", "0") == "1"
+EC_TIMEOUT = float(os.environ.get("WATERSEEKER_EC_TIMEOUT", "10"))
+watsonx_breaker = CircuitBreaker("watsonx")
+# Plain generations take longer the more locations a prompt has, hence the higher floor
+watsonx_policy = CallPolicy("watsonx", WATSONX_TIMEOUT, min_timeout=10.0, hedge=WATSONX_HEDGE, breaker=watsonx_breaker)
+# For streamed generations the budget is the wait for the first chunk
+watsonx_stream_policy = CallPolicy("watsonx_stream", WATSONX_TIMEOUT, min_timeout=3.0, hedge=WATSONX_HEDGE, breaker=watsonx_breaker)
+ec_policy = CallPolicy("environment_canada", EC_TIMEOUT, min_timeout=2.0, hedge=True, reset_timeout=60.0)
 
-IAM_TOKEN = get_iam_token(WATSON_API_KEY)  # Replace with fresh token
+# API Keys (read on first use so importing this module stays offline)
+def get_watson_api_key():
+    if os.environ.get("WATSON_API_KEY"):
+        return os.environ["WATSON_API_KEY"]
+    import streamlit as st
+    return st.secrets["WATSON_API_KEY"]
 
-def call_watsonx(prompt_text):
-    headers = {
-        "Accept": "application/json",
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {IAM_TOKEN}"
-    }
-    payload = {
+token_manager = IAMTokenManager(get_watson_api_key)
+
+# Worker threads for the background location lookups of one analysis. Nominatim
+# requests are still serialized by the shared rate limiter in geocache, and
+# USGS / Environment Canada are capped per host by the shared HTTP client.
+ENRICHMENT_WORKERS = 4
+# Nearest stations listed in the water resources summary, and how far to look in the local index
+SUMMARY_SITES = 3
+STATION_RADIUS_KM = 50.0
+
+# How the recommendation is produced:
+#   "local"  - rank the parsed analysis locally (capacity, then rainfall); no LLM call
+#   "hybrid" - rank locally, ask the LLM only for the justification text (runs during enrichment)
+#   "llm"    - ask the LLM to pick and justify the location
+RECOMMENDATION_MODE = os.environ.get("WATERSEEKER_RECOMMENDATION_MODE", "local")
+# Analysis output format: "text" (one line per location) or "json" (a validated
+# JSON array). Either way, locations missing from the output or with absent or
+# invalid values are asked for again, on their own, up to ANALYSIS_REASKS times.
+ANALYSIS_OUTPUT_MODE = os.environ.get("WATERSEEKER_ANALYSIS_OUTPUT_MODE", "text")
+ANALYSIS_REASKS = 1
+# Where the rainfall figure comes from once a local climatology is built (see climatology.py):
+#   "climatology" - given to the model as a fact, and the value it writes back is replaced by it
+#   "prompt"      - only given to the model as a fact
+#   "llm"         - estimated by the model, as without a climatology
+RAINFALL_SOURCE = os.environ.get("WATERSEEKER_RAINFALL_SOURCE", "climatology")
+# Where the capacity figure comes from once local elevation tiles are built (see capacity.py):
+#   "dem"    - the volume behind a WATERSEEKER_DAM_HEIGHT dam at the location, given to the
+#              model as a fact, and the value it writes back is replaced by it
+#   "prompt" - only given to the model as a fact
+#   "llm"    - estimated by the model, as without elevation tiles
+CAPACITY_SOURCE = os.environ.get("WATERSEEKER_CAPACITY_SOURCE", "dem")
+RECOMMENDED = re.compile(r"Recommended: Location (\d+)")
+
+MODEL_ID = "ibm/granite-3-8b-instruct"
+GENERATION_PARAMETERS = {
+    "decoding_method": "greedy",
+    "max_new_tokens": 1000,
+    "min_new_tokens": 50,
+    "repetition_penalty": 1
+}
+
+def _watsonx_payload(prompt_text):
+    return {
         "input": prompt_text,
-        "parameters": {
-            "decoding_method": "greedy",
-            "max_new_tokens": 1000,
-            "min_new_tokens": 50,
-            "repetition_penalty": 1
-        },
-        "model_id": "ibm/granite-3-8b-instruct",
+        "parameters": GENERATION_PARAMETERS,
+        "model_id": MODEL_ID,
         "project_id": PROJECT_ID
     }
+
+def _watsonx_headers(token, stream=False):
+    return {
+        "Accept": "text/event-stream" if stream else "application/json",
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {token}"
+    }
+
+def _post_watsonx(url, payload, token, timeout=WATSONX_TIMEOUT, **kwargs):
+    return http_client.post(url, json=payload, headers=_watsonx_headers(token, kwargs.get("stream")), timeout=timeout, **kwargs)
+
+def _request_watsonx(url, prompt_text, **kwargs):
+    payload = _watsonx_payload(prompt_text)
+    token = token_manager.get_token()
+    response = _post_watsonx(url, payload, token, **kwargs)
+    if response.status_code == 401:
+        # Token revoked or expired early: refresh once and retry
+        response.close()
+        telemetry.count("retries_total", operation="watsonx_token_refresh")
+        response = _post_watsonx(url, payload, token_manager.invalidate(token), **kwargs)
+    if response.status_code != 200:
+        raise Exception(f"API call failed: {response.status_code} - {response.text}")
+    return response
+
+def call_watsonx(prompt_text):
     try:
-        response = requests.post(BASE_URL, json=payload, headers=headers, timeout=30)
-        if response.status_code != 200:
-            raise Exception(f"API call failed: {response.status_code} - {response.text}")
+        response = watsonx_policy.call_sync(lambda timeout: _request_watsonx(BASE_URL, prompt_text, timeout=timeout))
         return response.json()["results"][0]["generated_text"]
     except requests.Timeout:
-        raise Exception("API call timed out after 30 seconds")
+        raise Exception("API call timed out")
+
+def stream_watsonx(prompt_text):
+    # Yields generated text chunks from the watsonx server-sent event stream
+    try:
+        response = _request_watsonx(STREAM_URL, prompt_text, stream=True)
+        response.encoding = "utf-8"
+        with response:
+            for event in iter_sse_data(response.iter_lines(decode_unicode=True)):
+                for result in event.get("results", []):
+                    if result.get("generated_text"):
+                        yield result["generated_text"]
+    except requests.Timeout:
+        raise Exception(f"API call timed out after {WATSONX_TIMEOUT:.0f} seconds")
+
+def _cached_text(prompt_text, span):
+    # Returns (prompt hash, cached text or None); the hash also keys the in-flight generation
+    key = cache_key(MODEL_ID, GENERATION_PARAMETERS, prompt_text)
+    if not LLM_CACHE_ENABLED:
+        return key, None
+    text = llm_cache.get(key)
+    telemetry.cache_lookup("llm", text is not None)
+    span.set(cached=text is not None)
+    return key, text
+
+def _store_text(key, text, start):
+    if LLM_CACHE_ENABLED:
+        llm_cache.set(key, text, time.monotonic() - start)
+
+def cached_call_watsonx(prompt_text):
+    with telemetry.span("llm", model=MODEL_ID, streamed=False, prompt_chars=len(prompt_text)) as span:
+        key, text = _cached_text(prompt_text, span)
+        if text is None:
+            def generate():
+                start = time.monotonic()
+                text = call_watsonx(prompt_text)
+                _store_text(key, text, start)
+                return text
+            text = llm_flight.do(key, generate, on_shared=lambda: span.set(shared=True))
+        span.set(output_chars=len(text))
+        return text
+
+def cached_stream_watsonx(prompt_text):
+    with telemetry.span("llm", model=MODEL_ID, streamed=True, prompt_chars=len(prompt_text)) as span:
+        key, text = _cached_text(prompt_text, span)
+        if text is not None:
+            span.set(output_chars=len(text))
+            yield text
+            return
+
+        def generate():
+            start = time.monotonic()
+            chunks = []
+            for chunk in stream_watsonx(prompt_text):
+                if not chunks:
+                    span.set(first_chunk_ms=(time.monotonic() - start) * 1000)
+                chunks.append(chunk)
+                yield chunk
+            # Only complete generations are cached
+            _store_text(key, "".join(chunks), start)
+        output_chars = 0
+        for chunk in llm_flight.stream(key, generate, on_shared=lambda: span.set(shared=True)):
+            output_chars += len(chunk)
+            yield chunk
+        span.set(output_chars=output_chars)
 
 class WatsonxLLM:
     def __call__(self, prompt, **kwargs):
         prompt_text = prompt.text if hasattr(prompt, "text") else str(prompt)
-        return call_watsonx(prompt_text)
+        return cached_call_watsonx(prompt_text)
+
+def _stream_llm(prompts):
+    for prompt in prompts:
+        prompt_text = prompt.text if hasattr(prompt, "text") else str(prompt)
+        yield from cached_stream_watsonx(prompt_text)
+
+# Coroutine versions of the calls above (httpx on the running event loop), used by the
+# agent; these also get the adaptive timeouts, optional hedging and the circuit breaker
+async def call_watsonx_async(prompt_text):
+    return await watsonx_policy.call(lambda: _call_watsonx_async(prompt_text))
 
-geolocator = Nominatim(user_agent="WaterSeekerAgent")
+async def _call_watsonx_async(prompt_text):
+    import httpx
+    from async_http import get_async_http_client
+    client = get_async_http_client()
+    payload = _watsonx_payload(prompt_text)
+    token = await token_manager.get_token_async()
+    try:
+        response = await client.post(BASE_URL, json=payload, headers=_watsonx_headers(token), timeout=WATSONX_TIMEOUT)
+        if response.status_code == 401:
+            telemetry.count("retries_total", operation="watsonx_token_refresh")
+            token = await token_manager.invalidate_async(token)
+            response = await client.post(BASE_URL, json=payload, headers=_watsonx_headers(token), timeout=WATSONX_TIMEOUT)
+    except httpx.TimeoutException:
+        raise Exception(f"API call timed out after {WATSONX_TIMEOUT:.0f} seconds")
+    if response.status_code != 200:
+        raise Exception(f"API call failed: {response.status_code} - {response.text}")
+    return response.json()["results"][0]["generated_text"]
+
+async def stream_watsonx_async(prompt_text):
+    async for chunk in watsonx_stream_policy.stream(lambda: _stream_watsonx_async(prompt_text)):
+        yield chunk
+
+async def _stream_watsonx_async(prompt_text):
+    import httpx
+    from async_http import get_async_http_client
+    client = get_async_http_client()
+    payload = _watsonx_payload(prompt_text)
+    token = await token_manager.get_token_async()
+    try:
+        for attempt in range(2):
+            async with client.stream("POST", STREAM_URL, json=payload, headers=_watsonx_headers(token, stream=True), timeout=WATSONX_TIMEOUT) as response:
+                if response.status_code == 401 and attempt == 0:
+                    telemetry.count("retries_total", operation="watsonx_token_refresh")
+                    token = await token_manager.invalidate_async(token)
+                    continue
+                if response.status_code != 200:
+                    await response.aread()
+                    raise Exception(f"API call failed: {response.status_code} - {response.text}")
+                async for event in aiter_sse_data(response.aiter_lines()):
+                    for result in event.get("results", []):
+                        if result.get("generated_text"):
+                            yield result["generated_text"]
+                return
+    except httpx.TimeoutException:
+        raise Exception(f"API call timed out after {WATSONX_TIMEOUT:.0f} seconds")
+
+# The async versions read and write the SQLite cache in a worker thread, off the event loop
+async def cached_call_watsonx_async(prompt_text):
+    with telemetry.span("llm", model=MODEL_ID, streamed=False, prompt_chars=len(prompt_text)) as span:
+        key, text = await asyncio.to_thread(_cached_text, prompt_text, span)
+        if text is None:
+            async def generate():
+                start = time.monotonic()
+                text = await call_watsonx_async(prompt_text)
+                await asyncio.to_thread(_store_text, key, text, start)
+                return text
+            text = await llm_flight.do_async(key, generate, on_shared=lambda: span.set(shared=True))
+        span.set(output_chars=len(text))
+        return text
+
+async def cached_stream_watsonx_async(prompt_text):
+    with telemetry.span("llm", model=MODEL_ID, streamed=True, prompt_chars=len(prompt_text)) as span:
+        key, text = await asyncio.to_thread(_cached_text, prompt_text, span)
+        if text is not None:
+            span.set(output_chars=len(text))
+            yield text
+            return
+
+        async def generate():
+            start = time.monotonic()
+            chunks = []
+            async for chunk in stream_watsonx_async(prompt_text):
+                if not chunks:
+                    span.set(first_chunk_ms=(time.monotonic() - start) * 1000)
+                chunks.append(chunk)
+                yield chunk
+            # Only complete generations are cached
+            await asyncio.to_thread(_store_text, key, "".join(chunks), start)
+        output_chars = 0
+        async for chunk in llm_flight.stream_async(key, generate, on_shared=lambda: span.set(shared=True)):
+            output_chars += len(chunk)
+            yield chunk
+        span.set(output_chars=output_chars)
+
+def _run_sync(make_coro, on_event=None):
+    # The sync API runs the coroutines on one shared background event loop
+    from event_loop import get_background_loop
+    return get_background_loop().run(make_coro, on_event)
 
 def fetch_water_resource_data(lat, lon, country, city, agent_log):
+    return _run_sync(lambda emit: fetch_water_resource_data_async(lat, lon, country, city, agent_log))
+
+async def fetch_water_resource_data_async(lat, lon, country, city, agent_log):
+    with telemetry.span("water_data", lat=lat, lon=lon, country=country) as span:
+        return await _fetch_water_resource_data(lat, lon, country, city, agent_log, span)
+
+def _sites_summary(sites):
+    if len(sites) == 1:
+        return f"Nearby Water Resource: {sites[0].label()}"
+    return "Nearby Water Resources: " + "; ".join(site.label() for site in sites[:SUMMARY_SITES])
+
+async def _fetch_water_resource_data(lat, lon, country, city, agent_log, span):
     agent_log.append(f"🌊 Fetching water resource data for (lat: {lat}, lon: {lon}) in {country}, {city}...")
     try:
-        # Define a bounding box (±0.5 degrees) around the location
-        lat_min, lat_max = lat - 0.5, lat + 0.5
-        lon_min, lon_max = lon - 0.5, lon + 0.5
+        # The local station index (see station_index.py) answers without any network call
+        from station_index import get_station_index
+        index = get_station_index()
+        stations = index.nearest(lat, lon, SUMMARY_SITES, STATION_RADIUS_KM) if index is not None else []
+        if stations:
+            span.set(source="station_index", stations=len(stations))
+            agent_log.append(f"✅ Found {len(stations)} indexed station(s), nearest: {stations[0].label()}")
+            return _sites_summary(stations)
 
         if country == "United States":
-            # Query USGS NWIS for nearby water monitoring stations
-            usgs_url = f"https://waterservices.usgs.gov/nwis/site/?format=rdb&bBox={lon_min},{lat_min},{lon_max},{lat_max}&siteType=ST,GW&hasDataTypeCd=qw,gw"
-            response = requests.get(usgs_url, timeout=10)
-            if response.status_code == 200:
-                lines = response.text.split("\n")
-                for line in lines:
-                    if not line.startswith("#") and line.strip():
-                        fields = line.split("\t")
-                        if len(fields) > 5:  # Ensure enough fields
-                            site_name = fields[2]  # station_nm
-                            site_type = fields[3]  # site_tp_cd
-                            agent_log.append(f"✅ Found USGS site: {site_name} ({site_type})")
-                            return f"Nearby Water Resource: {site_name} ({site_type})"
+            # Nearby USGS NWIS monitoring stations, nearest first (downloads are cached per tile)
+            import usgs
+            try:
+                sites = await usgs.nearby_sites_async(lat, lon)
+            except CircuitOpen as e:
+                agent_log.append(f"⚠️ {str(e)}")
+                span.set(circuit="open")
+                sites = None
+            span.set(source="usgs", stations=len(sites or []))
+            if sites:
+                agent_log.append(f"✅ Found {len(sites)} USGS site(s), nearest: {sites[0].label()}")
+                return _sites_summary(sites)
             agent_log.append("⚠️ No USGS data found, falling back to general info.")
             return f"Nearby Water Resources: Limited data available. The U.S. has extensive water monitoring networks (USGS)."
 
         elif country == "Canada":
             # Query Environment Canada for hydrometric data
-            ec_url = f"https://wateroffice.ec.gc.ca/search/station_e.html?lat={lat}&lon={lon}&radius=50"
-            response = requests.get(ec_url, timeout=10)
+            from async_http import get_async_http_client
+            ec_url = f"{EC_STATION_URL}?lat={lat}&lon={lon}&radius=50"
+            try:
+                response = await ec_policy.call(
+                    lambda: get_async_http_client().get(ec_url, timeout=EC_TIMEOUT),
+                    failed=lambda response: response.status_code >= 500,
+                )
+            except CircuitOpen as e:
+                span.set(source="environment_canada", circuit="open")
+                agent_log.append(f"⚠️ {str(e)} Falling back to general info.")
+                return "Nearby Water Resources: Canada has extensive hydrometric monitoring (Environment Canada)."
+            span.set(source="environment_canada", status_code=response.status_code)
             if response.status_code == 200:
                 # Note: This API requires parsing HTML, which is complex. For simplicity, assume we find a station.
                 agent_log.append("✅ Found Environment Canada hydrometric station.")
@@ -95,31 +357,39 @@ def fetch_water_resource_data(lat, lon, country, city, agent_log):
 
         else:
             # Fallback to general web search for Brazil, Argentina, etc.
+            span.set(source="general")
             search_query = f"water resources near {country} {city if city != 'Unknown' else ''} latitude {lat} longitude {lon}"
             agent_log.append(f"🔍 Performing web search: {search_query}")
             # Simulate web search result (in a real app, use a search API like Google Custom Search)
+            rainfall = _climatology_rainfall([(lat, lon)])
+            rainfall = rainfall[0] if rainfall else None
+            measured = f" Annual rainfall: {format_number(rainfall)}mm (local climatology)." if rainfall is not None else ""
             if country == "Brazil":
-                return "Nearby Water Resources: Brazil’s Cerrado region has significant groundwater reserves, but faces deforestation challenges."
+                return "Nearby Water Resources: Brazil’s Cerrado region has significant groundwater reserves, but faces deforestation challenges." + measured
             elif country == "Argentina":
+                if measured:
+                    return "Nearby Water Resources: Argentina’s Pampas region is known for its aquifers." + measured
                 return "Nearby Water Resources: Argentina’s Pampas region is known for its aquifers, with annual rainfall around 600-1000mm."
             else:
-                return "Nearby Water Resources: Limited data available for this region."
+                return "Nearby Water Resources: Limited data available for this region." + measured
     except Exception as e:
+        # Handled here, so mark the span as failed by hand
+        span.status, span.error = "error", str(e)
         agent_log.append(f"❌ Error fetching water resource data: {str(e)}")
         return "Nearby Water Resources: Unable to fetch data due to an error."
 
 def get_location_info(lat, lon, agent_log):
+    return _run_sync(lambda emit: get_location_info_async(lat, lon, agent_log))
+
+async def get_location_info_async(lat, lon, agent_log):
     agent_log.append(f"📍 Looking up location for coordinates (lat: {lat}, lon: {lon})...")
     try:
-        time.sleep(1)  # Delay between requests
-        location = geolocator.reverse((lat, lon), language="en", timeout=10)
-        if location and location.raw.get("address"):
-            addr = location.raw["address"]
-            country = addr.get("country", "Unknown")
-            city = addr.get("city") or addr.get("town") or addr.get("village") or "Unknown"
+        addr = await reverse_geocode_async(lat, lon, timeout=10)
+        if addr:
+            city, country = city_and_country(addr)
             agent_log.append(f"✅ Found location: Country: {country}, City: {city}")
             # Fetch additional water resource data
-            water_data = fetch_water_resource_data(lat, lon, country, city, agent_log)
+            water_data = await fetch_water_resource_data_async(lat, lon, country, city, agent_log)
             return country, city, water_data
         agent_log.append("⚠️ Location not found, using default values.")
         return "Unknown", "Unknown", "Nearby Water Resources: Location data unavailable."
@@ -127,20 +397,15 @@ def get_location_info(lat, lon, agent_log):
         agent_log.append(f"❌ Error looking up location: {str(e)}")
         return "Unknown", "Unknown", "Nearby Water Resources: Unable to fetch data due to an error."
 
-analysis_prompt = PromptTemplate(
-    input_variables=["locations", "num_locations"],
-    template="""Analyze these locations for water reservoir potential. You must only analyze the {num_locations} location(s) provided below. Do not generate or analyze any additional locations beyond Location {num_locations}. For each, provide:
+ANALYSIS_TEMPLATE = """Analyze these locations for water reservoir potential. You must only analyze the {num_locations} location(s) provided below. Do not generate or analyze any additional locations beyond Location {num_locations}. For each, provide:
 - Rainfall: <value>mm/year (e.g., 1200mm/year)
 - Capacity: <value>M liters (e.g., 5M liters)
 Format as a single line per location with `-`. Example:
 - Location 1 (lat: 35.5, lon: -78.3): Rainfall: 1200mm/year, Capacity: 5M liters
 - Location 2 (lat: 36.0, lon: -79.0): Rainfall: 800mm/year, Capacity: 3M liters
 Provide exactly one line per location, do not use sub-bullets, and do not skip fields or deviate from this format:\n{locations}"""
-)
 
-recommendation_prompt = PromptTemplate(
-    input_variables=["analysis", "num_locations"],
-    template="""Recommend the best location for a water reservoir based on this analysis. You must recommend exactly one location from the locations listed in the analysis (Locations 1 to {num_locations}). Do not recommend any other locations, and do not provide "No recommendation" for other locations. Prioritize the location with the highest capacity (in M liters). If there is a tie in capacity, use rainfall (in mm/year) as the tiebreaker. Provide exactly:
+RECOMMENDATION_TEMPLATE = """Recommend the best location for a water reservoir based on this analysis. You must recommend exactly one location from the locations listed in the analysis (Locations 1 to {num_locations}). Do not recommend any other locations, and do not provide "No recommendation" for other locations. Prioritize the location with the highest capacity (in M liters). If there is a tie in capacity, use rainfall (in mm/year) as the tiebreaker. Provide exactly:
 - Recommended: Location X (lat: Y, lon: Z)
 - Justification: <reason based primarily on capacity, using rainfall only as a tiebreaker, comparing all locations>
 Format as bullet points with `-`. Example:
@@ -149,83 +414,250 @@ Format as bullet points with `-`. Example:
 If no suitable location is found, state exactly once:
 - No recommendation: <reason>
 Analysis:\n{analysis}"""
+
+ANALYSIS_JSON_TEMPLATE = """Analyze these {num_locations} location(s) for water reservoir potential. For each location listed below, estimate:
+- rainfall_mm_per_year: annual rainfall in mm/year (e.g., 1200)
+- capacity_m_liters: potential reservoir capacity in millions of liters (e.g., 5)
+Respond with only a JSON array containing exactly one object per listed location, using the number of the location as "location". Do not add locations that are not listed and do not write any text outside the JSON array. Example:
+[{{"location": 1, "rainfall_mm_per_year": 1200, "capacity_m_liters": 5}}, {{"location": 2, "rainfall_mm_per_year": 800, "capacity_m_liters": 3}}]
+Locations:\n{locations}"""
+
+JUSTIFICATION_TEMPLATE = """Location {recommended} has been selected as the best location for a water reservoir from this analysis, because it has the highest capacity (in M liters), with rainfall (in mm/year) used only as a tiebreaker. Explain this choice in one or two sentences, comparing it with the other locations. Provide exactly one line:
+- Justification: <reason>
+Analysis:\n{analysis}"""
+
+# Responses are cached per exact prompt; changing any template drops the on-disk tier
+llm_cache = LLMResponseCache(fingerprint=templates_fingerprint(
+    ANALYSIS_TEMPLATE, ANALYSIS_JSON_TEMPLATE, RECOMMENDATION_TEMPLATE, JUSTIFICATION_TEMPLATE
+))
+# Hit ratio and saved generation time, e.g. waterseeker_llm_cache_saved_seconds
+telemetry.metrics.register_gauges("llm_cache", llm_cache.stats)
+# Sessions sending the same prompt at the same time share one generation (keyed on the
+# prompt hash, so this works with the response cache turned off too)
+llm_flight = SingleFlight("llm")
+telemetry.metrics.register_gauges("singleflight", lambda: {"llm": llm_flight.stats()}, label="flight")
+
+# LangChain sequences over the sync calls, for callers composing their own chains (the
+# agent itself formats the templates and awaits the async calls). LangChain is only
+# imported, and the sequences only built, on first use, so importing this module stays fast
+CHAIN_NAMES = (
+    "analysis_prompt", "recommendation_prompt", "analysis_json_prompt", "justification_prompt", "llm",
+    "analysis_sequence", "analysis_json_sequence", "recommendation_sequence", "justification_sequence",
+    "streaming_llm", "analysis_stream_sequence", "analysis_json_stream_sequence", "recommendation_stream_sequence",
 )
+_chains = None
+_chains_lock = threading.Lock()
 
-llm = WatsonxLLM()
-analysis_sequence = analysis_prompt | llm | StrOutputParser()
-recommendation_sequence = recommendation_prompt | llm | StrOutputParser()
+def _build_chains():
+    from langchain.prompts import PromptTemplate
+    from langchain_core.runnables import RunnableGenerator
+    from langchain_core.output_parsers import StrOutputParser
+    analysis_prompt = PromptTemplate(input_variables=["locations", "num_locations"], template=ANALYSIS_TEMPLATE)
+    recommendation_prompt = PromptTemplate(input_variables=["analysis", "num_locations"], template=RECOMMENDATION_TEMPLATE)
+    analysis_json_prompt = PromptTemplate(input_variables=["locations", "num_locations"], template=ANALYSIS_JSON_TEMPLATE)
+    justification_prompt = PromptTemplate(input_variables=["analysis", "recommended"], template=JUSTIFICATION_TEMPLATE)
+    llm = WatsonxLLM()
+    # Streaming variants: .stream() yields text chunks as watsonx generates them
+    streaming_llm = RunnableGenerator(_stream_llm)
+    return {
+        "analysis_prompt": analysis_prompt,
+        "recommendation_prompt": recommendation_prompt,
+        "analysis_json_prompt": analysis_json_prompt,
+        "justification_prompt": justification_prompt,
+        "llm": llm,
+        "analysis_sequence": analysis_prompt | llm | StrOutputParser(),
+        "analysis_json_sequence": analysis_json_prompt | llm | StrOutputParser(),
+        "recommendation_sequence": recommendation_prompt | llm | StrOutputParser(),
+        "justification_sequence": justification_prompt | llm | StrOutputParser(),
+        "streaming_llm": streaming_llm,
+        "analysis_stream_sequence": analysis_prompt | streaming_llm | StrOutputParser(),
+        "analysis_json_stream_sequence": analysis_json_prompt | streaming_llm | StrOutputParser(),
+        "recommendation_stream_sequence": recommendation_prompt | streaming_llm | StrOutputParser(),
+    }
 
-def run_waterseeker_agent(locations):
-    agent_log = []  # To store the agent's process
-    if not locations:
-        agent_log.append("❌ No locations provided for analysis.")
-        return "No locations provided for analysis.", "No recommendation: No locations provided.", [], "\n".join(agent_log), []
-    
-    # Convert locations to text for analysis
-    locations_text = "\n".join([f"Location {i+1}: (lat: {lat}, lon: {lon})" for i, (lat, lon) in enumerate(locations)])
-    agent_log.append(f"📋 Preparing to analyze {len(locations)} location(s):")
-    agent_log.append(locations_text.replace("\n", "\n"))
-    
+def _chain(name):
+    global _chains
+    if _chains is None:
+        with _chains_lock:
+            if _chains is None:
+                _chains = _build_chains()
+    return _chains[name]
+
+def __getattr__(name):
+    # Keeps waterseeker.analysis_sequence etc. working as module attributes
+    if name in CHAIN_NAMES:
+        return _chain(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+async def _enrich_location(lat, lon):
+    # Each lookup keeps its own trace so concurrent lookups don't interleave lines
+    location_log = Trace()
+    with telemetry.use_trace(location_log):
+        country, city, water_data = await get_location_info_async(lat, lon, location_log)
+    return country, city, water_data, location_log
+
+async def _generate_analysis(prompt_inputs, parser, on_location, output_mode, replace=None):
+    # Runs one analysis generation through parser; with on_location, the generation
+    # is streamed and each location row is reported as soon as it is complete.
+    # The templates are formatted directly (what PromptTemplate.format does).
+    prompt_text = (ANALYSIS_JSON_TEMPLATE if output_mode == "json" else ANALYSIS_TEMPLATE).format(**prompt_inputs)
+    if on_location is None:
+        analysis = await cached_call_watsonx_async(prompt_text)
+        for record in parser.feed(analysis) + parser.close():
+            _use_facts(record, replace)
+        return analysis
+    chunks = []
+    async for chunk in cached_stream_watsonx_async(prompt_text):
+        chunks.append(chunk)
+        for record in parser.feed(chunk):
+            _use_facts(record, replace)
+            on_location(record.location_id, record.line())
+    for record in parser.close():
+        _use_facts(record, replace)
+        on_location(record.location_id, record.line())
+    return "".join(chunks)
+
+def _climatology_rainfall(locations):
+    # Climatological rainfall per location (None where the grid has no data), or None
+    # when no climatology is built or RAINFALL_SOURCE is "llm"
+    if RAINFALL_SOURCE == "llm" or not locations:
+        return None
+    from climatology import get_climatology
+    climatology = get_climatology()
+    if climatology is None:
+        return None
+    values = climatology.lookup([lat for lat, _ in locations], [lon for _, lon in locations])
+    return [None if math.isnan(value) else round(float(value)) for value in values]
+
+def _dem_capacity(locations):
+    # Reservoir estimate per location (None outside the elevation tiles), or None when
+    # no tiles are built or CAPACITY_SOURCE is "llm"
+    if CAPACITY_SOURCE == "llm" or not locations:
+        return None
+    from capacity import get_elevation_model
+    model = get_elevation_model()
+    if model is None:
+        return None
+    return [model.estimate(lat, lon) for lat, lon in locations]
+
+def _local_facts(locations):
+    # Per-location values measured locally rather than estimated by the model
+    return {"rainfall": _climatology_rainfall(locations), "capacity": _dem_capacity(locations)}
+
+def _replaced_facts(facts):
+    # The measured values that overwrite what the model writes back, by record field
+    replace = {}
+    if facts["rainfall"] is not None and RAINFALL_SOURCE == "climatology":
+        replace["rainfall"] = facts["rainfall"]
+    if facts["capacity"] is not None and CAPACITY_SOURCE == "dem":
+        replace["capacity"] = [None if e is None else round(e.capacity, 1) for e in facts["capacity"]]
+    return replace
+
+def _use_facts(record, replace):
+    for field, values in (replace or {}).items():
+        if values[record.location_id - 1] is not None:
+            setattr(record, field, values[record.location_id - 1])
+
+async def _analyze(locations, locations_text, agent_log, on_location=None, output_mode="text", facts=None):
     # Run analysis
     agent_log.append("🤖 Running analysis with watsonx.ai (Granite-3-8B model)...")
-    analysis = analysis_sequence.invoke({"locations": locations_text, "num_locations": len(locations)})
+    parser = AnalysisJSONParser(locations) if output_mode == "json" else AnalysisParser(locations)
+    facts = facts or {"rainfall": None, "capacity": None}
+    if facts["rainfall"] is not None:
+        known = sum(value is not None for value in facts["rainfall"])
+        agent_log.append(f"🌧️ Annual rainfall for {known} of {len(locations)} location(s) from the local climatology.")
+    if facts["capacity"] is not None:
+        known = sum(estimate is not None for estimate in facts["capacity"])
+        agent_log.append(f"⛰️ Reservoir capacity for {known} of {len(locations)} location(s) from the local elevation model.")
+    replace = _replaced_facts(facts)
+    try:
+        analysis = await _generate_analysis({"locations": locations_text, "num_locations": len(locations)}, parser, on_location, output_mode, replace)
+    except CircuitOpen as e:
+        # watsonx keeps failing: rank on what was measured locally rather than fail the run
+        agent_log.append(f"⚠️ {str(e)} Using the locally measured rainfall and capacity only.")
+        records = _measured_records(locations, facts)
+        for record in records:
+            if record.found and on_location is not None:
+                on_location(record.location_id, record.line())
+        return "\n".join(record.line() for record in records if record.found), _log_missing(records, agent_log)
     agent_log.append("✅ Analysis complete:")
-    agent_log.append(analysis.replace("\n", "\n"))
-    
-    # First, try to parse as single-line format
-    analysis_lines = [line.strip() for line in analysis.split("\n") if line.strip().startswith("- Location")]
-    filtered_analysis_lines = []
-    for i in range(len(locations)):
-        expected_prefix = f"- Location {i+1} (lat: {locations[i][0]}, lon: {locations[i][1]}):"
-        found = False
-        for line in analysis_lines:
-            if line.startswith(expected_prefix):
-                if "Rainfall:" in line and "Capacity:" in line:
-                    filtered_analysis_lines.append(line)
-                    found = True
-                    break
-        if not found:
-            current_location = None
-            rainfall = capacity = None
-            for line in analysis.split("\n"):
-                line = line.strip()
-                if not line:
-                    continue
-                if line.startswith(f"- Location {i+1} (lat: {locations[i][0]}, lon: {locations[i][1]}):"):
-                    current_location = line
-                    rainfall = capacity = None
-                elif line.startswith("- Rainfall:"):
-                    rainfall_match = re.search(r"Rainfall: (\d+\.?\d*)mm/year", line)
-                    rainfall = rainfall_match.group(1) if rainfall_match else "0"
-                elif line.startswith("- Capacity:"):
-                    capacity_match = re.search(r"Capacity: (\d+\.?\d*)M liters", line)
-                    capacity = capacity_match.group(1) if capacity_match else "0"
-                    if current_location and rainfall is not None:
-                        flattened_line = f"{current_location}: Rainfall: {rainfall}mm/year, Capacity: {capacity}M liters"
-                        filtered_analysis_lines.append(flattened_line)
-                        found = True
-                        break
-            if not found:
-                filtered_analysis_lines.append(f"- Location {i+1} (lat: {locations[i][0]}, lon: {locations[i][1]}): Rainfall: 0mm/year, Capacity: 0M liters")
-    
-    # Validate analysis matches input locations
-    if len(filtered_analysis_lines) != len(locations):
-        agent_log.append(f"❌ Error: Analysis includes {len(filtered_analysis_lines)} locations, but {len(locations)} were provided.")
-        filtered_analysis_lines = analysis_lines if analysis_lines else [f"- Location {i+1} (lat: {lat}, lon: {lon}): Rainfall: 0mm/year, Capacity: 0M liters" for i, (lat, lon) in enumerate(locations)]
-    
-    # Run recommendation with strict constraint
-    filtered_analysis = "\n".join(filtered_analysis_lines)
+    agent_log.append(analysis)
+
+    # Ask again only for the locations whose rows were missing or failed validation
+    for _ in range(ANALYSIS_REASKS):
+        missing_ids = parser.missing_ids()
+        if not missing_ids:
+            break
+        agent_log.append(f"🔁 Re-asking for Location(s) {', '.join(map(str, missing_ids))} only...")
+        telemetry.count("retries_total", operation=f"analysis_{output_mode}_reask")
+        # Listed as Locations 1..k so the template's "beyond Location k" holds; the parser
+        # maps the rows back to the original ids
+        parser.renumber(missing_ids)
+        missing_text = "\n".join(_location_line(i, *locations[i-1], facts, number=n) for n, i in enumerate(missing_ids, 1))
+        try:
+            retry = await _generate_analysis({"locations": missing_text, "num_locations": len(missing_ids)}, parser, on_location, output_mode, replace)
+        except CircuitOpen as e:
+            agent_log.append(f"⚠️ {str(e)} Keeping the rows received so far.")
+            break
+        agent_log.append(retry)
+        analysis += "\n" + retry
+    return analysis, _log_missing(parser.records(), agent_log)
+
+def _measured_records(locations, facts):
+    # Records from the local climatology and elevation model alone, found only where both are known
+    rainfall = facts["rainfall"] or [None] * len(locations)
+    capacity = facts["capacity"] or [None] * len(locations)
+    records = []
+    for i, ((lat, lon), mm, estimate) in enumerate(zip(locations, rainfall, capacity)):
+        found = mm is not None and estimate is not None
+        records.append(LocationRecord(i + 1, lat, lon, float(mm) if found else 0.0,
+                                      round(estimate.capacity, 1) if found else 0.0, found, "Unknown", "Unknown", ""))
+    return records
+
+def _log_missing(records, agent_log):
+    missing = [str(record.location_id) for record in records if not record.found]
+    if missing:
+        agent_log.append(f"⚠️ No usable analysis for Location(s) {', '.join(missing)}; they are left out of the ranking.")
+    return records
+
+def _location_line(location_id, lat, lon, facts=None, number=None):
+    # number: what the location is called in the prompt, when not its id
+    line = f"Location {number or location_id}: (lat: {lat}, lon: {lon})"
+    rainfall = facts["rainfall"][location_id - 1] if facts and facts["rainfall"] else None
+    if rainfall is not None:
+        line += f", measured annual rainfall: {format_number(rainfall)}mm/year"
+    estimate = facts["capacity"][location_id - 1] if facts and facts["capacity"] else None
+    if estimate is not None:
+        # Truncated estimates are lower bounds: the reservoir outgrew the searched area
+        bound = "at least " if estimate.truncated else ""
+        line += (f", reservoir capacity behind a {format_number(estimate.dam_height)}m dam: "
+                 f"{bound}{format_number(round(estimate.capacity, 1))}M liters")
+    return line
+
+def _locations_text(locations, facts=None):
+    return "\n".join([_location_line(i + 1, lat, lon, facts) for i, (lat, lon) in enumerate(locations)])
+
+def analyze_locations(locations, output_mode=None, agent_log=None):
+    # Analysis step only (no recommendation or enrichment), e.g. for batch screening.
+    # Returns the raw model output and one LocationRecord per location.
+    return _run_sync(lambda emit: analyze_locations_async(locations, output_mode, agent_log))
+
+async def analyze_locations_async(locations, output_mode=None, agent_log=None):
+    agent_log = [] if agent_log is None else agent_log
+    # Off the event loop: the elevation windows are read from disk and flooded with NumPy
+    facts = await asyncio.to_thread(_local_facts, locations)
+    return await _analyze(locations, _locations_text(locations, facts), agent_log, None, output_mode or ANALYSIS_OUTPUT_MODE, facts)
+
+def _log_comparison(records, agent_log):
     agent_log.append("🔍 Performing comparison for recommendation...")
-    for line in filtered_analysis_lines:
-        rainfall_match = re.search(r"Rainfall: (\d+\.?\d*)mm/year", line)
-        capacity_match = re.search(r"Capacity: (\d+\.?\d*)M liters", line)
-        loc_id_match = re.search(r"Location (\d+)", line)
-        rainfall = rainfall_match.group(1) if rainfall_match else "0"
-        capacity = capacity_match.group(1) if capacity_match else "0"
-        loc_id = loc_id_match.group(1) if loc_id_match else "Unknown"
-        agent_log.append(f"  - Location {loc_id}: Rainfall: {rainfall}mm/year, Capacity: {capacity}M liters")
+    for record in records:
+        agent_log.append(f"  - Location {record.location_id}: Rainfall: {format_number(record.rainfall)}mm/year, Capacity: {format_number(record.capacity)}M liters")
+
+async def _llm_recommendation(analysis_lines, locations, agent_log):
+    # Run recommendation with strict constraint
+    filtered_analysis = "\n".join(analysis_lines)
     agent_log.append("🤖 Generating recommendation with watsonx.ai (Granite-3-8B model)...")
-    recommendation = recommendation_sequence.invoke({"analysis": filtered_analysis, "num_locations": len(locations)})
+    recommendation = await cached_call_watsonx_async(RECOMMENDATION_TEMPLATE.format(analysis=filtered_analysis, num_locations=len(locations)))
     
     # Post-process recommendation to filter out duplicates and invalid locations
     valid_location_ids = set(range(1, len(locations) + 1))
@@ -238,7 +670,7 @@ def run_waterseeker_agent(locations):
         if not line:
             continue
         if line.startswith("- Recommended: Location"):
-            loc_id_match = re.search(r"Recommended: Location (\d+)", line)
+            loc_id_match = RECOMMENDED.search(line)
             if loc_id_match:
                 loc_id = int(loc_id_match.group(1))
                 if loc_id not in valid_location_ids:
@@ -259,19 +691,141 @@ def run_waterseeker_agent(locations):
     if not recommendation:
         recommendation = "- No recommendation: Failed to generate a valid recommendation."
         agent_log.append("❌ Failed to generate a valid recommendation.")
+
+    return recommendation
+
+async def _llm_justification(analysis_lines, recommended_id):
+    response = await cached_call_watsonx_async(JUSTIFICATION_TEMPLATE.format(analysis="\n".join(analysis_lines), recommended=recommended_id))
+    for line in response.split("\n"):
+        line = line.strip()
+        if line.startswith("- Justification:") and line[len("- Justification:"):].strip():
+            return line[len("- Justification:"):].strip()
+    return None
+
+async def _recommend(records, locations, agent_log, mode):
+    # Returns the recommendation text and, in hybrid mode, a task for the LLM justification
+    _log_comparison(records, agent_log)
+    # Locations without a usable analysis would only compete with made-up zeros
+    records = [record for record in records if record.found]
+    analysis_lines = [record.line() for record in records]
+    if not records:
+        recommendation = "- No recommendation: No location has a usable analysis."
+        agent_log.append(f"❌ {recommendation[2:]}")
+        return recommendation, None
+    if mode == "llm":
+        try:
+            return await _llm_recommendation(analysis_lines, locations, agent_log), None
+        except Exception as e:
+            # e.g. watsonx timing out or its circuit open: the parsed numbers still rank
+            agent_log.append(f"⚠️ LLM recommendation failed, ranking locally instead: {str(e)}")
+
+    # Capacity first, rainfall as the tiebreaker: a plain sort over the parsed numbers
+    ranked = rank_locations(records)
+    agent_log.append("🧮 Ranking locations by capacity, then rainfall...")
+    recommendation = build_recommendation(ranked)
+    agent_log.append("✅ Recommendation generated:")
+    agent_log.append(recommendation)
+    justification_task = None
+    if mode == "hybrid" and recommendation.startswith("- Recommended:"):
+        agent_log.append("🤖 Writing justification with watsonx.ai (Granite-3-8B model)...")
+        # Runs while the location lookups finish
+        justification_task = asyncio.ensure_future(_llm_justification(analysis_lines, ranked[0].location_id))
+    return recommendation, justification_task
+
+async def _apply_justification(recommendation, justification_task, agent_log):
+    try:
+        justification = await justification_task
+    except Exception as e:
+        agent_log.append(f"⚠️ LLM justification failed, keeping the local one: {str(e)}")
+        return recommendation
+    if not justification:
+        agent_log.append("⚠️ LLM justification was empty, keeping the local one.")
+        return recommendation
+    recommended_line = recommendation.split("\n")[0]
+    agent_log.append("✅ Justification generated.")
+    return f"{recommended_line}\n- Justification: {justification}"
+
+def run_waterseeker_agent(locations, pipelined=True, max_workers=ENRICHMENT_WORKERS, on_location=None, recommendation_mode=None, output_mode=None):
+    # Thin wrapper around run_waterseeker_agent_async on the shared background event loop;
+    # on_location is still called on this thread as rows stream in
+    return _run_sync(
+        lambda emit: run_waterseeker_agent_async(locations, pipelined, max_workers, emit, recommendation_mode, output_mode),
+        on_location,
+    )
+
+async def run_waterseeker_agent_async(locations, pipelined=True, max_workers=ENRICHMENT_WORKERS, on_location=None, recommendation_mode=None, output_mode=None):
+    # Spans, counters and log lines of this run; the agent log text is rendered from it
+    trace = Trace()
+    try:
+        with telemetry.use_trace(trace), telemetry.span("agent_run", locations=len(locations)):
+            result = await _run_agent(locations, trace, pipelined, max_workers, on_location, recommendation_mode, output_mode)
+    finally:
+        telemetry.export(trace)
+    result.agent_log = trace.text()
+    result.trace = trace
+    return result
+
+async def _run_agent(locations, agent_log, pipelined, max_workers, on_location, recommendation_mode, output_mode):
+    if not locations:
+        agent_log.append("❌ No locations provided for analysis.")
+        return AgentResult("No locations provided for analysis.", "No recommendation: No locations provided.", [], "", [])
     
-    # Enrich analysis with country, city, and water resource data
-    enriched_analysis = []
-    water_resources_data = []
-    for i, (lat, lon) in enumerate(locations):
-        country, city, water_data = get_location_info(lat, lon, agent_log)
-        analysis_line = filtered_analysis_lines[i]
-        enriched_analysis.append(f"{analysis_line}, Country: {country}, City: {city}")
-        water_resources_data.append(water_data)
+    # Convert locations to text for analysis, with the locally measured rainfall and capacity
+    # as facts (off the event loop: the elevation windows are read from disk and flooded)
+    facts = await asyncio.to_thread(_local_facts, locations)
+    locations_text = _locations_text(locations, facts)
+    agent_log.append(f"📋 Preparing to analyze {len(locations)} location(s):")
+    agent_log.append(locations_text.replace("\n", "\n"))
     
-    enriched_analysis = "\n".join(enriched_analysis)
+    # Geocoding and water-resource lookups don't depend on the LLM output, so
+    # start them as tasks while watsonx is generating
+    enrichment_tasks = None
+    if pipelined:
+        agent_log.append("⚡ Starting location lookups in the background...")
+        # At most max_workers lookups of this run at a time; the shared Nominatim rate
+        # limit and per-host caps apply across all runs underneath
+        semaphore = asyncio.Semaphore(max(1, max_workers))
+
+        async def enrich(lat, lon):
+            async with semaphore:
+                return await _enrich_location(lat, lon)
+        enrichment_tasks = [asyncio.ensure_future(enrich(lat, lon)) for lat, lon in locations]
+    justification_task = None
+    try:
+        raw_analysis, records = await _analyze(locations, locations_text, agent_log, on_location, output_mode or ANALYSIS_OUTPUT_MODE, facts)
+        recommendation, justification_task = await _recommend(
+            records, locations, agent_log, recommendation_mode or RECOMMENDATION_MODE
+        )
+
+        # Enrich analysis with country, city, and water resource data
+        for i, (lat, lon) in enumerate(locations):
+            if enrichment_tasks is not None:
+                country, city, water_data, location_log = await enrichment_tasks[i]
+            else:
+                country, city, water_data, location_log = await _enrich_location(lat, lon)
+            agent_log.extend(location_log)
+            records[i].country, records[i].city, records[i].water_resources = country, city, water_data
+
+        if justification_task is not None:
+            recommendation = await _apply_justification(recommendation, justification_task, agent_log)
+    except BaseException:
+        # Failed or cancelled: don't leave lookups running for nobody
+        for task in (enrichment_tasks or []) + [justification_task]:
+            if task is not None:
+                task.cancel()
+        raise
+    recommended_match = RECOMMENDED.search(recommendation)
     
-    return enriched_analysis, recommendation, locations, "\n".join(agent_log), water_resources_data
+    return AgentResult(
+        analysis="\n".join(record.enriched_line() for record in records),
+        recommendation=recommendation,
+        locations=locations,
+        agent_log="",
+        water_resources=[record.water_resources for record in records],
+        records=records,
+        recommended_index=int(recommended_match.group(1)) - 1 if recommended_match else -1,
+        raw_analysis=raw_analysis,
+    )
 
 if __name__ == "__main__":
     sample_locations = [(35.5, -78.3), (36.0, -79.0)]
@@ -0,0 +1,169 @@
+# waterseeker-agent/weather.py
+import asyncio
+import os
+import threading
+import time
+import telemetry
+from http_client import http_client
+from singleflight import SingleFlight
+
+OWM_URL = os.environ.get("WATERSEEKER_OWM_URL", "http://api.openweathermap.org/data/2.5/weather")
+# Observations are reused for this many seconds (OWM updates roughly every 10 minutes)
+WEATHER_TTL = float(os.environ.get("WATERSEEKER_WEATHER_TTL", "600"))
+# Coordinates are rounded to this many decimals before lookup (2 ≈ 1 km)
+WEATHER_PRECISION = int(os.environ.get("WATERSEEKER_WEATHER_PRECISION", "2"))
+WEATHER_MAX_ENTRIES = 1000
+WEATHER_WORKERS = 5
+
+DEFAULT_WEATHER = {
+    "rain_1h": 0,
+    "rain_3h": 0,
+    "humidity": 0,
+    "cloud_cover": 0,
+    "temperature": 0,
+    "wind_speed": 0,
+    "wind_direction": 0,
+    "pressure": 0,
+    "weather_description": "N/A",
+}
+
+
+class WeatherCache:
+    """In-memory TTL cache of weather observations keyed on quantized coordinates."""
+
+    def __init__(self, ttl=WEATHER_TTL, precision=WEATHER_PRECISION, max_entries=WEATHER_MAX_ENTRIES):
+        self.ttl = ttl
+        self.precision = precision
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def key(self, lat, lon):
+        return round(float(lat), self.precision), round(float(lon), self.precision)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def set(self, key, weather):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Drop expired observations first, then the oldest ones
+                now = time.monotonic()
+                for k in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                    del self._entries[k]
+                while len(self._entries) >= self.max_entries:
+                    del self._entries[next(iter(self._entries))]
+            self._entries[key] = (time.monotonic() + self.ttl, weather)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+weather_cache = WeatherCache()
+# Concurrent misses for the same quantized point share one OpenWeatherMap request
+weather_flight = SingleFlight("weather")
+telemetry.metrics.register_gauges("singleflight", lambda: {"weather": weather_flight.stats()}, label="flight")
+
+
+def parse_weather(data):
+    return {
+        "rain_1h": data.get("rain", {}).get("1h", 0),  # Rainfall in the last 1 hour (mm)
+        "rain_3h": data.get("rain", {}).get("3h", 0),  # Rainfall in the last 3 hours (mm)
+        "humidity": data.get("main", {}).get("humidity", 0),  # Humidity (%)
+        "cloud_cover": data.get("clouds", {}).get("all", 0),  # Cloudiness (%)
+        "temperature": data.get("main", {}).get("temp", 0),  # Temperature (°C)
+        "wind_speed": data.get("wind", {}).get("speed", 0),  # Wind speed (m/s)
+        "wind_direction": data.get("wind", {}).get("deg", 0),  # Wind direction (degrees)
+        "pressure": data.get("main", {}).get("pressure", 0),  # Pressure (hPa)
+        "weather_description": data.get("weather", [{}])[0].get("description", "N/A"),  # Weather description
+    }
+
+
+def get_weather(lat, lon, api_key, cache=weather_cache):
+    key = cache.key(lat, lon)
+    with telemetry.span("weather", lat=key[0], lon=key[1]) as span:
+        weather = cache.get(key)
+        telemetry.cache_lookup("weather", weather is not None)
+        span.set(cached=weather is not None)
+        if weather is not None:
+            return weather
+
+        def fetch():
+            params = {"lat": key[0], "lon": key[1], "appid": api_key, "units": "metric"}
+            response = http_client.get(OWM_URL, params=params)
+            response.raise_for_status()
+            weather = parse_weather(response.json())
+            cache.set(key, weather)
+            return weather
+        return weather_flight.do(key, fetch, on_shared=lambda: span.set(shared=True))
+
+
+async def get_weather_async(lat, lon, api_key, cache=weather_cache):
+    from async_http import get_async_http_client
+    key = cache.key(lat, lon)
+    with telemetry.span("weather", lat=key[0], lon=key[1]) as span:
+        # Cache access takes a lock, so it runs in a worker thread rather than on the event loop
+        weather = await asyncio.to_thread(cache.get, key)
+        telemetry.cache_lookup("weather", weather is not None)
+        span.set(cached=weather is not None)
+        if weather is not None:
+            return weather
+
+        async def fetch():
+            params = {"lat": key[0], "lon": key[1], "appid": api_key, "units": "metric"}
+            response = await get_async_http_client().get(OWM_URL, params=params)
+            response.raise_for_status()
+            weather = parse_weather(response.json())
+            await asyncio.to_thread(cache.set, key, weather)
+            return weather
+        return await weather_flight.do_async(key, fetch, on_shared=lambda: span.set(shared=True))
+
+
+async def get_weather_batch_async(points, api_key, cache=weather_cache, max_workers=WEATHER_WORKERS):
+    """Fetch weather for every point concurrently, once per distinct quantized key.
+
+    Returns one dict per point in order. Failed lookups get DEFAULT_WEATHER
+    with an extra "error" entry so the caller can report them.
+    """
+    keys = [cache.key(lat, lon) for lat, lon in points]
+    unique_keys = list(dict.fromkeys(keys))
+    if not unique_keys:
+        return []
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+
+    async def fetch(key):
+        async with semaphore:
+            try:
+                return await get_weather_async(key[0], key[1], api_key, cache)
+            except Exception as e:
+                return dict(DEFAULT_WEATHER, error=str(e))
+
+    by_key = dict(zip(unique_keys, await asyncio.gather(*(fetch(key) for key in unique_keys))))
+    return [by_key[key] for key in keys]
+
+
+def get_weather_batch(points, api_key, cache=weather_cache, max_workers=WEATHER_WORKERS):
+    # Sync wrapper: runs get_weather_batch_async on the shared background event loop
+    from event_loop import get_background_loop
+    return get_background_loop().run(lambda emit: get_weather_batch_async(points, api_key, cache, max_workers))